@@ -7,8 +7,9 @@ import os
 
 try:
     import yaml  # type: ignore
+    _YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 except Exception as e:  # pragma: no cover - optional dependency
-    yaml = None
+    yaml = _YamlLoader = None
 
 
 class ConfigError(Exception):
@@ -36,7 +37,7 @@ def _load_raw(path: str) -> Dict[str, Any]:
         if path.lower().endswith((".yaml", ".yml")):
             if yaml is None:
                 raise ConfigError("PyYAML is required to load YAML files.")
-            return yaml.safe_load(f) or {}
+            return yaml.load(f, Loader=_YamlLoader) or {}
         elif path.lower().endswith(".json"):
             return json.load(f)
         else:
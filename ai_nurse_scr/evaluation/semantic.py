@@ -6,6 +6,8 @@ from pathlib import Path
 from typing import Optional, List, Dict
 import csv
 
+from ..utils import write_csv
+
 try:  # optional pandas for convenience
     import pandas as pd  # type: ignore
 except Exception:  # pragma: no cover - optional dep
@@ -103,7 +105,7 @@ def _spotcheck_rows(
         out_path = Path("spotcheck_results.csv")
 
     if pd:
-        pd.DataFrame(audit_rows).to_csv(out_path, index=False)
+        write_csv(pd.DataFrame(audit_rows), out_path)
     else:
         if not audit_rows:
             headers: List[str] = []
@@ -8,21 +8,45 @@ return dictionaries keyed by a common set of fields defined in
 ``fields``.
 """
 
+import asyncio
+import functools
+import hashlib
 import os
-import json
-from .utils import normalize_doi
+import re
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import quote
+from .utils import JsonCache, json_dumpb, json_loads, normalize_doi
 try:
     import requests
 except Exception:  # pragma: no cover - optional dependency
     requests = None
+try:
+    import numpy as np
+except Exception:  # pragma: no cover - optional dependency
+    np = None
 
 fields = [
     "title", "author", "year", "doi",
     "author_keywords", "country", "source_journal", "study_type"
 ]
 
+_EMPTY_META = dict.fromkeys(fields, "")
+
+DOI_RE = re.compile(r"10\.\d{4,9}/[-._;()/:A-Z0-9]+", re.I)
+
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 llm_model = "gpt-4"
+# Optional persistent reply cache, see :func:`set_llm_cache`.
+llm_cache = None
+# Optional persistent Crossref/OpenAlex record cache, see :func:`set_record_cache`.
+record_cache = None
+
+
+def empty_meta() -> dict:
+    """Return a fresh metadata dictionary with every ``fields`` key blank."""
+    return _EMPTY_META.copy()
 
 
 def clean_str(txt: str) -> str:
@@ -37,9 +61,21 @@ def clean_str(txt: str) -> str:
     -------
     str
         Text normalised to lowercase with spaces and punctuation removed.
+        Results are memoised as the same values are compared repeatedly.
     """
 
-    return "".join(c for c in str(txt or "").lower() if c.isalnum() or c.isspace()).replace(" ", "")
+    return _clean_str_cached(str(txt or ""))
+
+
+@functools.lru_cache(maxsize=16384)
+def _clean_str_cached(txt: str) -> str:
+    return "".join(c for c in txt.lower() if c.isalnum() or c.isspace()).replace(" ", "")
+
+
+def find_doi(text: str) -> str:
+    """Return the first DOI found in ``text`` (normalised) or ``""``."""
+    m = DOI_RE.search(text or "")
+    return normalize_doi(m.group(0).rstrip(".,;")) if m else ""
 
 
 def approx_match(a: str, b: str, field: str) -> bool:
@@ -70,6 +106,152 @@ def approx_match(a: str, b: str, field: str) -> bool:
     return clean_str(a) == clean_str(b)
 
 
+def _dig(d, path: tuple):
+    """Follow ``path`` (dict keys / list indexes) into ``d``; ``None`` if absent."""
+    for k in path:
+        if isinstance(d, dict):
+            d = d.get(k)
+        elif isinstance(d, list) and isinstance(k, int) and -len(d) <= k < len(d):
+            d = d[k]
+        else:
+            return None
+    return d
+
+
+def _text(v) -> str:
+    return "" if v is None else str(v)
+
+
+def _first(v) -> str:
+    return _text(v[0]) if isinstance(v, list) and v else ""
+
+
+def _join_semicolon(v) -> str:
+    if not v:
+        return ""
+    return ";".join(x.get("display_name", "") if isinstance(x, dict) else str(x) for x in v)
+
+
+def _crossref_authors(authors) -> str:
+    return "; ".join(
+        "{}, {}".format(a.get("family", "").strip(), a.get("given", "").strip()) for a in authors or []
+    )
+
+
+def _crossref_affiliations(authors) -> str:
+    return "; ".join(aff.get("name", "") for a in authors or [] for aff in a.get("affiliation", [])).strip()
+
+
+def _openalex_authors(authorships) -> str:
+    return "; ".join(a.get("author", {}).get("display_name", "") for a in authorships or [])
+
+
+def _openalex_countries(authorships) -> str:
+    return "; ".join(
+        inst.get("country_code", "") for a in authorships or [] for inst in a.get("institutions", [])
+    )
+
+
+# ``field -> (path into the API record, converter)`` applied by :func:`_apply_schema`
+CROSSREF_SCHEMA = {
+    "title": (("title",), _first),
+    "author": (("author",), _crossref_authors),
+    "year": (("issued", "date-parts", 0, 0), _text),
+    "doi": (("DOI",), normalize_doi),
+    "author_keywords": (("subject",), _join_semicolon),
+    "country": (("author",), _crossref_affiliations),
+    "source_journal": (("container-title",), _first),
+    "study_type": (("type",), _text),
+}
+
+OPENALEX_SCHEMA = {
+    "title": (("title",), _text),
+    "author": (("authorships",), _openalex_authors),
+    "year": (("publication_year",), _text),
+    "doi": (("doi",), normalize_doi),
+    "author_keywords": (("keywords",), _join_semicolon),
+    "country": (("authorships",), _openalex_countries),
+    "source_journal": (("host_venue", "display_name"), _text),
+    "study_type": (("type",), _text),
+}
+
+
+def _apply_schema(dat: dict, schema: dict) -> dict:
+    """Map a raw API record onto ``fields`` using ``schema``."""
+    return {field: fn(_dig(dat, path)) for field, (path, fn) in schema.items()}
+
+
+@functools.lru_cache(maxsize=1)
+def _http_session():
+    """Return the keep-alive session shared by all Crossref/OpenAlex calls.
+
+    Created on first use so importing the module does not need ``requests``;
+    connections are pooled, so repeated lookups skip the TCP/TLS handshake.
+    Rate-limit and transient server errors are retried twice with backoff.
+    Set ``CROSSREF_MAILTO`` to an address to join Crossref's polite pool.
+    """
+    session = requests.Session()
+    mailto = os.environ.get("CROSSREF_MAILTO", "")
+    session.headers.update({"User-Agent": f"ai-nurse-scr (mailto:{mailto})" if mailto else "ai-nurse-scr"})
+    retry = requests.adapters.Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+    session.mount("https://", adapter)
+    return session
+
+
+def set_record_cache(path: str | Path | None, ttl_days: float = 90) -> JsonCache | None:
+    """Persist raw Crossref/OpenAlex records at ``path`` (``None`` disables it).
+
+    Records older than ``ttl_days`` are fetched again.  The in-process
+    memoisation of :func:`_crossref_record` / :func:`_openalex_record`
+    applies on top of this.
+    """
+    global record_cache
+    if record_cache is not None:
+        record_cache.close()
+    record_cache = JsonCache(path, ttl=ttl_days * 86400) if path else None
+    return record_cache
+
+
+def _cached_record(source: str, doi: str, title: str, fetch) -> dict:
+    """Return ``fetch(doi, title)``, consulting :data:`record_cache` first.
+
+    Empty records (a title search miss, an error body) are not stored, so a
+    transient failure is retried on the next run instead of for the TTL.
+    """
+    cache = record_cache
+    if cache is None:
+        return fetch(doi, title)
+    key = f"{source}:doi:{doi}" if doi else f"{source}:title:{title}"
+    hit = cache.get(key)
+    if hit:
+        return hit
+    record = fetch(doi, title)
+    if record:
+        cache.set(key, record)
+    return record
+
+
+@functools.lru_cache(maxsize=4096)
+def _crossref_record(doi: str, title: str) -> dict:
+    """Return the raw Crossref work record for ``doi`` or a title search.
+
+    Results are memoised on the normalised ``(doi, title)`` pair so reruns
+    and retries do not hit the API again, and kept in :data:`record_cache`
+    when one is set.  Failures raise and are therefore never cached.
+    """
+    return _cached_record("crossref", doi, title, _fetch_crossref)
+
+
+def _fetch_crossref(doi: str, title: str) -> dict:
+    if doi:
+        r = _http_session().get(f"https://api.crossref.org/works/{quote(doi, safe='/')}")
+        return r.json()["message"]
+    r = _http_session().get("https://api.crossref.org/works", params={"query.title": title, "rows": 1})
+    items = r.json()["message"].get("items", [])
+    return items[0] if items else {}
+
+
 def extract_crossref_full(doi: str, title: str | None = None) -> dict:
     """Retrieve metadata from the Crossref API.
 
@@ -83,42 +265,40 @@ def extract_crossref_full(doi: str, title: str | None = None) -> dict:
     Returns
     -------
     dict
-        Dictionary populated with ``fields`` keys.
+        Dictionary populated with ``fields`` keys.  No request is made when
+        neither ``doi`` nor ``title`` is given.
     """
 
-    meta = {f: "" for f in fields}
+    meta = empty_meta()
+    doi = normalize_doi(doi)
+    title = "" if doi else str(title or "").strip()
+    if not doi and not title:
+        return meta
     try:
-        url = f"https://api.crossref.org/works/{normalize_doi(doi)}" if doi else None
-        if url:
-            r = requests.get(url)
-            dat = r.json()["message"]
-        elif title:
-            r = requests.get(f"https://api.crossref.org/works?query.title={title}&rows=1")
-            items = r.json()["message"].get("items", [])
-            dat = items[0] if items else {}
-        else:
-            dat = {}
-        meta["doi"] = normalize_doi(dat.get("DOI", ""))
-        meta["title"] = dat.get("title", [""])[0]
-        if dat.get("author"):
-            meta["author"] = "; ".join(
-                "{}, {}".format(a.get("family", "").strip(), a.get("given", "").strip())
-                for a in dat.get("author")
-            )
-            meta["country"] = "; ".join(
-                aff.get("name", "")
-                for a in dat["author"]
-                for aff in a.get("affiliation", [])
-            ).strip()
-        meta["year"] = str(dat.get("issued", {}).get("date-parts", [[None]])[0][0]) if dat.get("issued") else ""
-        meta["author_keywords"] = ";".join(dat.get("subject", [])) if dat.get("subject") else ""
-        meta["source_journal"] = dat.get("container-title", [""])[0] if dat.get("container-title") else ""
-        meta["study_type"] = dat.get("type", "")
+        meta.update(_apply_schema(_crossref_record(doi, title), CROSSREF_SCHEMA))
     except Exception:
         pass
     return meta
 
 
+@functools.lru_cache(maxsize=4096)
+def _openalex_record(doi: str, title: str) -> dict:
+    """Return the raw OpenAlex work record for ``doi`` or a title search.
+
+    Memoised and persisted like :func:`_crossref_record`.
+    """
+    return _cached_record("openalex", doi, title, _fetch_openalex)
+
+
+def _fetch_openalex(doi: str, title: str) -> dict:
+    if doi:
+        r = _http_session().get(f"https://api.openalex.org/works/https://doi.org/{quote(doi, safe='/')}")
+        return r.json()
+    r = _http_session().get("https://api.openalex.org/works", params={"title.search": title})
+    data = r.json()
+    return data.get("results", [{}])[0] if "results" in data else data
+
+
 def extract_openalex_full(doi: str, title: str | None = None) -> dict:
     """Retrieve metadata from the OpenAlex API.
 
@@ -132,47 +312,270 @@ def extract_openalex_full(doi: str, title: str | None = None) -> dict:
     Returns
     -------
     dict
-        Dictionary populated with ``fields`` keys.
+        Dictionary populated with ``fields`` keys.  No request is made when
+        neither ``doi`` nor ``title`` is given.
     """
 
-    meta = {f: "" for f in fields}
+    meta = empty_meta()
+    doi = normalize_doi(doi)
+    title = "" if doi else str(title or "").strip()
+    if not doi and not title:
+        return meta
     try:
-        url = (
-            f"https://api.openalex.org/works/https://doi.org/{normalize_doi(doi)}"
-            if doi
-            else None
-        )
-        if url:
-            r = requests.get(url)
-            dat = r.json()
-        elif title:
-            url = f"https://api.openalex.org/works?title.search={title}"
-            r = requests.get(url)
-            dat = r.json().get("results", [{}])[0] if "results" in r.json() else r.json()
-        else:
-            dat = {}
-        doi_val = dat.get("doi", "")
-        if doi_val.startswith("https://doi.org/"):
-            doi_val = doi_val[len("https://doi.org/") :]
-        meta["doi"] = normalize_doi(doi_val)
-        meta["title"] = dat.get("title", "")
-        meta["author"] = "; ".join(
-            a.get("author", {}).get("display_name", "") for a in dat.get("authorships", [])
-        )
-        meta["year"] = str(dat.get("publication_year", ""))
-        meta["author_keywords"] = ";".join(dat.get("keywords", [])) if dat.get("keywords") else ""
-        meta["source_journal"] = dat.get("host_venue", {}).get("display_name", "") if dat.get("host_venue") else ""
-        meta["study_type"] = dat.get("type", "")
-        meta["country"] = "; ".join(
-            inst.get("country_code", "")
-            for auth in dat.get("authorships", [])
-            for inst in auth.get("institutions", [])
-        )
+        meta.update(_apply_schema(_openalex_record(doi, title), OPENALEX_SCHEMA))
     except Exception:
         pass
     return meta
 
 
+# DOIs per Crossref/OpenAlex ``filter=doi:`` request
+BATCH_SIZE = 50
+
+
+def _resolve_batch(source: str, dois, query, schema: dict, single) -> dict:
+    """Shared body of :func:`extract_crossref_batch` / :func:`extract_openalex_batch`.
+
+    ``query(chunk)`` returns the raw records for up to :data:`BATCH_SIZE`
+    DOIs and raises on an HTTP error.  DOIs from a failed request, or
+    containing the filter separators, are looked up one by one with
+    ``single`` rather than left blank.
+    """
+    wanted = list(dict.fromkeys(d for d in map(normalize_doi, dois) if d))
+    out, retry = {}, [d for d in wanted if "," in d or "|" in d]
+    batchable = [d for d in wanted if "," not in d and "|" not in d]
+    for i in range(0, len(batchable), BATCH_SIZE):
+        chunk = batchable[i:i + BATCH_SIZE]
+        try:
+            records = query(chunk)
+        except Exception:
+            retry += chunk
+            continue
+        for rec in records:
+            doi = normalize_doi(_dig(rec, schema["doi"][0]))
+            if doi in chunk:
+                out[doi] = _apply_schema(rec, schema)
+                if record_cache is not None:
+                    record_cache.set(f"{source}:doi:{doi}", rec)
+        for doi in chunk:
+            out.setdefault(doi, empty_meta())
+    for doi in retry:
+        out[doi] = single(doi)
+    return out
+
+
+# Filters go through ``params`` so DOIs containing ``;``, ``#``, ``&``, ``+``
+# or ``<>`` (legal, e.g. in SICI DOIs) are percent-encoded rather than
+# corrupting the query string.
+
+def _query_crossref(chunk: list[str]) -> list:
+    filt = ",".join(f"doi:{d}" for d in chunk)
+    r = _http_session().get("https://api.crossref.org/works", params={"filter": filt, "rows": len(chunk)})
+    r.raise_for_status()
+    return r.json()["message"]["items"]
+
+
+def _query_openalex(chunk: list[str]) -> list:
+    params = {"filter": "doi:" + "|".join(chunk), "per-page": len(chunk)}
+    r = _http_session().get("https://api.openalex.org/works", params=params)
+    r.raise_for_status()
+    return r.json()["results"]
+
+
+def extract_crossref_batch(dois) -> dict:
+    """Retrieve Crossref metadata for many DOIs, :data:`BATCH_SIZE` per request.
+
+    Parameters
+    ----------
+    dois : iterable of str
+        DOIs to look up; they are normalised and de-duplicated.
+
+    Returns
+    -------
+    dict
+        Normalised DOI -> metadata dictionary as returned by
+        :func:`extract_crossref_full`.  DOIs Crossref does not know map to
+        blank metadata.
+    """
+
+    return _resolve_batch("crossref", dois, _query_crossref, CROSSREF_SCHEMA, extract_crossref_full)
+
+
+def extract_openalex_batch(dois) -> dict:
+    """Retrieve OpenAlex metadata for many DOIs; see :func:`extract_crossref_batch`."""
+
+    return _resolve_batch("openalex", dois, _query_openalex, OPENALEX_SCHEMA, extract_openalex_full)
+
+
+def _doi_prompt(first_page: str) -> str:
+    return (
+        "Extract only the DOI (Digital Object Identifier) from the following text. If none is found, return an empty JSON.\n"
+        f"Text:\n{first_page}"
+    )
+
+
+def _full_prompt(first_page: str) -> str:
+    return (
+        "Extract the following metadata as a JSON object from the text provided: title, author, year, doi, "
+        "author_keywords, country, source_journal, study_type. "
+        "If a field is missing, leave blank or use null. Text follows:\n" + first_page
+    )
+
+
+def _llm_json(txt: str):
+    """Decode an LLM reply, tolerating a surrounding Markdown code fence."""
+    txt = txt.strip()
+    if txt.startswith("```"):
+        txt = txt.strip("` \n")
+        txt = txt[4:].strip() if txt.startswith("json") else txt
+    return json_loads(txt)
+
+
+def _parse_doi(txt: str) -> str:
+    result = _llm_json(txt)
+    return result.get("doi", "") if isinstance(result, dict) else result
+
+
+def _parse_full(txt: str) -> dict:
+    result = _llm_json(txt)
+    return {k: result.get(k, "") for k in fields}
+
+
+def _llm_cache_key(model: str, prompt: str) -> str:
+    """Key LLM replies by ``sha256(model | prompt)``.
+
+    Changing the model or a prompt template changes the key, so stale
+    entries are never returned.
+    """
+    return hashlib.sha256(f"{model}|{prompt}".encode("utf-8")).hexdigest()
+
+
+def set_llm_cache(path: str | Path | None) -> JsonCache | None:
+    """Persist raw LLM replies at ``path`` (``None`` disables it).
+
+    Re-running extraction over the same documents then costs no API calls.
+    The store is a :class:`~ai_nurse_scr.utils.JsonCache`, so it is safe to
+    share across the thread pools that call :func:`_complete`.
+    """
+    global llm_cache
+    if llm_cache is not None:
+        llm_cache.close()
+    llm_cache = JsonCache(path) if path else None
+    return llm_cache
+
+
+def _complete(prompt: str, model: str, max_tokens: int, parse):
+    """Return ``parse(reply)`` for ``prompt``, consulting :data:`llm_cache`.
+
+    Replies are stored only once they parse, so a malformed answer is
+    retried on the next run.
+    """
+    cache = llm_cache
+    key = _llm_cache_key(model, prompt)
+    if cache is not None:
+        hit = cache.get(key)
+        if hit is not None:
+            return parse(hit)
+    import openai
+
+    resp = openai.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0,
+        max_tokens=max_tokens,
+    )
+    txt = resp.choices[0].message.content
+    result = parse(txt)
+    if cache is not None:
+        cache.set(key, txt)
+    return result
+
+
+class SemanticCache:
+    """Reuse LLM metadata for near-duplicate first pages.
+
+    Each first page is embedded once and compared by cosine similarity with
+    the pages already answered.  A match at or above ``threshold`` returns
+    the stored answer, so preprint/published copies of a paper or repeated
+    extractions with whitespace differences skip the chat call.  The
+    threshold is deliberately tight because DOI and title must agree.
+    Vectors and answers persist as ``<prefix>.npy`` and ``<prefix>.jsonl``.
+    """
+
+    def __init__(
+        self,
+        prefix: str | Path,
+        threshold: float = 0.97,
+        embedding_model: str = "text-embedding-3-small",
+        max_chars: int = 3000,
+    ):
+        if np is None:
+            raise RuntimeError("numpy is required for SemanticCache")
+        self.prefix = Path(prefix)
+        self.threshold = threshold
+        self.embedding_model = embedding_model
+        self.max_chars = max_chars
+        self.vecs = None
+        self.answers: list[dict] = []
+        npy, jsonl = self._paths()
+        if npy.exists() and jsonl.exists():
+            self.vecs = np.load(npy)
+            with open(jsonl, "rb") as f:
+                self.answers = [json_loads(line) for line in f if line.strip()]
+
+    def _paths(self) -> tuple[Path, Path]:
+        return self.prefix.with_suffix(".npy"), self.prefix.with_suffix(".jsonl")
+
+    def embed(self, text: str, api_key: str | None = None):
+        """Return the unit-normalised embedding of ``text[:max_chars]``."""
+        import openai
+
+        client = openai.OpenAI(api_key=api_key or OPENAI_API_KEY)
+        vec = client.embeddings.create(model=self.embedding_model, input=text[: self.max_chars]).data[0].embedding
+        vec = np.asarray(vec, dtype=np.float32)
+        return vec / (np.linalg.norm(vec) or 1.0)
+
+    def lookup(self, vec) -> dict | None:
+        if self.vecs is None or not len(self.answers):
+            return None
+        sims = self.vecs @ vec
+        i = int(sims.argmax())
+        return dict(self.answers[i]) if sims[i] >= self.threshold else None
+
+    def add(self, vec, answer: dict) -> None:
+        self.vecs = vec[None, :] if self.vecs is None else np.vstack([self.vecs, vec])
+        self.answers.append(dict(answer))
+        npy, jsonl = self._paths()
+        npy.parent.mkdir(parents=True, exist_ok=True)
+        np.save(npy, self.vecs)
+        with open(jsonl, "ab") as f:
+            f.write(json_dumpb(answer) + b"\n")
+
+
+def extract_ai_llm_full_semantic(
+    first_page: str,
+    cache: SemanticCache,
+    api_key: str | None = None,
+    model: str | None = None,
+) -> dict:
+    """:func:`extract_ai_llm_full` behind a :class:`SemanticCache`.
+
+    Falls back to a plain call if the embedding request fails.  Only
+    answers with at least one non-empty field are added to the cache.
+    """
+
+    try:
+        vec = cache.embed(first_page, api_key)
+    except Exception:
+        return extract_ai_llm_full(first_page, api_key, model)
+    hit = cache.lookup(vec)
+    if hit is not None:
+        return hit
+    meta = extract_ai_llm_full(first_page, api_key, model)
+    if any(meta.values()):
+        cache.add(vec, meta)
+    return meta
+
+
 def extract_ai_llm_doi_only(first_page: str, api_key: str | None = None, model: str | None = None) -> str:
     """Extract a DOI from the first page text using an LLM.
 
@@ -194,27 +597,10 @@ def extract_ai_llm_doi_only(first_page: str, api_key: str | None = None, model:
     """
 
     api_key = api_key or OPENAI_API_KEY
-    prompt = (
-        "Extract only the DOI (Digital Object Identifier) from the following text. If none is found, return an empty JSON.\n"
-        f"Text:\n{first_page}"
-    )
     if not api_key:
         return ""
     try:
-        import openai
-
-        resp = openai.chat.completions.create(
-            model=model or llm_model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=24,
-        )
-        txt = resp.choices[0].message.content.strip()
-        if txt.startswith("```"):
-            txt = txt.strip("` \n")
-            txt = txt[4:].strip() if txt.startswith("json") else txt
-        result = json.loads(txt)
-        return result.get("doi", "") if isinstance(result, dict) else result
+        return _complete(_doi_prompt(first_page), model or llm_model, 24, _parse_doi)
     except Exception:
         return ""
 
@@ -240,27 +626,281 @@ def extract_ai_llm_full(first_page: str, api_key: str | None = None, model: str
     """
 
     api_key = api_key or OPENAI_API_KEY
-    prompt = (
-        "Extract the following metadata as a JSON object from the text provided: title, author, year, doi, "
-        "author_keywords, country, source_journal, study_type. "
-        "If a field is missing, leave blank or use null. Text follows:\n" + first_page
-    )
     if not api_key:
-        return {k: "" for k in fields}
+        return empty_meta()
+    try:
+        return _complete(_full_prompt(first_page), model or llm_model, 384, _parse_full)
+    except Exception:
+        return empty_meta()
+
+
+class _RateLimiter:
+    """Space request starts to stay under per-minute request/token budgets."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self, tokens: int) -> None:
+        interval = max(
+            60.0 / self.rpm if self.rpm else 0.0,
+            60.0 * tokens / self.tpm if self.tpm else 0.0,
+        )
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def _gather_llm(
+    prompts: list[str],
+    api_key: str,
+    model: str,
+    max_tokens: int,
+    concurrency: int,
+    max_requests_per_minute: float,
+    max_tokens_per_minute: float,
+    max_attempts: int,
+) -> list:
+    import openai
+
+    client = openai.AsyncOpenAI(api_key=api_key)
+    sem = asyncio.Semaphore(concurrency)
+    limiter = _RateLimiter(max_requests_per_minute, max_tokens_per_minute)
+    retryable = tuple(
+        e for e in (getattr(openai, "RateLimitError", None), getattr(openai, "APITimeoutError", None))
+        if isinstance(e, type)
+    )
+
+    async def one(prompt: str):
+        for attempt in range(max_attempts):
+            async with sem:
+                # Rough token estimate: ~4 characters per prompt token.
+                await limiter.wait(len(prompt) // 4 + max_tokens)
+                try:
+                    resp = await client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=0,
+                        max_tokens=max_tokens,
+                    )
+                    return resp.choices[0].message.content
+                except retryable:
+                    if attempt == max_attempts - 1:
+                        raise
+            await asyncio.sleep(2 ** attempt)
+
+    return await asyncio.gather(*(one(p) for p in prompts), return_exceptions=True)
+
+
+def _run_llm_batch(prompts, parse, default, api_key, model, max_tokens, **kwargs) -> list:
+    api_key = api_key or OPENAI_API_KEY
+    model = model or llm_model
+    if not api_key or not prompts:
+        return [default() for _ in prompts]
+    cache = llm_cache
+    keys = [_llm_cache_key(model, p) for p in prompts]
+    replies = [cache.get(k) if cache is not None else None for k in keys]
+    todo = [i for i, r in enumerate(replies) if r is None]
+    if todo:
+        try:
+            fresh = asyncio.run(_gather_llm([prompts[i] for i in todo], api_key, model, max_tokens, **kwargs))
+        except Exception:
+            fresh = [None] * len(todo)
+        for i, reply in zip(todo, fresh):
+            replies[i] = None if isinstance(reply, BaseException) else reply
+    fetched = set(todo)
+    out = []
+    for i, reply in enumerate(replies):
+        try:
+            out.append(default() if reply is None else parse(reply))
+        except Exception:
+            out.append(default())
+            continue
+        if cache is not None and i in fetched:
+            cache.set(keys[i], reply)
+    return out
+
+
+def extract_ai_llm_doi_only_many(
+    pages: list[str],
+    api_key: str | None = None,
+    model: str | None = None,
+    concurrency: int = 10,
+    max_requests_per_minute: float = 500,
+    max_tokens_per_minute: float = 150_000,
+    max_attempts: int = 3,
+) -> list[str]:
+    """Concurrent variant of :func:`extract_ai_llm_doi_only`.
+
+    Parameters
+    ----------
+    pages : list of str
+        First-page texts, one per document.
+    api_key, model : str, optional
+        As for :func:`extract_ai_llm_doi_only`.
+    concurrency : int, optional
+        Maximum number of requests in flight at once.
+    max_requests_per_minute, max_tokens_per_minute : float, optional
+        Rate limits used to space out request starts.
+    max_attempts : int, optional
+        Attempts per request on rate-limit or timeout errors, with
+        exponential backoff between them.
+
+    Returns
+    -------
+    list of str
+        DOIs in the same order as ``pages``; failures give ``""``.
+        Uses :func:`asyncio.run`, so it must not be called from a running
+        event loop.
+    """
+
+    return _run_llm_batch(
+        [_doi_prompt(p) for p in pages], _parse_doi, str, api_key, model, 24,
+        concurrency=concurrency,
+        max_requests_per_minute=max_requests_per_minute,
+        max_tokens_per_minute=max_tokens_per_minute,
+        max_attempts=max_attempts,
+    )
+
+
+def extract_ai_llm_full_many(
+    pages: list[str],
+    api_key: str | None = None,
+    model: str | None = None,
+    concurrency: int = 10,
+    max_requests_per_minute: float = 500,
+    max_tokens_per_minute: float = 150_000,
+    max_attempts: int = 3,
+) -> list[dict]:
+    """Concurrent variant of :func:`extract_ai_llm_full`.
+
+    Parameters are as for :func:`extract_ai_llm_doi_only_many`.
+
+    Returns
+    -------
+    list of dict
+        Metadata dictionaries in the same order as ``pages``; failed
+        requests give :func:`empty_meta`.
+    """
+
+    return _run_llm_batch(
+        [_full_prompt(p) for p in pages], _parse_full, empty_meta, api_key, model, 384,
+        concurrency=concurrency,
+        max_requests_per_minute=max_requests_per_minute,
+        max_tokens_per_minute=max_tokens_per_minute,
+        max_attempts=max_attempts,
+    )
+
+
+def build_batch_jsonl(pages: dict[str, str], path: str | Path, model: str | None = None) -> Path:
+    """Write one Batch API request per page to ``path``.
+
+    Parameters
+    ----------
+    pages : dict
+        Mapping of document id (used as ``custom_id``) to first-page text.
+    path : str or Path
+        Destination JSONL file.
+    model : str, optional
+        LLM model name, default uses ``llm_model``.
+
+    Returns
+    -------
+    Path
+        The written file.
+    """
+
+    path = Path(path)
+    with open(path, "wb") as f:
+        for custom_id, text in pages.items():
+            req = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model or llm_model,
+                    "messages": [{"role": "user", "content": _full_prompt(text)}],
+                    "temperature": 0,
+                    "max_tokens": 384,
+                },
+            }
+            f.write(json_dumpb(req) + b"\n")
+    return path
+
+
+def extract_ai_llm_full_batch(
+    pages: dict[str, str],
+    api_key: str | None = None,
+    model: str | None = None,
+    poll_interval: float = 30.0,
+    timeout: float = 24 * 3600,
+) -> dict[str, dict]:
+    """Run :func:`extract_ai_llm_full` for many pages through the Batch API.
+
+    All prompts are uploaded as a single JSONL file, the batch is polled
+    until it finishes and the output file is parsed.  This is slower to
+    return than :func:`extract_ai_llm_full_many` but costs half as much, so
+    it suits non-interactive runs.
+
+    Parameters
+    ----------
+    pages : dict
+        Mapping of document id to first-page text.
+    api_key : str, optional
+        OpenAI API key. Defaults to the ``OPENAI_API_KEY`` environment
+        variable.
+    model : str, optional
+        LLM model name, default uses ``llm_model``.
+    poll_interval : float, optional
+        Seconds between status checks.
+    timeout : float, optional
+        Give up waiting after this many seconds.
+
+    Returns
+    -------
+    dict
+        Metadata keyed by document id.  Ids whose request failed, or all
+        ids if the batch could not be run, map to :func:`empty_meta`.
+    """
+
+    results = {k: empty_meta() for k in pages}
+    api_key = api_key or OPENAI_API_KEY
+    if not api_key or not pages:
+        return results
     try:
         import openai
 
-        resp = openai.chat.completions.create(
-            model=model or llm_model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            max_tokens=384,
+        client = openai.OpenAI(api_key=api_key)
+        with tempfile.TemporaryDirectory() as td:
+            src = build_batch_jsonl(pages, Path(td) / "batch_input.jsonl", model)
+            with open(src, "rb") as f:
+                upload = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
         )
-        txt = resp.choices[0].message.content.strip()
-        if txt.startswith("```"):
-            txt = txt.strip("` \n")
-            txt = txt[4:].strip() if txt.startswith("json") else txt
-        result = json.loads(txt)
-        return {k: result.get(k, "") for k in fields}
+        deadline = time.monotonic() + timeout
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            if time.monotonic() > deadline:
+                return results
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch.id)
+        if batch.status != "completed" or not batch.output_file_id:
+            return results
+        output = client.files.content(batch.output_file_id).text
     except Exception:
-        return {k: "" for k in fields}
+        return results
+    for line in output.splitlines():
+        try:
+            rec = json_loads(line)
+            body = rec["response"]["body"]
+            results[rec["custom_id"]] = _parse_full(body["choices"][0]["message"]["content"])
+        except Exception:
+            continue
+    return results
@@ -1,3 +1,3 @@
-__all__ = ["run_pipeline"]
+__all__ = ["run_pipeline", "run_pipeline_batch"]
 
-from .pipeline import run_pipeline
+from .pipeline import run_pipeline, run_pipeline_batch
@@ -2,16 +2,29 @@ import argparse
 import json
 from pathlib import Path
 
-from .pipeline import run_pipeline
+from .. import extraction
+from ..utils import set_hash_cache
+from .pipeline import LLM_POLICIES, run_pipeline
 
 
 def main(argv=None):
     parser = argparse.ArgumentParser(description="Run paperqa2 pipeline")
     parser.add_argument("pdf", type=Path, help="Path to PDF file")
     parser.add_argument("--output", type=Path, help="Output JSON file")
+    parser.add_argument("--hash-cache", type=Path, help="SQLite file caching PDF SHA-256 digests across runs")
+    parser.add_argument("--api-cache", type=Path, help="SQLite file caching Crossref/OpenAlex records (90-day TTL)")
+    parser.add_argument("--llm-cache", type=Path, help="SQLite file caching raw LLM replies per model and prompt")
+    parser.add_argument("--llm-policy", choices=LLM_POLICIES, default="fallback",
+                        help="Final LLM pass: always, only when required fields are missing (default), or never")
     args = parser.parse_args(argv)
 
-    result = run_pipeline(args.pdf)
+    if args.hash_cache:
+        set_hash_cache(args.hash_cache)
+    if args.api_cache:
+        extraction.set_record_cache(args.api_cache)
+    if args.llm_cache:
+        extraction.set_llm_cache(args.llm_cache)
+    result = run_pipeline(args.pdf, llm_policy=args.llm_policy)
     if args.output:
         args.output.write_text(json.dumps(result, indent=2))
     else:
@@ -2,6 +2,9 @@ from pathlib import Path
 
 from ...utils import check_grobid_healthy
 
+# Header-only TEI is normally a few KiB; never read more than this.
+MAX_TEI_BYTES = 256 * 1024
+
 
 def extract_grobid(pdf_path: str | Path) -> dict:
     """Call a local GROBID service to extract header information.
@@ -16,6 +19,9 @@ def extract_grobid(pdf_path: str | Path) -> dict:
     dict
         Dictionary containing the key ``"grobid_xml"`` if successful, or an
         empty dictionary if the service is unavailable or an error occurs.
+        The response is streamed and at most ``MAX_TEI_BYTES`` are read.
+        GROBID's own Crossref consolidation is disabled since the pipeline
+        queries Crossref itself.
     """
     if not check_grobid_healthy():
         return {}
@@ -24,13 +30,16 @@ def extract_grobid(pdf_path: str | Path) -> dict:
     except Exception:
         return {}
     try:
-        with open(pdf_path, "rb") as f:
-            resp = requests.post(
-                "http://localhost:8070/api/processHeaderDocument",
-                files={"input": f},
-            )
-        resp.raise_for_status()
-        return {"grobid_xml": resp.text}
+        with open(pdf_path, "rb") as f, requests.post(
+            "http://localhost:8070/api/processHeaderDocument",
+            files={"input": f},
+            data={"consolidateHeader": "0"},
+            stream=True,
+        ) as resp:
+            resp.raise_for_status()
+            resp.raw.decode_content = True
+            tei = resp.raw.read(MAX_TEI_BYTES).decode("utf-8", errors="replace")
+        return {"grobid_xml": tei}
     except Exception:
         return {}
 
@@ -19,5 +19,5 @@ def extract_llm(data: dict) -> dict:
     try:
         return extraction.extract_ai_llm_full(text)
     except Exception:
-        return {k: "" for k in extraction.fields}
+        return extraction.empty_meta()
 
@@ -18,5 +18,17 @@ def extract_openalex(doi: str) -> dict:
     try:
         return extraction.extract_openalex_full(doi)
     except Exception:
-        return {k: "" for k in extraction.fields}
+        return extraction.empty_meta()
 
+
+
+def extract_openalex_batch(dois) -> dict:
+    """Retrieve OpenAlex metadata for many DOIs in batched requests.
+
+    Returns a mapping of normalised DOI to metadata, or an empty mapping on
+    failure so callers fall back to :func:`extract_openalex`.
+    """
+    try:
+        return extraction.extract_openalex_batch(dois)
+    except Exception:
+        return {}
@@ -3,13 +3,33 @@ from pathlib import Path
 from ... import extraction
 
 
-def extract_pdfmeta(pdf_path: str | Path) -> dict:
+def first_page_text(pdf_path: str | Path) -> str:
+    """Return the text of the first page of ``pdf_path`` or ``""``.
+
+    This is the CPU-bound part of :func:`extract_pdfmeta`; it is a plain
+    module-level function so it can run in a process pool.
+    """
+    try:
+        import pdfplumber
+    except Exception:
+        return ""
+    try:
+        with pdfplumber.open(Path(pdf_path)) as pdf:
+            return pdf.pages[0].extract_text() if pdf.pages else ""
+    except Exception:
+        return ""
+
+
+def extract_pdfmeta(pdf_path: str | Path, first_page: str | None = None) -> dict:
     """Extract initial metadata from the first page of a PDF.
 
     Parameters
     ----------
     pdf_path : str or Path
         Path to the PDF file to inspect.
+    first_page : str, optional
+        First-page text already extracted with :func:`first_page_text`;
+        the PDF is only parsed when this is ``None``.
 
     Returns
     -------
@@ -17,20 +37,7 @@ def extract_pdfmeta(pdf_path: str | Path) -> dict:
         Metadata dictionary returned by :func:`extraction.extract_ai_llm_full`.
         The key ``"raw_first_page"`` is added containing the extracted text.
     """
-    pdf_path = Path(pdf_path)
-    try:
-        import pdfplumber
-    except Exception:
-        pdfplumber = None
-    if pdfplumber is not None:
-        try:
-            with pdfplumber.open(pdf_path) as pdf:
-                first = pdf.pages[0].extract_text() if pdf.pages else ""
-        except Exception:
-            first = ""
-    else:
-        first = ""
+    first = first_page_text(pdf_path) if first_page is None else first_page
     meta = extraction.extract_ai_llm_full(first)
     meta["raw_first_page"] = first
     return meta
-
@@ -1,24 +1,97 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
-from ..utils import sha256_file, normalize_doi
+from ..utils import is_valid_doi, sha256_file, normalize_doi
 from .extract.grobid import extract_grobid
-from .extract.pdfmeta import extract_pdfmeta
-from .extract.crossref import extract_crossref
-from .extract.openalex import extract_openalex
+from .extract.pdfmeta import extract_pdfmeta, first_page_text
+from .extract.crossref import extract_crossref, extract_crossref_batch
+from .extract.openalex import extract_openalex, extract_openalex_batch
 from .extract.llm import extract_llm
 
+# Fields that must all be filled for ``llm_policy="fallback"`` to skip the final LLM call.
+REQUIRED_FIELDS = ("title", "author", "year", "doi", "source_journal")
+LLM_POLICIES = ("always", "fallback", "never")
 
-def run_pipeline(pdf_path: str | Path) -> dict:
-    """Run the full extraction pipeline on a PDF."""
-    pdf_path = Path(pdf_path)
+
+def _local_meta(pdf_path: Path, first_page: str | None = None) -> dict:
+    """Hash ``pdf_path`` and read its embedded metadata."""
     result = {
         "sha256": sha256_file(pdf_path),
     }
-    result.update(extract_pdfmeta(pdf_path))
+    result.update(extract_pdfmeta(pdf_path, first_page=first_page))
     if "doi" in result:
         result["doi"] = normalize_doi(result["doi"])
-        result.update(extract_crossref(result["doi"]))
-        result.update(extract_openalex(result["doi"]))
-    result.update(extract_grobid(pdf_path))
-    result.update(extract_llm(result))
     return result
+
+
+def _finish(pdf_path: Path, result: dict, crossref: dict | None, openalex: dict | None,
+            llm_policy: str = "fallback") -> dict:
+    """Merge the API metadata for ``result``'s DOI, then run Grobid and the LLM.
+
+    Grobid and any outstanding Crossref/OpenAlex lookups are I/O-bound and
+    independent, so they run concurrently; results are merged in the fixed
+    order Crossref, OpenAlex, Grobid.  The LLM runs per ``llm_policy``:
+    ``"always"``, ``"never"``, or ``"fallback"`` (only when a
+    :data:`REQUIRED_FIELDS` value is still empty).  ``result["llm_queried"]``
+    records which path was taken.
+    """
+    if llm_policy not in LLM_POLICIES:
+        raise ValueError(f"Unknown llm_policy: {llm_policy!r}")
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        grobid = pool.submit(extract_grobid, pdf_path)
+        # Placeholder or garbled DOIs never reach Crossref/OpenAlex
+        if is_valid_doi(result.get("doi")):
+            doi = result["doi"]
+            cr = pool.submit(extract_crossref, doi) if crossref is None else None
+            oa = pool.submit(extract_openalex, doi) if openalex is None else None
+            result.update(crossref if cr is None else cr.result())
+            result.update(openalex if oa is None else oa.result())
+        result.update(grobid.result())
+    result["llm_queried"] = llm_policy == "always" or (
+        llm_policy == "fallback" and not all(result.get(k) for k in REQUIRED_FIELDS)
+    )
+    if result["llm_queried"]:
+        result.update(extract_llm(result))
+    return result
+
+
+def run_pipeline(pdf_path: str | Path, llm_policy: str = "fallback") -> dict:
+    """Run the full extraction pipeline on a PDF.
+
+    ``llm_policy`` controls the final LLM pass; see :func:`_finish`.
+    """
+    pdf_path = Path(pdf_path)
+    return _finish(pdf_path, _local_meta(pdf_path), None, None, llm_policy)
+
+
+def run_pipeline_batch(pdf_paths, workers: int = 8, processes: int | None = None,
+                       llm_policy: str = "fallback") -> list[dict]:
+    """Run the pipeline on several PDFs, batching the Crossref/OpenAlex lookups.
+
+    First-page text is parsed in a pool of ``processes`` worker processes
+    (default: one per CPU; ``1`` parses in this process), since pdfplumber is
+    pure-Python and holds the GIL.  The workers are spawned rather than
+    forked, because this process may already hold threads and pooled HTTP
+    connections that a fork would copy mid-use.  Hashing and embedded-metadata extraction
+    then run for up to ``workers`` PDFs at a time, and must finish for every
+    PDF so their DOIs can be resolved with a few ``filter=doi:`` requests
+    instead of one request per PDF and service.  Grobid and the LLM then run
+    on the same thread pool.  Results are returned in input
+    order.
+    """
+    pdf_paths = [Path(p) for p in pdf_paths]
+    if len(pdf_paths) > 1 and processes != 1:
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            texts = list(pool.map(first_page_text, pdf_paths, chunksize=4))
+    else:
+        texts = [None] * len(pdf_paths)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        locals_ = list(pool.map(_local_meta, pdf_paths, texts))
+        dois = [r["doi"] for r in locals_ if is_valid_doi(r.get("doi"))]
+        crossref = extract_crossref_batch(dois) if dois else {}
+        openalex = extract_openalex_batch(dois) if dois else {}
+        return list(pool.map(
+            lambda p, r: _finish(p, r, crossref.get(r.get("doi")), openalex.get(r.get("doi")), llm_policy),
+            pdf_paths, locals_,
+        ))
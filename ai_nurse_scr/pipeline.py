@@ -3,24 +3,50 @@ from __future__ import annotations
 import json
 import subprocess
 import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import tempfile
 try:
     import yaml
+    _YamlDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
 except Exception:  # pragma: no cover - optional dependency
-    yaml = None
+    yaml = _YamlDumper = None
 
 from dataclasses import asdict
 from typing import List, Callable, Dict
 
 from . import extraction, config, metrics, __version__, __git_hash__
 from . import paths
+from .utils import list_pdfs, json_dumpb
 
 
 # ---------------------------------------------------------------------------
 # Helper utilities
 # ---------------------------------------------------------------------------
 
+SNAPSHOT_FORMATS = ("yaml", "json")
+
+
+def _write_snapshot(out_dir: Path, name: str, data: dict, fmt: str = "yaml") -> Path:
+    """Write ``data`` to ``out_dir/name.<fmt>`` and return the file path.
+
+    ``fmt="json"`` writes indented JSON through :func:`utils.json_dumpb`,
+    which is much cheaper to emit and re-read than YAML.  Without PyYAML
+    the ``.yaml`` file falls back to JSON content, which YAML parsers accept.
+    """
+    if fmt not in SNAPSHOT_FORMATS:
+        raise ValueError(f"snapshot_format must be one of {SNAPSHOT_FORMATS}, got {fmt!r}")
+    path = out_dir / f"{name}.{fmt}"
+    if fmt == "json" or not yaml:
+        path.write_bytes(json_dumpb(data, indent=True))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            yaml.dump(data, f, Dumper=_YamlDumper, sort_keys=False)
+    return path
+
+
 def load_config(path: str) -> config.Config:
     """Load configuration using :func:`ai_nurse_scr.config.load_config`."""
     return config.load_config(path)
@@ -28,30 +54,71 @@ def load_config(path: str) -> config.Config:
 
 def find_pdfs(directory: str):
     """Yield PDF files within the directory."""
-    return sorted(Path(directory).glob("*.pdf"))
+    return list_pdfs(directory)
+
 
+def prefetch(fn: Callable, items, depth: int = 4):
+    """Yield ``(item, fn(item))`` in order, computing up to ``depth`` items ahead.
 
-def extract_text(pdf_path: Path) -> str:
-    """Return all text from a PDF using ``pdfplumber``."""
+    Used to overlap local PDF parsing with the network-bound work done on
+    each result by the caller.
+    """
+    it = iter(items)
+    with ThreadPoolExecutor(max_workers=depth) as pool:
+        pending = deque((item, pool.submit(fn, item)) for item in islice(it, depth))
+        while pending:
+            item, fut = pending.popleft()
+            for nxt in it:
+                pending.append((nxt, pool.submit(fn, nxt)))
+                break
+            yield item, fut.result()
+
+
+def extract_text(pdf_path: Path, full_text: bool = True) -> str:
+    """Return all text from a PDF using ``pdfplumber``.
+
+    With ``full_text=False`` only the first page is parsed, which is all
+    metadata extraction needs.
+    """
     try:  # pragma: no cover - optional dependency
         import pdfplumber
     except Exception:  # pragma: no cover - pdfplumber missing
         return ""
     try:
         with pdfplumber.open(pdf_path) as pdf:
-            return "\n".join(page.extract_text() or "" for page in pdf.pages)
+            pages = pdf.pages if full_text else pdf.pages[:1]
+            return "\n".join(page.extract_text() or "" for page in pages)
     except Exception:
         return ""
 
 
+# Crossref fields that must all be present for the LLM call to be skipped.
+CASCADE_FIELDS = ("title", "author", "year")
+
+
 def extract_data(text: str, model: str = "gpt-4") -> dict:
-    """Extract structured metadata from paper text."""
+    """Extract structured metadata from paper text.
+
+    Cheap sources are tried first: if the text contains a DOI that Crossref
+    resolves to a record with all :data:`CASCADE_FIELDS`, the LLM is not
+    called at all.  ``meta["llm_queried"]`` records which path was taken.
+    """
     first_chunk = text[:4000]
-    meta = extraction.extract_ai_llm_full(first_chunk, model=model)
-    doi = meta.get("doi", "")
-    if doi:
-        cr = extraction.extract_crossref_full(doi, meta.get("title"))
+    doi = extraction.find_doi(first_chunk)
+    cr = extraction.extract_crossref_full(doi) if doi else {}
+    if all(cr.get(k) for k in CASCADE_FIELDS):
+        meta = extraction.empty_meta()
+        meta["doi"] = doi
         meta.update({k: v for k, v in cr.items() if v})
+        meta["llm_queried"] = False
+    else:
+        meta = extraction.extract_ai_llm_full(first_chunk, model=model)
+        doi = meta.get("doi", "")
+        if doi:
+            cr = extraction.extract_crossref_full(doi, meta.get("title"))
+            meta.update({k: v for k, v in cr.items() if v})
+        meta["llm_queried"] = True
+    if doi:
         oa = extraction.extract_openalex_full(doi, meta.get("title"))
         meta.update({k: v for k, v in oa.items() if v})
     return meta
@@ -91,8 +158,7 @@ def run_metadata(config_path: str, pdf_dir: str, force: bool = False) -> Path |
 
     all_chunks: list[list[str]] = []
     results = []
-    for pdf in pdfs:
-        text = extract_text(pdf)
+    for pdf, text in prefetch(extract_text, pdfs):
         tokens = metrics.simple_tokenize(text)
         chunks = metrics.make_chunks(tokens, chunk_size)
         all_chunks.extend(chunks)
@@ -115,12 +181,8 @@ def run_metadata(config_path: str, pdf_dir: str, force: bool = False) -> Path |
         commit = "unknown"
     snapshot["commit"] = commit
 
-    snapshot_file = out_dir / "config_snapshot.yaml"
-    with open(snapshot_file, "w", encoding="utf-8") as f:
-        if yaml:
-            yaml.safe_dump(snapshot, f, sort_keys=False)
-        else:
-            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+    snapshot_format = cfg.extra.get("snapshot_format", "yaml")
+    _write_snapshot(out_dir, "config_snapshot", snapshot, snapshot_format)
 
     run_info = {
         "run_id": cfg.run_id,
@@ -128,18 +190,13 @@ def run_metadata(config_path: str, pdf_dir: str, force: bool = False) -> Path |
         "git_hash": __git_hash__,
         "timestamp": time.strftime("%Y%m%d_%H%M"),
     }
-    with open(out_dir / "run_info.yaml", "w", encoding="utf-8") as f:
-        if yaml:
-            yaml.safe_dump(run_info, f, sort_keys=False)
-        else:
-            json.dump(run_info, f, ensure_ascii=False, indent=2)
+    _write_snapshot(out_dir, "run_info", run_info, snapshot_format)
 
         
     out_file = out_dir / paths.timestamped_filename(f"{cfg.run_id}_metadata")
 
     with open(out_file, "w", encoding="utf-8") as f:
-        for row in results:
-            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        f.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in results))
 
     stats = metrics.chunk_statistics(all_chunks)
     metrics.write_metrics(
@@ -190,12 +247,12 @@ def run_chunking(config_path: str, pdf_dir: str) -> Path:
 
     out_file = out_dir / f"{cfg.run_id}_chunks.jsonl"
     with open(out_file, "w", encoding="utf-8") as f:
-        for pdf in pdfs:
-            text = extract_text(pdf)
+        for pdf, text in prefetch(extract_text, pdfs):
             tokens = metrics.simple_tokenize(text)
-            for idx, chunk in enumerate(metrics.make_chunks(tokens, chunk_size)):
-                rec = {"pdf_path": str(pdf), "chunk_index": idx, "tokens": chunk}
-                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.write("".join(
+                json.dumps({"pdf_path": str(pdf), "chunk_index": idx, "tokens": chunk}, ensure_ascii=False) + "\n"
+                for idx, chunk in enumerate(metrics.make_chunks(tokens, chunk_size))
+            ))
 
     print("✔ Stage chunking completed")
     return out_file
@@ -1,52 +1,293 @@
+import atexit
+import copy
+import functools
 import hashlib
 import os
 import json
 import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
 from pathlib import Path
 try:
     import requests
 except Exception:  # pragma: no cover - optional dependency
     requests = None
+try:
+    import orjson
+except Exception:  # pragma: no cover - optional dependency
+    orjson = None
+try:
+    import yaml
+    _YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+except Exception:  # pragma: no cover - optional dependency
+    yaml = _YamlLoader = None
+try:
+    import zstandard
+except Exception:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+def json_loads(data: str | bytes):
+    """Parse JSON text, using ``orjson`` when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj, indent: bool = False) -> str:
+    """Serialise ``obj`` to a JSON string, using ``orjson`` when installed.
+
+    Non-ASCII characters are written as-is in both code paths.
+    """
+    return json_dumpb(obj, indent=indent).decode("utf-8")
+
+
+def json_dumpb(obj, indent: bool = False) -> bytes:
+    """Serialise ``obj`` to UTF-8 JSON bytes, compact unless ``indent``.
+
+    Callers writing files should prefer this over :func:`json_dumps` so
+    ``orjson`` output goes to disk without a decode/encode round trip.
+    Non-string dict keys are coerced to strings as :mod:`json` does.
+    """
+    if orjson is not None:
+        opt = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=opt)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    # Match orjson's compact separators so bytes (and their hashes) do not
+    # depend on which backend is installed
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def load_yaml(path: str | os.PathLike):
+    """Parse a YAML file with the libyaml ``CSafeLoader`` when available.
+
+    Parsed documents are cached per path and invalidated when the file's
+    mtime or size changes, so blocks that reload the same ``config.yaml``
+    do not re-parse it.  Each call returns an independent copy.
+    """
+    if yaml is None:
+        raise ImportError("PyYAML is required to load YAML files.")
+    st = os.stat(path)
+    return copy.deepcopy(_load_yaml_cached(os.fspath(path), st.st_mtime_ns, st.st_size))
+
+
+@functools.lru_cache(maxsize=16)
+def _load_yaml_cached(path: str, mtime_ns: int, size: int):
+    """Cached body of :func:`load_yaml`; the stat fields only key the cache."""
+    with open(path, "rb") as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
+
+def write_bytes_hashed(path: str | os.PathLike, data: bytes) -> str:
+    """Write ``data`` to ``path`` and return its SHA-256 hex digest.
+
+    The digest is computed from the in-memory bytes, so callers that need
+    a fixity hash do not have to read the file back.
+    """
+    with open(path, "wb") as f:
+        f.write(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_csv(df, path: str | os.PathLike, index: bool = False, compression: str | None = None) -> str:
+    """Write a pandas DataFrame to CSV and return the file's SHA-256.
+
+    The CSV is always rendered by :meth:`pandas.DataFrame.to_csv`, so the
+    bytes (and the logged hash) do not depend on which optional packages
+    are installed.  It is rendered in memory and hashed in the same pass
+    as it is written.  ``compression`` may be ``"gzip"`` or ``"zstd"`` (the
+    latter needs the optional ``zstandard`` package); the digest is then of
+    the compressed bytes on disk.
+    """
+    data = df.to_csv(index=index).encode("utf-8")
+    if compression == "gzip":
+        import gzip
+        data = gzip.compress(data, mtime=0)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ImportError("compression='zstd' requires the zstandard package")
+        data = zstandard.ZstdCompressor(level=3).compress(data)
+    elif compression is not None:
+        raise ValueError(f"Unsupported CSV compression: {compression!r}")
+    return write_bytes_hashed(path, data)
+
+
+def sha256_file(path: str | os.PathLike | Path, bufsize: int = 1 << 20) -> str | None:
+    """Return SHA-256 hex digest of a file or ``None`` if unreadable.
+
+    The file is streamed, never read into memory whole; on Python 3.11+
+    :func:`hashlib.file_digest` does the ``bufsize`` chunked reads in C.
+    Older interpreters reuse one ``bufsize`` buffer via ``readinto`` so peak
+    memory stays constant regardless of file size.
+
+    When a digest cache is enabled with :func:`set_hash_cache`, a file whose
+    path, size and mtime are unchanged is not read again.
+    """
+    cache = hash_cache
+    if cache is None:
+        return _sha256_stream(path, bufsize)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = f"sha256:{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    digest = cache.get(key)
+    if digest is None:
+        digest = _sha256_stream(path, bufsize)
+        if digest is not None:
+            cache.set(key, digest)
+    return digest
+
 
+# Optional persistent digest cache, see :func:`set_hash_cache`.
+hash_cache = None
 
-def sha256_file(path: str | os.PathLike | Path) -> str | None:
-    """Return SHA-256 hex digest of a file or ``None`` if unreadable."""
-    h = hashlib.sha256()
+
+def set_hash_cache(path: str | os.PathLike | None):
+    """Enable the persistent SHA-256 cache at ``path`` (``None`` disables it).
+
+    Setting ``AI_NURSE_SCR_NO_HASH_CACHE`` in the environment keeps it off,
+    for audit runs that must re-read every file.
+    """
+    global hash_cache
+    if hash_cache is not None:
+        hash_cache.close()
+    disabled = not path or os.environ.get("AI_NURSE_SCR_NO_HASH_CACHE")
+    hash_cache = None if disabled else JsonCache(path)
+    return hash_cache
+
+
+def _sha256_stream(path, bufsize: int) -> str | None:
+    """Uncached body of :func:`sha256_file`."""
+    try:
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(hashlib, "file_digest"):
+                return hashlib.file_digest(f, "sha256", _bufsize=bufsize).hexdigest()
+            h = hashlib.sha256()
+            buf = memoryview(bytearray(bufsize))
+            while n := f.readinto(buf):
+                h.update(buf[:n])
+            return h.hexdigest()
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=1)
+def nz_timezone():
+    """Return the ``Pacific/Auckland`` zone, or ``None`` if tzdata is missing.
+
+    The zone is loaded once per process and shared by every block that
+    stamps NZ times.
+    """
     try:
-        with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                h.update(chunk)
-        return h.hexdigest()
+        import zoneinfo
+        return zoneinfo.ZoneInfo("Pacific/Auckland")
     except Exception:
         return None
 
 
-def pdf_hash_id(pdf_path, length=8):
-    """Return a short hash identifier for a PDF path."""
-    h = hashlib.sha1(str(pdf_path).encode("utf-8")).hexdigest()[:length]
+def utc_now_iso() -> str:
+    """Return the current UTC time as ISO-8601 with a ``Z`` suffix."""
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def pdf_hash_id(pdf_path, length=8, algo="sha1", content=False):
+    """Return a short hash identifier for a PDF path.
+
+    Every extraction block derives the same ID for the same PDF, so
+    path-based IDs are memoised per path.  ``algo="blake2b"`` hashes straight
+    to ``length`` hex characters instead of truncating a SHA-1 digest.  With
+    ``content=True`` the ID is the first ``length`` hex characters of the
+    whole file's SHA-256 (via :func:`sha256_file` and its stat-keyed digest
+    cache), so it survives moving or renaming the corpus and changes when a
+    PDF is replaced in place.  The defaults keep IDs identical to earlier
+    runs.
+    """
+    if algo not in ("sha1", "blake2b"):
+        raise ValueError(f"Unsupported pdf_hash_id algo: {algo!r}")
+    if content:
+        digest = sha256_file(pdf_path)
+        if digest is None:
+            raise OSError(f"Cannot read PDF for content hash: {pdf_path}")
+        return f"paper_ID_{digest[:length]}"
+    return _path_hash_id(str(pdf_path), length, algo)
+
+
+@functools.lru_cache(maxsize=4096)
+def _path_hash_id(pdf_path: str, length: int, algo: str) -> str:
+    data = pdf_path.encode("utf-8")
+    if algo == "blake2b":
+        h = hashlib.blake2b(data, digest_size=(length + 1) // 2).hexdigest()[:length]
+    else:
+        h = hashlib.sha1(data).hexdigest()[:length]
     return f"paper_ID_{h}"
 
 
+def list_pdfs(directory: str | os.PathLike) -> list[Path]:
+    """Return PDF files in ``directory`` sorted by name.
+
+    Uses :func:`os.scandir` with a suffix check instead of ``Path.glob`` so
+    large (or network-mounted) folders are listed in a single pass.
+    """
+    with os.scandir(directory) as it:
+        names = [e.name for e in it if e.name.lower().endswith(".pdf") and e.is_file()]
+    names.sort()
+    base = Path(directory)
+    return [base / name for name in names]
+
+
 def normalize_doi(x: str | None) -> str:
     """Return a canonical DOI string.
 
     This helper removes leading ``https://doi.org/`` (or ``http://dx.doi.org``)
     prefixes, strips whitespace and normalizes the case to lower. Passing
-    ``None`` or a non-string value returns an empty string.
+    ``None`` or a non-string value returns an empty string.  Results for
+    string input are memoised since the same DOI is normalised by every
+    extraction method.
     """
     if not x or not isinstance(x, str):
         return ""
-    x = x.strip().lower()
-    x = re.sub(r"^(https?://(dx\.)?doi\.org/)", "", x)
-    x = x.replace(" ", "")
-    x = re.sub(r"\s", "", x)
+    return _normalize_doi_str(x)
+
+
+def is_valid_doi(doi: str | None) -> bool:
+    """Return ``True`` if ``doi`` looks like a normalised DOI (``10.NNNN/suffix``).
+
+    Callers use this to skip Crossref/OpenAlex requests for placeholder or
+    garbled values such as ``"not available"``.
+    """
+    return bool(doi) and isinstance(doi, str) and _VALID_DOI_RE.match(doi) is not None
+
+
+_VALID_DOI_RE = re.compile(r"10\.\d{4,9}/\S+\Z")
+# Every character ``\s`` matches (all of them sit below U+3001), for deletion
+_DOI_WS_TABLE = str.maketrans("", "", "".join(c for c in map(chr, range(0x3001)) if c.isspace()))
+_DOI_URL_PREFIXES = ("https://doi.org/", "http://doi.org/", "https://dx.doi.org/", "http://dx.doi.org/")
+
+
+@functools.lru_cache(maxsize=8192)
+def _normalize_doi_str(x: str) -> str:
+    """Memoised body of :func:`normalize_doi` for string input.
+
+    Lower-casing and whitespace removal are done by one ``translate`` call;
+    the resolver prefix is then dropped with a plain prefix check.
+    """
+    x = x.lower().translate(_DOI_WS_TABLE)
+    for prefix in _DOI_URL_PREFIXES:
+        if x.startswith(prefix):
+            return x[len(prefix):]
     return x
 
 
-def check_grobid_healthy(url="http://localhost:8070/api/isalive", timeout=8):
-    """Check if the GROBID service is responding."""
-    if requests is None:
-        return False
+# url -> time.monotonic() of the last successful probe
+_grobid_healthy_at: dict[str, float] = {}
+
+
+def _grobid_probe(url: str, timeout: float) -> bool:
+    """Probe ``url`` once."""
     try:
         r = requests.get(url, timeout=timeout)
         return (r.status_code == 200) and ("grobid" in r.text.lower() or "true" in r.text.lower())
@@ -54,8 +295,129 @@ def check_grobid_healthy(url="http://localhost:8070/api/isalive", timeout=8):
         return False
 
 
+def check_grobid_healthy(url="http://localhost:8070/api/isalive", timeout=8, max_age=5.0):
+    """Check if the GROBID service is responding.
+
+    A healthy result is reused for ``max_age`` seconds after the probe so
+    per-PDF callers do not re-probe the server every time.  Failures are
+    never cached, so a server that has just come up is seen on the next
+    call.  Pass ``max_age=0`` to force a fresh request.
+    """
+    if requests is None:
+        return False
+    now = time.monotonic()
+    last = _grobid_healthy_at.get(url)
+    if max_age > 0 and last is not None and now - last < max_age:
+        return True
+    healthy = _grobid_probe(url, timeout)
+    if healthy:
+        _grobid_healthy_at[url] = now
+    else:
+        _grobid_healthy_at.pop(url, None)
+    return healthy
+
+
 def write_audit_log(data, path="audit/block1_env_fingerprint.jsonl"):
     """Append JSON data to an audit log."""
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(data, ensure_ascii=False) + "\n")
+    with open(path, "ab") as f:
+        f.write(json_dumpb(data) + b"\n")
+
+
+@functools.lru_cache(maxsize=None)
+def open_log(path: str | os.PathLike):
+    """Return a shared, buffered append handle for the text log at ``path``.
+
+    Loggers that write one line per message reuse the handle instead of
+    opening and closing the file for every line.  Handles are closed (and
+    so flushed) at interpreter exit.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    f = open(path, "a", buffering=1 << 16, encoding="utf-8")
+    atexit.register(f.close)
+    return f
+
+
+class AuditWriter:
+    """Buffered JSONL writer for audit events.
+
+    Records are kept in memory and appended to ``path`` in batches of
+    ``batch`` lines, so a block that logs several events opens the file once
+    rather than once per event.  Lines are encoded once when queued and
+    appended in binary mode.  Call :meth:`flush` at the end of a block;
+    anything still pending is also flushed at interpreter exit.
+    """
+
+    def __init__(self, path, batch: int = 64):
+        self.path = Path(path)
+        self.batch = batch
+        self.buf: list[bytes] = []
+        atexit.register(self.flush)
+
+    def emit(self, record: dict) -> None:
+        """Queue ``record`` and flush once ``batch`` lines are pending."""
+        self.buf.append(json_dumpb(record))
+        if len(self.buf) >= self.batch:
+            self.flush()
+
+    def flush(self) -> None:
+        """Append all pending records to the log file."""
+        if not self.buf:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(b"\n".join(self.buf) + b"\n")
+        self.buf.clear()
+
+
+class JsonCache:
+    """Persistent ``key -> JSON value`` store backed by SQLite.
+
+    Used to keep external API responses across runs so re-runs only hit the
+    network for keys not seen before.  One connection is shared by all
+    threads and guarded by a lock; writes are committed immediately.
+    With ``ttl`` (seconds), entries older than that (or written before
+    timestamps were recorded) are treated as missing so they are fetched
+    again.  Delete the file to force fresh lookups.
+    """
+
+    def __init__(self, path, ttl: float | None = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, ts REAL)")
+        if "ts" not in {row[1] for row in self._conn.execute("PRAGMA table_info(cache)")}:
+            self._conn.execute("ALTER TABLE cache ADD COLUMN ts REAL")
+        self._conn.commit()
+        atexit.register(self.close)
+
+    def get(self, key: str, default=None):
+        """Return the cached value for ``key`` or ``default``."""
+        with self._lock:
+            row = self._conn.execute("SELECT value, ts FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        if self.ttl is not None and (row[1] is None or time.time() - row[1] > self.ttl):
+            return default
+        return json_loads(row[0])
+
+    def set(self, key: str, value) -> None:
+        """Store ``value`` under ``key``, replacing any previous entry."""
+        self.set_many([(key, value)])
+
+    def set_many(self, items) -> None:
+        """Store several ``(key, value)`` pairs in one transaction."""
+        now = time.time()
+        rows = [(k, json_dumpb(v), now) for k, v in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO cache (key, value, ts) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Close the underlying connection; safe to call more than once."""
+        with self._lock:
+            self._conn.close()
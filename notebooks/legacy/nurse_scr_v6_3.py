@@ -34,34 +34,26 @@
 
 
 
-import sys, platform, subprocess, os, locale, hashlib, json
+import sys, platform, subprocess, os, locale, hashlib, importlib, importlib.util, json
 
-from datetime import datetime
+from datetime import datetime, timezone
 
 from pathlib import Path
-from src.utils import sha256_file, write_audit_log, check_grobid_healthy, pdf_hash_id, normalize_doi
-
-
-
-# ---- Timezone handling ----
+from src.utils import sha256_file, write_audit_log, check_grobid_healthy, pdf_hash_id, normalize_doi, nz_timezone
 
-try:
-
-    import zoneinfo
 
-    TZ_NZ = zoneinfo.ZoneInfo("Pacific/Auckland")
 
-    now_nzdt = datetime.now(TZ_NZ)
+# ---- Timezone handling (zone loaded once per session, None without tzdata) ----
 
-except Exception:
+TZ_NZ = nz_timezone()
 
-    TZ_NZ = None
+# One clock read; the NZ time is derived from it
 
-    now_nzdt = None
+now_utc = datetime.now(timezone.utc)
 
-now_utc = datetime.utcnow()
+now_nzdt = now_utc.astimezone(TZ_NZ) if TZ_NZ else None
 
-now_utc_iso = now_utc.isoformat() + "Z"
+now_utc_iso = now_utc.isoformat().replace("+00:00", "Z")
 
 now_nzdt_iso = (now_nzdt.isoformat() if now_nzdt else "Unavailable")
 
@@ -141,51 +133,73 @@ block1_audit = {
 
 
 
+# setlocale mutates global state; call it once and reuse the result for the printout below
+
 try:
 
-    block1_audit["locale"] = locale.setlocale(locale.LC_ALL, '')
+    LOCALE_NAME = locale.setlocale(locale.LC_ALL, '')
 
 except Exception:
 
+    LOCALE_NAME = None
+
     block1_audit["warnings"].append("Could not detect locale.")
 
+block1_audit["locale"] = LOCALE_NAME or ""
+
 
 
 # --------- Preflight: install/verify packages, fail-closed if not present ----------
 
-def pip_install_package(pip_name, import_name):
+def try_import(import_name):
+
+    # Locate the module without executing it (importing openai/fitz just to check costs ~100s of ms each)
 
     try:
 
-        __import__(import_name)
+        if importlib.util.find_spec(import_name) is not None:
 
-        return True
+            return True
 
-    except ImportError:
+        return f"No module named '{import_name}'"
 
-        try:
+    except (ImportError, ValueError) as e:
 
-            subprocess.check_call([sys.executable, "-m", "pip", "install", pip_name])
+        return str(e)
 
-            __import__(import_name)
 
-            return True
 
-        except Exception as e:
+# One pip invocation for everything missing (one startup/resolver pass instead of one per package)
 
-            return str(e)
+missing_pkgs = [(pip_name, import_name) for pip_name, import_name, dist_name in required_packages if try_import(import_name) is not True]
+
+pip_error = None
+
+if missing_pkgs:
+
+    try:
+
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "--quiet", "--no-input", *[pip_name for pip_name, _ in missing_pkgs]])
+
+    except Exception as e:
+
+        pip_error = str(e)
+
+    # Let the re-import pass below see packages that pip just added to site-packages
+
+    importlib.invalidate_caches()
 
 
 
 failed_pkgs = []
 
-for pip_name, import_name, dist_name in required_packages:
+for pip_name, import_name in missing_pkgs:
 
-    result = pip_install_package(pip_name, import_name)
+    result = try_import(import_name)
 
     if result is not True:
 
-        failed_pkgs.append((pip_name, result))
+        failed_pkgs.append((pip_name, pip_error or result))
 
 if failed_pkgs:
 
@@ -207,6 +221,8 @@ if failed_pkgs:
 
 # --------- Write requirements.txt and hash it for audit trail ----------
 
+versions = {}  # pip_name -> version string, or the lookup exception; reused for the printout below
+
 try:
 
     try:
@@ -217,17 +233,23 @@ try:
 
         import importlib_metadata # type: ignore
 
-    dists = sorted(importlib_metadata.distributions(), key=lambda d: (d.metadata["Name"] if "Name" in d.metadata else d._path.name).lower())
+    # Only the required packages are looked up; no scan of every installed distribution
+
+    for pip_name, import_name, dist_name in required_packages:
+
+        try:
+
+            versions[pip_name] = importlib_metadata.version(dist_name)
 
-    with open("requirements.txt", "w", encoding="utf-8") as f:
+        except Exception as e:
 
-        for dist in dists:
+            versions[pip_name] = e
 
-            name = dist.metadata["Name"] if "Name" in dist.metadata else dist._path.name
+    reqs = sorted(((name, v) for name, v in versions.items() if isinstance(v, str)), key=lambda r: r[0].lower())
 
-            version = dist.version
+    # Build the whole file in memory and write it in one call
 
-            f.write(f"{name}=={version}\n")
+    Path("requirements.txt").write_text("".join(f"{name}=={version}\n" for name, version in reqs), encoding="utf-8")
 
     req_hash = sha256_file("requirements.txt")
 
@@ -253,13 +275,7 @@ print(f"Platform      : {platform.platform()}")
 
 print(f"CWD           : {Path.cwd()}")
 
-try:
-
-    print(f"Locale        : {locale.setlocale(locale.LC_ALL, '')}")
-
-except:
-
-    print("Locale        : [Could not detect locale]")
+print(f"Locale        : {LOCALE_NAME or '[Could not detect locale]'}")
 
 print(f"Datetime UTC  : {now_utc_iso}")
 
@@ -269,17 +285,17 @@ print("- Required Pip Package Versions -")
 
 for pip_name, import_name, dist_name in required_packages:
 
-    try:
+    version = versions.get(pip_name, "metadata unavailable")
 
-        version = importlib_metadata.version(dist_name)
+    if isinstance(version, str) and pip_name in versions:
 
         print(f"{pip_name}: {version}")
 
-    except Exception as e:
+    else:
 
-        print(f"{pip_name}: NOT INSTALLED or version not found ({e})")
+        print(f"{pip_name}: NOT INSTALLED or version not found ({version})")
 
-        block1_audit["warnings"].append(f"{pip_name}: not found ({e})")
+        block1_audit["warnings"].append(f"{pip_name}: not found ({version})")
 
 print("--- End Block 1 ---")
 
@@ -326,41 +342,25 @@ import json
 
 import yaml
 
-from datetime import datetime
-
-
-
-# --- Timezone safe run creation ---
-
-try:
-
-    import zoneinfo
+from datetime import datetime, timezone
 
-    TZ_NZ = zoneinfo.ZoneInfo("Pacific/Auckland")
+from src.utils import AuditWriter, json_dumpb, list_pdfs, load_yaml, nz_timezone
 
-    now_nzdt = datetime.now(TZ_NZ)
 
-    NOW_STR = now_nzdt.strftime('%y%m%d_%H%M')
 
-    now_utc = datetime.utcnow()
-
-    NZDT_LABEL = now_nzdt.isoformat()
-
-    UTC_LABEL = now_utc.isoformat() + "Z"
-
-except Exception:
+# --- Timezone safe run creation ---
 
-    TZ_NZ = None
+TZ_NZ = nz_timezone()
 
-    now_nzdt = None
+now_utc = datetime.now(timezone.utc)
 
-    NOW_STR = datetime.utcnow().strftime('%y%m%d_%H%M')
+now_nzdt = now_utc.astimezone(TZ_NZ) if TZ_NZ else None
 
-    now_utc = datetime.utcnow()
+NOW_STR = (now_nzdt or now_utc).strftime('%y%m%d_%H%M')
 
-    NZDT_LABEL = "Unavailable"
+NZDT_LABEL = now_nzdt.isoformat() if now_nzdt else "Unavailable"
 
-    UTC_LABEL = now_utc.isoformat() + "Z"
+UTC_LABEL = now_utc.isoformat().replace("+00:00", "Z")
 
 
 
@@ -404,13 +404,25 @@ ISSUES_DIR           = RUN_DIR / 'issues'
 
 TESTS_DIR            = RUN_DIR / 'tests'
 
-for d in [RUN_DIR, OPERATIONAL_DIR, AI_ARTIFACTS_DIR, REVIEWER_CONTENT_DIR, METRICS_DIR, AUDIT_DIR, ISSUES_DIR, TESTS_DIR]:
+# Walk the parents once for RUN_DIR; each subfolder is then a single mkdir (each is a round-trip on Drive)
+
+RUN_DIR.mkdir(parents=True, exist_ok=True)
+
+for d in [OPERATIONAL_DIR, AI_ARTIFACTS_DIR, REVIEWER_CONTENT_DIR, METRICS_DIR, AUDIT_DIR, ISSUES_DIR, TESTS_DIR]:
+
+    try:
+
+        os.mkdir(d)
+
+    except FileExistsError:
+
+        pass
 
-    d.mkdir(parents=True, exist_ok=True)
+audit_writer = AuditWriter(AUDIT_DIR / "block2_dirsetup_preflight.jsonl")
 
 
 
-pdfs_list = sorted(PDF_DIR.glob('*.pdf')) if PDF_DIR.exists() else []
+pdfs_list = list_pdfs(PDF_DIR) if PDF_DIR.exists() else []
 
 n_pdfs = len(pdfs_list)
 
@@ -458,6 +470,8 @@ CONFIG_PARAMETERS = {
 
     'allow_dynamic_expansion': False,
 
+    'manifest_compression': None,
+
 }
 
 CONFIG_PATHS = {
@@ -544,11 +558,9 @@ if not CONFIG_PATH.exists():
 
         }
 
-        audit_log_path = AUDIT_DIR / "block2_dirsetup_preflight.jsonl"
+        audit_writer.emit(block2_audit)
 
-        with open(audit_log_path, "a", encoding="utf-8") as f:
-
-            f.write(json.dumps(block2_audit, ensure_ascii=False) + "\n")
+        audit_writer.flush()
 
         raise RuntimeError("[BLOCK 2 PAUSED] Edit config.yaml and rerun this cell.")
 
@@ -616,6 +628,10 @@ print(f"\nPlanned run directory for this session: {RUN_DIR}")
 
 # ------ [Write pipeline_env.json for ALL further blocks] ------
 
+# Block 4 reads the final manifest compression ("gzip" / "zstd" / None) from here, so take it from config.yaml
+
+MANIFEST_COMPRESSION = (load_yaml(CONFIG_PATH) or {}).get("manifest_compression")
+
 pipeline_env = dict(
 
     PROJECT_ROOT   = str(PROJECT_ROOT),
@@ -636,13 +652,15 @@ pipeline_env = dict(
 
     ISSUES_DIR     = str(ISSUES_DIR),
 
-    TESTS_DIR      = str(TESTS_DIR)
+    TESTS_DIR      = str(TESTS_DIR),
+
+    MANIFEST_COMPRESSION = MANIFEST_COMPRESSION
 
 )
 
-with open("pipeline_env.json", "w") as f:
+with open("pipeline_env.json", "wb") as f:
 
-    json.dump(pipeline_env, f, indent=2)
+    f.write(json_dumpb(pipeline_env, indent=True))
 
 
 
@@ -690,11 +708,9 @@ if not corpus_ok:
 
     block2_audit["errors"].append("PDF directory/corpus unsatisfactory")
 
-audit_log_path = AUDIT_DIR / "block2_dirsetup_preflight.jsonl"
+audit_writer.emit(block2_audit)
 
-with open(audit_log_path, "a", encoding="utf-8") as f:
-
-    f.write(json.dumps(block2_audit, ensure_ascii=False) + "\n")
+audit_writer.flush()
 
 
 
@@ -743,35 +759,29 @@ print("--- End Block 2 ---")
 
 
 
-import os, subprocess, time, requests, signal, json
+import os, shutil, subprocess, time, requests, signal, json
 
 from pathlib import Path
 
 import yaml
 
-from datetime import datetime
+from datetime import datetime, timezone
 
 from tqdm import tqdm
 
+from src.utils import AuditWriter, load_yaml, nz_timezone, open_log
 
 
-# --- Audit/Config ---
-
-try:
-
-    import zoneinfo
-
-    TZ_NZ = zoneinfo.ZoneInfo("Pacific/Auckland")
 
-    now_nzdt = datetime.now(TZ_NZ).isoformat()
+# --- Audit/Config ---
 
-    now_utc = datetime.utcnow().isoformat() + "Z"
+TZ_NZ = nz_timezone()
 
-except Exception:
+_now_utc = datetime.now(timezone.utc)
 
-    now_nzdt = datetime.utcnow().isoformat()
+now_nzdt = _now_utc.astimezone(TZ_NZ).isoformat() if TZ_NZ else _now_utc.replace(tzinfo=None).isoformat()
 
-    now_utc  = datetime.utcnow().isoformat() + "Z"
+now_utc = _now_utc.isoformat().replace("+00:00", "Z")
 
 
 
@@ -795,6 +805,10 @@ for candidate in [
 
 
 
+# The Grobid checkout/build stays on local disk: Drive's FUSE mount drops exec bits, which gradlew and
+
+# Grobid's native pdfalto binary need. Within a VM session the build is reused and not rebuilt
+
 GROBID_HOME = Path("/content/grobid")
 
 GROBID_URL  = "http://localhost:8070/api/processHeaderDocument"
@@ -805,13 +819,13 @@ if CONFIG_PATH:
 
     try:
 
-        with open(CONFIG_PATH, "r") as f:
+        config = load_yaml(CONFIG_PATH)
 
-            config = yaml.safe_load(f)
+        GROBID_URL = config.get("grobid_url", GROBID_URL)
 
-            GROBID_URL = config.get("grobid_url", GROBID_URL)
+        AUDIT_DIR = Path(config.get("audit_dir", AUDIT_DIR))
 
-            AUDIT_DIR = Path(config.get("audit_dir", AUDIT_DIR))
+        GROBID_HOME = Path(config.get("grobid_home", GROBID_HOME))
 
     except Exception: pass
 
@@ -825,9 +839,7 @@ def log(msg):
 
     print(msg)
 
-    with open(AUDIT_DIR / "block2p5_grobid_status.txt", "a") as f:
-
-        f.write(str(msg) + "\n")
+    open_log(AUDIT_DIR / "block2p5_grobid_status.txt").write(str(msg) + "\n")
 
 
 
@@ -880,21 +892,49 @@ status_record = {
 
 try:
 
-    if not (GROBID_HOME / "gradlew").exists():
+    built = any((GROBID_HOME / "grobid-service" / "build" / "libs").glob("*.jar"))
+
+    if check_grobid_healthy():
+
+        # A running server needs no install or build check at all
+
+        log("[Grobid] Server already healthy; skipping install.")
+
+        status_record["already_installed"] = True
+
+    elif not built or shutil.which("java") is None:
+
+        # The JDK does not survive a fresh Colab VM, but the cached checkout/build does
+
+        if shutil.which("java") is None:
+
+            log("[Grobid] Installing OpenJDK 11 (headless)...")
 
-        # Need to install Grobid
+            # Colab ships a populated apt cache, so `apt-get update` only runs if the first install attempt fails
 
-        log("[Grobid] Installing OpenJDK 11 and cloning Grobid...")
+            apt_install = ["apt-get", "install", "-y", "-qq", "--no-install-recommends", "openjdk-11-jdk-headless"]
 
-        os.system('apt-get update')
+            if subprocess.run(apt_install).returncode != 0:
 
-        os.system('apt-get install -y openjdk-11-jdk')
+                subprocess.run(["apt-get", "update", "-qq"], check=True)
 
-        subprocess.check_call(['git', 'clone', 'https://github.com/kermitt2/grobid.git', str(GROBID_HOME)])
+                subprocess.run(apt_install, check=True)
 
-        subprocess.check_call(['bash', '-c', f'cd {GROBID_HOME} && ./gradlew clean install'])
+        if not (GROBID_HOME / "gradlew").exists():
 
-        status_record["already_installed"] = False
+            log("[Grobid] Cloning Grobid...")
+
+            GROBID_HOME.parent.mkdir(parents=True, exist_ok=True)
+
+            subprocess.check_call(['git', 'clone', 'https://github.com/kermitt2/grobid.git', str(GROBID_HOME)])
+
+        if not built:
+
+            # Incremental build: no `clean`, tests skipped, Gradle build cache enabled
+
+            subprocess.check_call(['bash', '-c', f'cd "{GROBID_HOME}" && bash gradlew install -x test --build-cache'])
+
+        status_record["already_installed"] = built
 
     else:
 
@@ -928,7 +968,7 @@ try:
 
         log("[Grobid] Starting Grobid server in background...")
 
-        subprocess.Popen(["bash", "-c", f"cd {GROBID_HOME} && ./gradlew run > grobid_run.log 2>&1 &"])
+        subprocess.Popen(["bash", "-c", f'cd "{GROBID_HOME}" && bash gradlew run > grobid_run.log 2>&1 &'])
 
         status_record["server_start_attempted"] = True
 
@@ -938,17 +978,39 @@ try:
 
         log("[Grobid] Waiting for server to launch (up to 120s):")
 
-        for i in tqdm(range(12), desc="Waiting for Grobid", ncols=70, bar_format='{l_bar}{bar}| {elapsed} [{remaining}]'):
+        # Exponential backoff (0.5s, 0.75s, ... capped at 10s) so a fast start is seen within a second
 
-            if check_grobid_healthy():
+        deadline = time.time() + 120
 
-                log(f"[Grobid] Server is UP at {GROBID_URL}")
+        delay = 0.5
 
-                ready = True
+        with tqdm(total=120, desc="Waiting for Grobid", ncols=70, bar_format='{l_bar}{bar}| {elapsed} [{remaining}]') as bar:
 
-                break
+            while True:
+
+                if check_grobid_healthy(HEALTH_URL, timeout=2, max_age=0):
 
-            time.sleep(10)
+                    log(f"[Grobid] Server is UP at {GROBID_URL}")
+
+                    ready = True
+
+                    break
+
+                remaining = deadline - time.time()
+
+                if remaining <= 0:
+
+                    break
+
+                # Never sleep past the deadline, so a last probe still happens at the 120s mark
+
+                step = min(delay, remaining)
+
+                time.sleep(step)
+
+                bar.update(step)
+
+                delay = min(delay * 1.5, 10)
 
         if ready:
 
@@ -980,9 +1042,11 @@ except Exception as e:
 
 # Audit/status log
 
-with open(AUDIT_DIR / "block2p5_grobid_setup.jsonl", "a", encoding="utf-8") as f:
+audit_writer = AuditWriter(AUDIT_DIR / "block2p5_grobid_setup.jsonl")
 
-    f.write(json.dumps(status_record, ensure_ascii=False) + "\n")
+audit_writer.emit(status_record)
+
+audit_writer.flush()
 
 
 
@@ -1011,7 +1075,7 @@ print("--- End Block 2.5 ---")
 
 # - Loads PDF file list as Path objects.
 
-# - Defines: normalization functions, print_and_log, hash helpers.
+# - Defines: normalization functions, print_and_log, hash helpers, cached first_page_text.
 
 # - Exports: OP_DIR, PDF_DIR, pdfs, config, fields, run_id, method_names, etc.
 
@@ -1019,15 +1083,31 @@ print("--- End Block 2.5 ---")
 
 
 
-import os, re, json, yaml, hashlib, logging
+import functools, os, re, json, yaml, hashlib, logging, threading
+
+import requests
+
+from requests.adapters import HTTPAdapter
 
 from pathlib import Path
 
+from types import MappingProxyType
+
+try:
+
+    import pycountry
+
+except ImportError:
+
+    pycountry = None
+
+from src.utils import JsonCache, json_dumpb, json_loads, list_pdfs, load_yaml, open_log, pdf_hash_id
+
 
 
 # --- Pipeline Environment Loading ---
 
-with open("pipeline_env.json", "r") as f: env = json.load(f)
+with open("pipeline_env.json", "rb") as f: env = json_loads(f.read())
 
 
 
@@ -1041,17 +1121,43 @@ CONFIG_PATH = OP_DIR / "config.yaml"
 
 
 
-with open(CONFIG_PATH, "r") as f: config = yaml.safe_load(f)
+config = load_yaml(CONFIG_PATH)  # libyaml loader, parsed once per file version
 
 
 
 PDF_DIR = Path(config["pdf_dir"])
 
-pdfs = sorted(PDF_DIR.glob("*.pdf"))  # Always a list of pathlib.Path objects
+pdfs = list_pdfs(PDF_DIR)  # Always a list of pathlib.Path objects
 
+run_id = config.get("run_id", "unnamed_run")
+
+# PDF IDs are computed once here and looked up by every extraction block
+
+# pdf_id_hash: blake2b is cheaper than truncated SHA-1; pdf_id_basis: "content" uses a prefix of the whole file's
+
+# SHA-256 so IDs survive moving the corpus, and files sharing their leading 64 KiB still get different IDs.
+
+# Either changes every ID, so an old -> new map is written once
+
+PDF_ID_HASH = config.get("pdf_id_hash", "sha1")
+
+PDF_ID_BY_CONTENT = config.get("pdf_id_basis", "path") == "content"
+
+PDF_IDS = {pdf: pdf_hash_id(pdf, algo=PDF_ID_HASH, content=PDF_ID_BY_CONTENT) for pdf in pdfs}
+
+if len(set(PDF_IDS.values())) < len(PDF_IDS):
+
+    print("[WARN] Duplicate PDF IDs (identical files under pdf_id_basis=content?); their results will overwrite each other.")
+
+if PDF_ID_HASH != "sha1" or PDF_ID_BY_CONTENT:
+
+    id_map_path = AI_ARTIFACTS_DIR / f"pdf_id_migration_{run_id}.json"
+
+    if not id_map_path.exists():
+
+        id_map_path.write_bytes(json_dumpb({pdf_hash_id(pdf): PDF_IDS[pdf] for pdf in pdfs}, indent=True))
 
 
-run_id = config.get("run_id", "unnamed_run")
 
 fields = [
 
@@ -1067,19 +1173,137 @@ method_names = ["llm", "grobid", "fitz", "pdfplumber", "filename", "crossref", "
 
 # --- Utility: Logging ---
 
+# Extraction blocks log from worker threads; the lock keeps lines whole
+
+_LOG_LOCK = threading.Lock()
+
 def print_and_log(msg, level="info"):
 
-    print(msg)
+    with _LOG_LOCK:
+
+        print(msg)
+
+        open_log(OP_DIR / "block3_common_debug_log.txt").write(str(msg) + "\n")
+
+
+
+# --- Utility: pooled HTTP session shared by a block's worker threads ---
+
+def make_session(pool_size):
+
+    session = requests.Session()
+
+    session.headers.update({"User-Agent": "nurse-scr/6.4"})
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+
+    session.mount("http://", adapter)
+
+    session.mount("https://", adapter)
+
+    return session
+
+
+
+# Prior method outputs, parsed once and shared by Blocks 3.5-3.7; re-parsed only if the file changes
+
+PRIOR_RESULTS = {}
+
+def get_results(name):
+
+    """Return {pdf_id: record} from {name}_results_{run_id}.json, or {} if it cannot be loaded."""
+
+    path = AI_ARTIFACTS_DIR / f"{name}_results_{run_id}.json"
+
+    try:
+
+        st = path.stat()
 
-    with open(OP_DIR / "block3_common_debug_log.txt", "a") as f:
+        stamp = (st.st_mtime_ns, st.st_size)
 
-        f.write(str(msg) + "\n")
+        cached = PRIOR_RESULTS.get(name)
+
+        if cached is None or cached[0] != stamp:
+
+            with open(path, "rb") as f:
+
+                records = json_loads(f.read())
+
+            cached = PRIOR_RESULTS[name] = (stamp, {r["pdf_id"]: r for r in records})
+
+            print(f"[INFO] Loaded {path.name}, {len(records)} records.")
+
+        return cached[1]
+
+    except Exception as e:
+
+        print(f"[WARN] Could not load {path}: {e}")
+
+        return {}
+
+# CrossRef/OpenAlex responses persist across runs (outside the per-run folder) for api_cache_ttl_days (default 90,
+
+# as in the package's record cache); empty/no-hit responses are never stored, so unindexed DOIs are retried next run
+
+API_CACHE_TTL_DAYS = float(config.get("api_cache_ttl_days", 90))
+
+API_CACHE = JsonCache(
+
+    Path(config.get("api_cache_path") or Path(env.get("PROJECT_ROOT", ".")) / ".cache" / "external_meta.sqlite"),
+
+    ttl=API_CACHE_TTL_DAYS * 86400,
+
+)
+
+# Parsed LLM answers share that store, keyed by sha256(model + prompt); set llm_cache: false to always call the API
+
+LLM_CACHE = bool(config.get("llm_cache", True))
 
 
 
 # --- Utility: Normalize Fields ---
 
 
+# Normalizer patterns and lookups, built once instead of per call
+
+_SPACE_RE = re.compile(r"\s+")
+
+_AUTHOR_SPLIT_RE = re.compile(r"[;,&]| and ")  # single-char separators as one class, one literal branch
+
+_KW_SPLIT_RE = re.compile(r";|,|/|\|")
+
+_NONALPHA_RE = re.compile(r'[^a-zA-Z ]+')
+
+# ISO 3166 alpha-2 -> country name, built once; full table when pycountry is installed, the curated names win
+
+ISO_MAP = MappingProxyType({
+
+    **({c.alpha_2.lower(): getattr(c, "common_name", c.name) for c in pycountry.countries} if pycountry else {}),
+
+    'us': 'United States', 'gb':'United Kingdom', 'uk':'United Kingdom', 'au':'Australia', 'nz':'New Zealand', 'ca':'Canada',
+
+})
+
+def memo_str(fn):
+
+    """Memoise a normaliser for string input; lists and other values are computed directly.
+
+    The same raw strings arrive from several extractors, so repeats are served from a bounded cache."""
+
+    cached = functools.lru_cache(maxsize=8192)(fn)
+
+    @functools.wraps(fn)
+
+    def wrapper(raw):
+
+        return cached(raw) if isinstance(raw, str) else fn(raw)
+
+    wrapper.cache_clear = cached.cache_clear
+
+    return wrapper
+
+@memo_str
+
 def normalize_author(raw):
 
     if not raw: return ""
@@ -1096,7 +1320,7 @@ def normalize_author(raw):
 
         x = x.replace(",", "")
 
-        x = re.sub(r"\s+", " ", x).strip()
+        x = _SPACE_RE.sub(" ", x).strip()
 
         return x
 
@@ -1106,7 +1330,7 @@ def normalize_author(raw):
 
         if isinstance(v, str):
 
-            flat += [norm_piece(w) for w in re.split(r";|,|&| and ", v) if w.strip()]
+            flat += [norm_piece(w) for w in _AUTHOR_SPLIT_RE.split(v) if w.strip()]
 
         else:
 
@@ -1128,35 +1352,33 @@ def normalize_author(raw):
 
 
 
-def normalize_country(raw):
+@memo_str
 
-    ISO_MAP = {'us': 'United States', 'gb':'United Kingdom', 'uk':'United Kingdom', 'au':'Australia', 'nz':'New Zealand', 'ca':'Canada'}
+def normalize_country(raw):
 
     if not raw: return ""
 
     vals = [w.strip() for w in str(raw).split(';') if w.strip()]
 
-    names = []
+    names, seen_lc = [], set()  # case-insensitive dedupe in one pass
 
     for v in vals:
 
-        v_lc = v.lower()
-
-        n = ISO_MAP.get(v_lc)
+        c = ISO_MAP.get(v.lower()) or _NONALPHA_RE.sub('', v).strip()
 
-        if n: names.append(n)
+        c_lc = c.lower()
 
-        else:
+        if c and c_lc not in seen_lc:
 
-            c = re.sub(r'[^a-zA-Z ]+', '', v).strip()
+            names.append(c)
 
-            if c and c.lower() not in [n.lower() for n in names]:
+            seen_lc.add(c_lc)
 
-                names.append(c)
+    return "; ".join(names)
 
-    return "; ".join(dict.fromkeys(names))
 
 
+@memo_str
 
 def normalize_keywords(raw):
 
@@ -1172,7 +1394,7 @@ def normalize_keywords(raw):
 
         if isinstance(v, str):
 
-            flat += [k.strip() for k in re.split(r";|,|/|\|", v) if k.strip()]
+            flat += [k.strip() for k in _KW_SPLIT_RE.split(v) if k.strip()]
 
         else:
 
@@ -1200,6 +1422,39 @@ def normalize_keywords(raw):
 
 
 
+# --- First-page text, read once per PDF and shared by the extraction blocks ---
+
+# PyMuPDF is not thread-safe; extraction blocks that fan out over PDFs share this lock
+
+FIRST_PAGE_LOCK = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+
+def first_page_text(pdf_file, max_chars=3500):
+
+    import fitz  # deferred: only loaded once a block actually reads a PDF (a sys.modules hit afterwards)
+
+    with FIRST_PAGE_LOCK, fitz.open(pdf_file) as doc:
+
+        # load_page() parses only page 0's content stream; text blocks are
+
+        # collected in reading order until max_chars is reached
+
+        buf, n = [], 0
+
+        for block in doc.load_page(0).get_text("blocks"):
+
+            buf.append(block[4])
+
+            n += len(block[4])
+
+            if n >= max_chars:
+
+                break
+
+        return "".join(buf)[:max_chars]
+
+
 
 # --- Export: Common Config Info ---
 
@@ -1228,8 +1483,16 @@ print(f"[Block 3.0] run_id: {run_id}")
 
 import json, hashlib, os, re
 
+import openai
+
+from concurrent.futures import ThreadPoolExecutor
+
 from datetime import datetime
 
+from src.utils import json_dumpb, json_loads, utc_now_iso
+
+BLOCK_STARTED_UTC = utc_now_iso()  # one extraction timestamp per block run, shared by all its records
+
 
 
 try:
@@ -1242,21 +1505,45 @@ except NameError:
 
 
 
+_JSON_DECODER = json.JSONDecoder()
+
+_CODE_FENCE_RE = re.compile(r"^```(?:json)?", re.MULTILINE)
+
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+
 def extract_first_json(text):
 
-    text = re.sub(r"^```(?:json)?", "", text, flags=re.MULTILINE).strip('` \n')
+    text = _CODE_FENCE_RE.sub("", text).strip('` \n')
 
-    depth = 0
+    start = text.find('{')
 
-    start, end = -1, -1
+    if start == -1:
 
-    for i, c in enumerate(text):
+        return ""
 
-        if c == '{':
+    # Well-formed objects are matched by the C decoder in one call
+
+    try:
+
+        _, end = _JSON_DECODER.raw_decode(text, start)
+
+        return text[start:end]
+
+    except ValueError:
+
+        pass
+
+    # Malformed output (e.g. trailing commas, repaired by the caller): fall back to brace counting
+
+    depth = 0
 
-            if depth == 0:
+    end = -1
 
-                start = i
+    for i in range(start, len(text)):
+
+        c = text[i]
+
+        if c == '{':
 
             depth += 1
 
@@ -1272,7 +1559,7 @@ def extract_first_json(text):
 
                     break
 
-    if start != -1 and end != -1:
+    if end != -1:
 
         return text[start:end+1]
 
@@ -1336,6 +1623,16 @@ def get_openai_api_key():
 
 
 
+# One client per key: its connection pool is shared by all worker threads instead of
+
+# mutating the module-global openai.api_key on every call
+
+@functools.lru_cache(maxsize=4)
+
+def llm_client(api_key):
+
+    return openai.OpenAI(api_key=api_key)
+
 def extract_ai_llm_full(first_page, api_key=None, model=None, debug=False):
 
     error = None
@@ -1362,10 +1659,6 @@ def extract_ai_llm_full(first_page, api_key=None, model=None, debug=False):
 
     try:
 
-        import openai
-
-        openai.api_key = api_key
-
         prompt = (
 
             "Extract the following metadata as a JSON object from the text provided: "
@@ -1376,17 +1669,75 @@ def extract_ai_llm_full(first_page, api_key=None, model=None, debug=False):
 
         )
 
-        resp = openai.chat.completions.create(
+        model = model or config.get("llm_model")
+
+        cache_key = "llm:" + hashlib.sha256(f"{model}\x00{prompt}".encode("utf-8")).hexdigest()
+
+        if LLM_CACHE:
+
+            hit = API_CACHE.get(cache_key)
+
+            if hit is not None:
+
+                return hit, None
+
+        # Stream the reply and stop reading once the first JSON object closes; braces inside JSON strings
+
+        # (titles, abstracts, LaTeX) are skipped by tracking string/escape state across chunks
 
-            model=model or config.get("llm_model"),
+        stream = llm_client(api_key).chat.completions.create(
+
+            model=model,
 
             messages=[{"role":"user", "content": prompt}],
 
-            temperature=0, max_tokens=384
+            temperature=0, max_tokens=384, stream=True
 
         )
 
-        txt = resp.choices[0].message.content.strip()
+        parts, depth, started, in_str, esc, closed = [], 0, False, False, False, False
+
+        try:
+
+            for event in stream:
+
+                t = (event.choices[0].delta.content or "") if event.choices else ""
+
+                parts.append(t)
+
+                for c in t:
+
+                    if in_str:
+
+                        if esc: esc = False
+
+                        elif c == "\\": esc = True
+
+                        elif c == '"': in_str = False
+
+                    elif c == '"': in_str = started
+
+                    elif c == "{": depth, started = depth + 1, True
+
+                    elif c == "}" and started:
+
+                        depth -= 1
+
+                        if depth == 0:
+
+                            closed = True
+
+                            break
+
+                if closed:
+
+                    break
+
+        finally:
+
+            stream.close()
+
+        txt = "".join(parts).strip()
 
         if debug:
 
@@ -1400,15 +1751,15 @@ def extract_ai_llm_full(first_page, api_key=None, model=None, debug=False):
 
         try:
 
-            result = json.loads(raw_json)
+            result = json_loads(raw_json)
 
         except Exception as e_inner:
 
-            raw_json2 = re.sub(r',\s*([}\]])', r'\1', raw_json)
+            raw_json2 = _TRAILING_COMMA_RE.sub(r'\1', raw_json)
 
             try:
 
-                result = json.loads(raw_json2)
+                result = json_loads(raw_json2)
 
             except Exception as e2:
 
@@ -1426,6 +1777,10 @@ def extract_ai_llm_full(first_page, api_key=None, model=None, debug=False):
 
         output = {k: flatten(result.get(k, "")) if isinstance(result, dict) else "" for k in fields}
 
+        if LLM_CACHE:
+
+            API_CACHE.set(cache_key, output)
+
         return output, None
 
     except Exception as e:
@@ -1444,21 +1799,15 @@ def extract_ai_llm_full(first_page, api_key=None, model=None, debug=False):
 
 
 
-llm_results = []
+def llm_extract_pdf(pdf, api_key):
 
-for idx, pdf in enumerate(pdfs):
-
-    pdf_id = f"paper_ID_{hashlib.sha1(str(pdf).encode('utf-8')).hexdigest()[:8]}"
+    pdf_id = PDF_IDS[pdf]
 
     errors = []
 
     try:
 
-        import fitz
-
-        doc = fitz.open(pdf)
-
-        first_page = doc[0].get_text()[:3500]
+        first_page = first_page_text(pdf)
 
     except Exception as e:
 
@@ -1466,7 +1815,7 @@ for idx, pdf in enumerate(pdfs):
 
         errors.append(f"[ERROR] fitz text extraction: {e}")
 
-    llm, err_llm = extract_ai_llm_full(first_page)
+    llm, err_llm = extract_ai_llm_full(first_page, api_key=api_key)
 
     if err_llm: errors.append(err_llm)
 
@@ -1476,7 +1825,7 @@ for idx, pdf in enumerate(pdfs):
 
         "pdf_filename": str(pdf.name),
 
-        "llm_extraction_time_utc": datetime.utcnow().isoformat() + "Z"
+        "llm_extraction_time_utc": BLOCK_STARTED_UTC
 
     }
 
@@ -1504,15 +1853,27 @@ for idx, pdf in enumerate(pdfs):
 
     normd["error_log"] = errors
 
-    llm_results.append(normd)
+    return normd
 
 
 
-outfile = AI_ARTIFACTS_DIR / f"llm_results_{run_id}.json"
+# LLM calls are network-bound, so several run at once (LLM_CONC / config llm_concurrency, default 8).
+
+# The key is resolved once up front so a missing key is prompted for only once.
+
+API_KEY = get_openai_api_key()
+
+LLM_CONC = int(os.environ.get("LLM_CONC", config.get("llm_concurrency", 8))) if API_KEY else 1
+
+with ThreadPoolExecutor(max_workers=LLM_CONC) as pool:
+
+    llm_results = list(pool.map(lambda pdf: llm_extract_pdf(pdf, API_KEY), pdfs))
+
+
 
-with open(outfile, "w", encoding="utf-8") as f:
+outfile = AI_ARTIFACTS_DIR / f"llm_results_{run_id}.json"
 
-    json.dump(llm_results, f, indent=2, ensure_ascii=False)
+outfile.write_bytes(json_dumpb(llm_results, indent=True))
 
 print(f"[Block 3.1] Wrote LLM results to {outfile} for {len(llm_results)} papers.")
 
@@ -1543,6 +1904,10 @@ import json, hashlib
 
 from datetime import datetime
 
+from src.utils import check_grobid_healthy, json_dumpb, utc_now_iso
+
+BLOCK_STARTED_UTC = utc_now_iso()  # one extraction timestamp per block run, shared by all its records
+
 
 
 try:
@@ -1555,9 +1920,19 @@ except NameError:
 
 
 
+import io
+
 import requests
 
-import xml.etree.ElementTree as ET
+try:
+
+    from lxml import etree as ET  # C parser with the same find/findall/iterparse API
+
+except ImportError:
+
+    import xml.etree.ElementTree as ET
+
+from concurrent.futures import ThreadPoolExecutor
 
 
 
@@ -1565,10 +1940,92 @@ grobid_url = config.get("grobid_url", "http://localhost:8070/api/processHeaderDo
 
 DEBUG_TEI_N = 3    # Save/print TEI debug for first N PDFs
 
+# Grobid calls are network-bound; match this to the server's concurrency setting
+
+GROBID_WORKERS = int(config.get("grobid_workers", 8))
+
+grobid_session = make_session(GROBID_WORKERS)
+
 
 
 NS = {'tei': 'http://www.tei-c.org/ns/1.0'}
 
+MAX_TEI_BYTES = 256 * 1024  # header-only TEI is a few KiB; never read more than this
+
+# Debug-only TEI dumps are written by one background thread, off the request path
+
+_tei_pool = ThreadPoolExecutor(max_workers=1)
+
+
+
+# TEI queries are compiled once and shared by every PDF: lxml XPath objects when available,
+
+# otherwise ElementTree findall (which keeps its own cache of parsed paths)
+
+if hasattr(ET, "XPath"):
+
+    _xp = lambda path: ET.XPath(path, namespaces=NS)
+
+else:
+
+    _xp = lambda path: (lambda el: el.findall(path, NS))
+
+_XP_TITLE = _xp('.//tei:titleStmt/tei:title')
+
+_XP_PERSNAME = _xp('.//tei:author/tei:persName')
+
+_XP_SURNAME = _xp('tei:surname')
+
+_XP_FORENAME = _xp('tei:forename')
+
+_XP_DOI = _xp('.//tei:idno[@type="DOI"]')
+
+_XP_DATE = _xp('.//tei:publicationStmt/tei:date')
+
+_XP_JOURNAL = _xp('.//tei:monogr/tei:title')
+
+_XP_KEYWORDS = _xp('.//tei:keywords/tei:term')
+
+_XP_STUDYTYPE = _xp('.//tei:note[@type="studyType"]')
+
+_XP_AFFIL_COUNTRY = _xp('.//tei:affiliation//tei:country')
+
+
+
+def xp_first(xp, el):
+
+    found = xp(el)
+
+    return found[0] if found else None
+
+
+
+def tei_header(tei):
+
+    """Incrementally parse TEI and return the <teiHeader> element (or the root if absent)."""
+
+    data = tei.encode('utf-8')
+
+    if hasattr(ET, "XPath"):
+
+        # lxml filters in C: only the header's end event reaches Python, and parsing stops there
+
+        for _, el in ET.iterparse(io.BytesIO(data), events=('end',), tag='{http://www.tei-c.org/ns/1.0}teiHeader'):
+
+            return el
+
+    el = None
+
+    for _, el in ET.iterparse(io.BytesIO(data), events=('end',)):
+
+        # lxml reports comments/PIs with non-string tags
+
+        if isinstance(el.tag, str) and el.tag.rsplit('}', 1)[-1] == 'teiHeader':
+
+            break  # every field below lives in the header; skip the rest of the document
+
+    return el
+
 
 
 def extract_grobid_full(pdf_file, pdf_id, tei_debug_dir=None, verbose=False):
@@ -1579,11 +2036,13 @@ def extract_grobid_full(pdf_file, pdf_id, tei_debug_dir=None, verbose=False):
 
     try:
 
-        with open(pdf_file, "rb") as f:
+        # The response context returns the pooled connection even if the read fails or stops at the cap
+
+        with open(pdf_file, "rb") as f, grobid_session.post(grobid_url, files={'input': f}, data={'consolidateHeader': '0'}, stream=True, timeout=60) as resp:
 
-            resp = requests.post(grobid_url, files={'input': f}, timeout=60)
+            resp.raw.decode_content = True
 
-        tei = resp.text
+            tei = resp.raw.read(MAX_TEI_BYTES).decode('utf-8', errors='replace')
 
         if verbose:
 
@@ -1593,27 +2052,25 @@ def extract_grobid_full(pdf_file, pdf_id, tei_debug_dir=None, verbose=False):
 
             tei_path = tei_debug_dir / f"{pdf_id}_tei.xml"
 
-            with open(tei_path, "w", encoding="utf-8") as f:
-
-                f.write(tei)
+            _tei_pool.submit(tei_path.write_text, tei, encoding="utf-8")
 
         if tei and '<TEI' in tei:
 
-            tree = ET.fromstring(tei)
+            tree = tei_header(tei)
 
             # --- Namespace-aware field extraction ---
 
-            title_el = tree.find('.//tei:titleStmt/tei:title', NS)
+            title_el = xp_first(_XP_TITLE, tree)
 
             meta["title"] = title_el.text.strip() if title_el is not None and title_el.text else ""
 
             authors = []
 
-            for pers in tree.findall('.//tei:author/tei:persName', NS):
+            for pers in _XP_PERSNAME(tree):
 
-                surname = pers.find('tei:surname', NS)
+                surname = xp_first(_XP_SURNAME, pers)
 
-                forename = pers.find('tei:forename', NS)
+                forename = xp_first(_XP_FORENAME, pers)
 
                 a = (forename.text if forename is not None else "")
 
@@ -1625,37 +2082,31 @@ def extract_grobid_full(pdf_file, pdf_id, tei_debug_dir=None, verbose=False):
 
             meta["author"] = "; ".join(authors)
 
-            doi_el = tree.find('.//tei:idno[@type="DOI"]', NS)
+            doi_el = xp_first(_XP_DOI, tree)
 
             meta["doi"] = doi_el.text.strip() if doi_el is not None and doi_el.text else ""
 
-            date_el = tree.find('.//tei:publicationStmt/tei:date', NS)
+            date_el = xp_first(_XP_DATE, tree)
 
             meta["year"] = date_el.attrib['when'][:4] if date_el is not None and 'when' in date_el.attrib else ""
 
-            j = tree.find('.//tei:monogr/tei:title', NS)
+            j = xp_first(_XP_JOURNAL, tree)
 
             meta["source_journal"] = j.text.strip() if j is not None and j.text else ""
 
-            kws = [k.text.strip() for k in tree.findall('.//tei:keywords/tei:term', NS) if k.text]
+            kws = [k.text.strip() for k in _XP_KEYWORDS(tree) if k.text]
 
             meta["author_keywords"] = "; ".join(kws)
 
-            ptype = tree.find('.//tei:note[@type="studyType"]', NS)
+            ptype = xp_first(_XP_STUDYTYPE, tree)
 
             meta["study_type"] = ptype.text.strip() if ptype is not None and ptype.text else ""
 
-            countries = []
-
-            for aff in tree.findall('.//tei:affiliation', NS):
-
-                country_el = aff.find('.//tei:country', NS)
-
-                if country_el is not None and country_el.text:
+            # One query for every affiliation country instead of a find per affiliation
 
-                    countries.append(country_el.text.strip())
+            countries = {c.text.strip() for c in _XP_AFFIL_COUNTRY(tree) if c.text}
 
-            meta["country"] = "; ".join(set(countries))
+            meta["country"] = "; ".join(countries)
 
         else:
 
@@ -1679,11 +2130,9 @@ tei_debug_dir.mkdir(exist_ok=True, parents=True)
 
 
 
-grobid_results = []
+def grobid_one(idx, pdf):
 
-for idx, pdf in enumerate(pdfs):
-
-    pdf_id = f"paper_ID_{hashlib.sha1(str(pdf).encode('utf-8')).hexdigest()[:8]}"
+    pdf_id = PDF_IDS[pdf]
 
     errors, tei_path = [], None
 
@@ -1701,7 +2150,7 @@ for idx, pdf in enumerate(pdfs):
 
         "pdf_filename": str(pdf.name),
 
-        "grobid_extraction_time_utc": datetime.utcnow().isoformat() + "Z",
+        "grobid_extraction_time_utc": BLOCK_STARTED_UTC,
 
         "tei_length": len(tei),
 
@@ -1733,15 +2182,55 @@ for idx, pdf in enumerate(pdfs):
 
     normd["error_log"] = errors
 
-    grobid_results.append(normd)
+    return normd
 
 
 
-outfile = AI_ARTIFACTS_DIR / f"grobid_results_{run_id}.json"
+# One quick liveness probe up front: an unreachable server would otherwise cost every PDF a 60 s timeout
+
+grobid_alive_url = grobid_url.rsplit("/api/", 1)[0] + "/api/isalive"
+
+if check_grobid_healthy(grobid_alive_url, timeout=3, max_age=0):
+
+    with ThreadPoolExecutor(max_workers=GROBID_WORKERS) as ex:
+
+        grobid_results = list(ex.map(grobid_one, range(len(pdfs)), pdfs))
+
+    _tei_pool.shutdown(wait=True)  # debug TEI files are complete before the block reports them
+
+else:
+
+    print_and_log(f"[WARN] Grobid not reachable at {grobid_alive_url}; skipping Grobid extraction for all {len(pdfs)} PDFs (run Block 2.5 first).")
+
+    # Per-PDF error records (blank fields, as on the extraction-failure path) so downstream blocks can tell
+
+    # "Grobid was down" apart from "Grobid found nothing"
+
+    grobid_err = f"[ERR] Grobid unavailable at {grobid_alive_url}"
+
+    grobid_results = [{
+
+        "pdf_id": PDF_IDS[pdf],
+
+        "pdf_filename": str(pdf.name),
+
+        "grobid_extraction_time_utc": BLOCK_STARTED_UTC,
+
+        "tei_length": 0,
+
+        "tei_sample": "",
 
-with open(outfile, "w", encoding="utf-8") as f:
+        **{f: "" for f in fields},
 
-    json.dump(grobid_results, f, indent=2, ensure_ascii=False)
+        "error_log": [grobid_err],
+
+    } for pdf in pdfs]
+
+
+
+outfile = AI_ARTIFACTS_DIR / f"grobid_results_{run_id}.json"
+
+outfile.write_bytes(json_dumpb(grobid_results, indent=True))
 
 print(f"[Block 3.2] Wrote Grobid results to {outfile} for {len(grobid_results)} papers.")
 
@@ -1766,10 +2255,16 @@ print("--- End Block 3.2 (Grobid Extraction, Namespace-corrected) ---")
 
 
 
-import json, hashlib
+import json, hashlib, os
+
+from concurrent.futures import ThreadPoolExecutor
 
 from datetime import datetime
 
+from src.utils import json_dumpb, utc_now_iso
+
+BLOCK_STARTED_UTC = utc_now_iso()  # one extraction timestamp per block run, shared by all its records
+
 
 
 try:
@@ -1808,9 +2303,9 @@ def extract_fitz_metadata(pdf_path):
 
     try:
 
-        doc = fitz.open(pdf_path)
+        with fitz.open(pdf_path) as doc:
 
-        m = doc.metadata
+            m = doc.metadata
 
         meta["title"] = m.get("title", "") or m.get("Title", "")
 
@@ -1824,8 +2319,6 @@ def extract_fitz_metadata(pdf_path):
 
         err = f"[WARN] fitz metadata: {e}"
 
-        print_and_log(err)
-
     return meta, err
 
 
@@ -1852,31 +2345,67 @@ def extract_pdfplumber_metadata(pdf_path):
 
         err = f"[WARN] pdfplumber metadata: {e}"
 
-        print_and_log(err)
-
     return meta, err
 
 
 
-pdfmeta_results = []
+# Both readers see the same document info dict, so pdfplumber (a second full open) only runs to fill gaps
 
-for idx, pdf in enumerate(pdfs):
+PDFPLUMBER_ALWAYS = bool(config.get("pdfmeta_always_pdfplumber", False))
 
-    pdf_id = f"paper_ID_{hashlib.sha1(str(pdf).encode('utf-8')).hexdigest()[:8]}"
+PDFMETA_KEYS = ("title", "author", "year", "author_keywords")
 
-    errors = []
 
 
+def pdf_meta_worker(pdf):
 
     fitz_m, err_fitz = extract_fitz_metadata(pdf)
 
-    if err_fitz: errors.append(err_fitz)
+    if PDFPLUMBER_ALWAYS or not all(fitz_m.get(k) for k in PDFMETA_KEYS):
+
+        return (fitz_m, err_fitz) + extract_pdfplumber_metadata(pdf)
+
+    return fitz_m, err_fitz, dict.fromkeys(fields, ""), "[INFO] pdfplumber skipped: fitz metadata complete"
+
+
+
+# PDFs are read on a thread pool: file reads (Drive in Colab) and PyMuPDF overlap across PDFs. Processes are
+
+# not used: forking a kernel with live threads (pools, the TEI writer, HTTP sessions) can deadlock, and
+
+# spawn/forkserver cannot pickle functions defined in this notebook. Warnings are logged here, in input order.
+
+META_WORKERS = int(config.get("pdfmeta_workers", min(8, os.cpu_count() or 1)))
+
+if META_WORKERS > 1 and len(pdfs) > 1:
+
+    with ThreadPoolExecutor(max_workers=META_WORKERS) as ex:
+
+        meta_results = list(ex.map(pdf_meta_worker, pdfs))
+
+else:
+
+    meta_results = [pdf_meta_worker(pdf) for pdf in pdfs]
+
+
 
+pdfmeta_results = []
+
+for pdf, (fitz_m, err_fitz, pdfplumber_m, err_pdfplumber) in zip(pdfs, meta_results):
+
+    pdf_id = PDF_IDS[pdf]
+
+    errors = []
+
+    for err in (err_fitz, err_pdfplumber):
 
+        if err:
 
-    pdfplumber_m, err_pdfplumber = extract_pdfplumber_metadata(pdf)
+            if not err.startswith("[INFO]"):
 
-    if err_pdfplumber: errors.append(err_pdfplumber)
+                print_and_log(err)
+
+            errors.append(err)
 
 
 
@@ -1902,7 +2431,7 @@ for idx, pdf in enumerate(pdfs):
 
         "pdfplumber_author_keywords": normalize_keywords(pdfplumber_m["author_keywords"]),
 
-        "extraction_time_utc": datetime.utcnow().isoformat() + "Z",
+        "extraction_time_utc": BLOCK_STARTED_UTC,
 
         "error_log": errors
 
@@ -1914,9 +2443,7 @@ for idx, pdf in enumerate(pdfs):
 
 outfile = AI_ARTIFACTS_DIR / f"pdfmeta_results_{run_id}.json"
 
-with open(outfile, "w", encoding="utf-8") as f:
-
-    json.dump(pdfmeta_results, f, indent=2, ensure_ascii=False)
+outfile.write_bytes(json_dumpb(pdfmeta_results, indent=True))
 
 print(f"[Block 3.3] Wrote PDF embedded metadata results to {outfile} for {len(pdfmeta_results)} papers.")
 
@@ -1943,6 +2470,10 @@ import json, hashlib, re
 
 from datetime import datetime
 
+from src.utils import json_dumpb, utc_now_iso
+
+BLOCK_STARTED_UTC = utc_now_iso()  # one extraction timestamp per block run, shared by all its records
+
 
 
 try:
@@ -1957,127 +2488,85 @@ except NameError:
 
 # Helper to strip common prefix junk before 'author'
 
-def clean_author_string(author_raw):
-
-    # Remove leading "Copy of", "Final", "v1", or multiples thereof
-
-    author = author_raw
-
-    author = re.sub(r"^(copy of\s*|\s*final\s*|\s*v\d+\s*|\s*-+\s*)+", "", author, flags=re.IGNORECASE)
+# Filename patterns, compiled once for the whole corpus
 
-    author = author.replace("_", " ").replace("-", " ").strip()
-
-    # Remove trailing repeated spaces, dots or junk
-
-    author = re.sub(r'\.+$', "", author).strip()
-
-    # Make sure it's not just empty or a number
-
-    return author if (len(author) > 2 and not author.strip().isdigit()) else ""
+_CLEAN_PREFIX_RE = re.compile(r"^(copy of\s*|\s*final\s*|\s*v\d+\s*|\s*-+\s*)+", re.IGNORECASE)
 
+_TRAIL_DOT_RE = re.compile(r'\.+$')
 
+_FILENAME_RE = re.compile(r"(.+?)\s*-\s*(\d{4})\s*-\s*(.+)\.pdf$", re.IGNORECASE)
 
-def extract_from_filename(pdf_path):
+_FILENAME_LOOSE_RE = re.compile(r"(.+?)\s*-\s*(\d{4})\s*-\s*(.+)", re.IGNORECASE)
 
-    # More robust: cleans at start, matches main academic export pattern
+_PDF_EXT_RE = re.compile(r"\.pdf$", re.IGNORECASE)
 
-    base = str(pdf_path.name)
+_FN_DOI_RE = re.compile(r"(10\.\d{4,9}/[\w\.\-\/]+)", re.IGNORECASE)
 
-    result = {
-
-        "author": "",
-
-        "year": "",
+def clean_author_string(author_raw):
 
-        "title": "",
+    # Remove leading "Copy of", "Final", "v1", or multiples thereof
 
-        "doi": "",
+    author = author_raw
 
-    }
+    author = _CLEAN_PREFIX_RE.sub("", author)
 
-    error = None
+    author = author.replace("_", " ").replace("-", " ").strip()
 
-    m = re.match(r"(.+?)\s*-\s*(\d{4})\s*-\s*(.+)\.pdf$", base, re.IGNORECASE)
+    # Remove trailing repeated spaces, dots or junk
 
-    if m:
+    author = _TRAIL_DOT_RE.sub("", author).strip()
 
-        raw_author, result["year"], result["title"] = m.groups()
+    # Make sure it's not just empty or a number
 
-        result["author"] = clean_author_string(raw_author)
+    return author if (len(author) > 2 and not author.strip().isdigit()) else ""
 
-    else:
 
-        # Try backup, less strict
 
-        m2 = re.match(r"(.+?)\s*-\s*(\d{4})\s*-\s*(.+)", base, re.IGNORECASE)
+def filename_row(pdf):
 
-        if m2:
+    # Match, clean and normalise in one pass, building the output record directly
 
-            raw_author, result["year"], result["title"] = m2.groups()
+    base = pdf.name
 
-            result["author"] = clean_author_string(raw_author)
+    # Main academic export pattern first, then the less strict backup
 
-        else:
+    m = _FILENAME_RE.match(base) or _FILENAME_LOOSE_RE.match(base)
 
-            error = f"[WARN] Filename did not match expected pattern: '{base}'"
+    raw_author, year, title = m.groups() if m else ("", "", "")
 
     # Try extracting DOI from base/filename (remove .pdf for search)
 
-    base_noext = re.sub(r"\.pdf$", "", base, flags=re.IGNORECASE)
-
-    m_doi = re.search(r"(10\.\d{4,9}/[\w\.\-\/]+)", base_noext, re.IGNORECASE)
-
-    if m_doi:
-
-        result["doi"] = m_doi.group(1)
-
-    return result, error
-
-
-
-filename_results = []
-
-for idx, pdf in enumerate(pdfs):
-
-    pdf_id = f"paper_ID_{hashlib.sha1(str(pdf).encode('utf-8')).hexdigest()[:8]}"
-
-    fnres, warn = extract_from_filename(pdf)
+    m_doi = _FN_DOI_RE.search(_PDF_EXT_RE.sub("", base))
 
-    errors = []
-
-    if warn:
+    return {
 
-        errors.append(warn)
+        "pdf_id": PDF_IDS[pdf],
 
-    normd = {
+        "pdf_filename": base,
 
-        "pdf_id": pdf_id,
+        "fn_author": normalize_author(clean_author_string(raw_author)) if m else "",
 
-        "pdf_filename": str(pdf.name),
+        "fn_year": year,
 
-        "fn_author": normalize_author(fnres["author"]),
+        "fn_title": title.replace("_", " ").strip(),
 
-        "fn_year": fnres["year"],
+        "fn_doi": normalize_doi(m_doi.group(1)) if m_doi else "",
 
-        "fn_title": fnres["title"].replace("_", " ").strip(),
+        "extraction_time_utc": BLOCK_STARTED_UTC,
 
-        "fn_doi": normalize_doi(fnres["doi"]),
+        "error_log": [] if m else [f"[WARN] Filename did not match expected pattern: '{base}'"]
 
-        "extraction_time_utc": datetime.utcnow().isoformat() + "Z",
+    }
 
-        "error_log": errors
 
-    }
 
-    filename_results.append(normd)
+filename_results = [filename_row(pdf) for pdf in pdfs]
 
 
 
 outfile = AI_ARTIFACTS_DIR / f"filename_results_{run_id}.json"
 
-with open(outfile, "w", encoding="utf-8") as f:
-
-    json.dump(filename_results, f, indent=2, ensure_ascii=False)
+outfile.write_bytes(json_dumpb(filename_results, indent=True))
 
 print(f"[Block 3.4] Wrote filename/regex extraction results to {outfile} for {len(filename_results)} papers.")
 
@@ -2104,8 +2593,14 @@ print("--- End Block 3.4 (Improved Filename/Regex Metadata Extraction) ---")
 
 import json, hashlib, requests
 
+from concurrent.futures import ThreadPoolExecutor
+
 from datetime import datetime
 
+from src.utils import json_dumpb, utc_now_iso
+
+BLOCK_STARTED_UTC = utc_now_iso()  # one extraction timestamp per block run, shared by all its records
+
 
 
 try:
@@ -2118,41 +2613,59 @@ except NameError:
 
 
 
-def try_load(path):
 
-    try:
 
-        with open(path) as f:
+allow_internet = config.get("allow_internet", True)
 
-            out = json.load(f)
+CROSSREF_WORKERS = int(config.get("crossref_workers", 8))
 
-        print(f"[INFO] Loaded {path.name}, {len(out)} records.")
+CROSSREF_BATCH = int(config.get("crossref_batch", 20))  # DOIs per filter=doi:... request
 
-        return {r["pdf_id"]: r for r in out}
+crossref_session = make_session(CROSSREF_WORKERS)
 
-    except Exception as e:
 
-        print(f"[WARN] Could not load {path}: {e}")
 
-        return {}
+grobid_res = get_results("grobid")
 
+llm_res = get_results("llm")
 
+fn_res = get_results("filename")
 
-allow_internet = config.get("allow_internet", True)
 
-grobid_path = AI_ARTIFACTS_DIR / f"grobid_results_{run_id}.json"
 
-llm_path = AI_ARTIFACTS_DIR / f"llm_results_{run_id}.json"
+def crossref_batch(dois):
+
+    """Fetch works for several DOIs in one filter query; returns {normalized DOI: work}."""
+
+    try:
+
+        r = crossref_session.get(
+
+            "https://api.crossref.org/works",
+
+            params={"filter": ",".join(f"doi:{d}" for d in dois), "rows": len(dois)},
 
-filename_path = AI_ARTIFACTS_DIR / f"filename_results_{run_id}.json"
+            timeout=30,
+
+        )
+
+        if r.status_code != 200:
+
+            print_and_log(f"[WARN] CrossRef batch of {len(dois)} DOIs failed: HTTP {r.status_code}; falling back per DOI")
+
+            return {}
+
+        return {normalize_doi(it.get("DOI")): it for it in r.json().get("message", {}).get("items", [])}
+
+    except Exception as e:
 
+        print_and_log(f"[WARN] CrossRef batch error: {e}; falling back per DOI")
 
+        return {}
 
-grobid_res = try_load(grobid_path)
 
-llm_res = try_load(llm_path)
 
-fn_res = try_load(filename_path)
+crossref_by_doi = {}  # filled by the batched pre-pass below
 
 
 
@@ -2164,35 +2677,55 @@ def extract_crossref_metadata(doi, title, author):
 
         if doi:
 
-            url = f"https://api.crossref.org/works/{normalize_doi(doi)}"
+            key = f"crossref:doi:{normalize_doi(doi)}"
+
+            dat = crossref_by_doi.get(normalize_doi(doi)) or API_CACHE.get(key)
+
+            if not dat:
 
-            r = requests.get(url, timeout=15)
+                url = f"https://api.crossref.org/works/{normalize_doi(doi)}"
 
-            if r.status_code != 200:
+                r = crossref_session.get(url, timeout=15)
 
-                err = f"[WARN] CrossRef DOI {doi} query failed: HTTP {r.status_code}"
+                if r.status_code != 200:
 
-                return out, err
+                    err = f"[WARN] CrossRef DOI {doi} query failed: HTTP {r.status_code}"
 
-            dat = r.json().get("message", {})
+                    return out, err
+
+                dat = r.json().get("message", {})
+
+                if dat:
+
+                    API_CACHE.set(key, dat)
 
         elif title and author:
 
             q = f"{title} {author}"
 
-            url = f"https://api.crossref.org/works?query.bibliographic={requests.utils.quote(q)}&rows=1"
+            key = "crossref:bib:" + hashlib.sha1(q.encode("utf-8")).hexdigest()
 
-            r = requests.get(url, timeout=15)
+            dat = API_CACHE.get(key)
 
-            if r.status_code != 200:
+            if not dat:
 
-                err = f"[WARN] CrossRef bibliographic query ('{q}') failed: HTTP {r.status_code}"
+                url = f"https://api.crossref.org/works?query.bibliographic={requests.utils.quote(q)}&rows=1"
 
-                return out, err
+                r = crossref_session.get(url, timeout=15)
 
-            items = r.json().get("message", {}).get("items", [])
+                if r.status_code != 200:
 
-            dat = items[0] if items else {}
+                    err = f"[WARN] CrossRef bibliographic query ('{q}') failed: HTTP {r.status_code}"
+
+                    return out, err
+
+                items = r.json().get("message", {}).get("items", [])
+
+                dat = items[0] if items else {}
+
+                if dat:
+
+                    API_CACHE.set(key, dat)
 
         else:
 
@@ -2232,13 +2765,9 @@ def extract_crossref_metadata(doi, title, author):
 
 
 
-crossref_results = []
-
-for pdf in pdfs:
+def crossref_candidate(pdf):
 
-    pdf_id = f"paper_ID_{hashlib.sha1(str(pdf).encode('utf-8')).hexdigest()[:8]}"
-
-    errors = []
+    pdf_id = PDF_IDS[pdf]
 
     grob = grobid_res.get(pdf_id, {})
 
@@ -2256,7 +2785,15 @@ for pdf in pdfs:
 
     ]
 
-    candidate = next((c for c in candidates if c["doi"] or (c["title"] and c["author"])), None)
+    return next((c for c in candidates if c["doi"] or (c["title"] and c["author"])), None)
+
+
+
+def crossref_one(pdf):
+
+    pdf_id = PDF_IDS[pdf]
+
+    candidate = crossref_candidate(pdf)
 
     if not allow_internet:
 
@@ -2282,7 +2819,7 @@ for pdf in pdfs:
 
             "crossref_country": "",
 
-            "extraction_time_utc": datetime.utcnow().isoformat() + "Z",
+            "extraction_time_utc": BLOCK_STARTED_UTC,
 
             "error_log": ["[INFO] Skipped: allow_internet is False"]
 
@@ -2314,7 +2851,7 @@ for pdf in pdfs:
 
             "crossref_country": normalize_country(cr["country"]),
 
-            "extraction_time_utc": datetime.utcnow().isoformat() + "Z",
+            "extraction_time_utc": BLOCK_STARTED_UTC,
 
             "error_log": [err] if err else []
 
@@ -2344,21 +2881,55 @@ for pdf in pdfs:
 
             "crossref_country": "",
 
-            "extraction_time_utc": datetime.utcnow().isoformat() + "Z",
+            "extraction_time_utc": BLOCK_STARTED_UTC,
 
             "error_log": ["[WARN] Could not assemble lookup info from any extractor."]
 
         }
 
-    crossref_results.append(normd)
+    return normd
 
 
 
-outfile = AI_ARTIFACTS_DIR / f"crossref_results_{run_id}.json"
+with ThreadPoolExecutor(max_workers=CROSSREF_WORKERS) as ex:
+
+    if allow_internet:
+
+        # Resolve DOI candidates CROSSREF_BATCH at a time; misses and title/author lookups go per record
+
+        # (DOIs containing commas cannot be expressed in a filter and also go per record)
+
+        batch_dois = sorted({
+
+            d for d in (normalize_doi(c["doi"]) for c in map(crossref_candidate, pdfs) if c and c["doi"])
+
+            if "," not in d
+
+        })
+
+        for d in batch_dois:
+
+            if (hit := API_CACHE.get(f"crossref:doi:{d}")):
+
+                crossref_by_doi[d] = hit
+
+        todo = [d for d in batch_dois if d not in crossref_by_doi]
+
+        for found in ex.map(crossref_batch, [todo[i:i + CROSSREF_BATCH] for i in range(0, len(todo), CROSSREF_BATCH)]):
+
+            crossref_by_doi.update(found)
+
+            API_CACHE.set_many((f"crossref:doi:{d}", w) for d, w in found.items() if w)
+
+        print(f"[INFO] CrossRef batch pre-pass resolved {len(crossref_by_doi)}/{len(batch_dois)} DOIs.")
+
+    crossref_results = list(ex.map(crossref_one, pdfs))
+
 
-with open(outfile, "w", encoding="utf-8") as f:
 
-    json.dump(crossref_results, f, indent=2, ensure_ascii=False)
+outfile = AI_ARTIFACTS_DIR / f"crossref_results_{run_id}.json"
+
+outfile.write_bytes(json_dumpb(crossref_results, indent=True))
 
 print(f"[Block 3.5] Wrote CrossRef extraction results to {outfile} for {len(crossref_results)} papers.")
 
@@ -2381,8 +2952,14 @@ print("--- End Block 3.5 (CrossRef Metadata Extraction, resilient) ---")
 
 import json, hashlib, requests
 
+from concurrent.futures import ThreadPoolExecutor
+
 from datetime import datetime
 
+from src.utils import json_dumpb, utc_now_iso
+
+BLOCK_STARTED_UTC = utc_now_iso()  # one extraction timestamp per block run, shared by all its records
+
 
 
 try:
@@ -2395,41 +2972,57 @@ except NameError:
 
 
 
-def try_load(path):
 
-    try:
 
-        with open(path) as f:
+allow_internet = config.get("allow_internet", True)
 
-            results = json.load(f)
 
-        print(f"[INFO] Loaded {path.name}, {len(results)} records.")
 
-        return {r["pdf_id"]: r for r in results}
+grobid_res = get_results("grobid")
 
-    except Exception as e:
+llm_res = get_results("llm")
 
-        print(f"[WARN] Could not load {path}: {e}")
+fn_res = get_results("filename")
 
-        return {}
 
 
+OPENALEX_BATCH = int(config.get("openalex_batch", 50))  # DOIs per filter=doi:a|b|... page
 
-allow_internet = config.get("allow_internet", True)
 
-grobid_path = AI_ARTIFACTS_DIR / f"grobid_results_{run_id}.json"
 
-llm_path = AI_ARTIFACTS_DIR / f"llm_results_{run_id}.json"
+def openalex_batch(dois):
+
+    """Fetch works for several DOIs in one filter query; returns {normalized DOI: work}."""
+
+    try:
+
+        r = openalex_session.get(
+
+            "https://api.openalex.org/works",
+
+            params={"filter": "doi:" + "|".join(dois), "per-page": len(dois)},
+
+            timeout=30,
+
+        )
+
+        if r.status_code != 200:
+
+            print_and_log(f"[WARN] OpenAlex batch of {len(dois)} DOIs failed: HTTP {r.status_code}; falling back per DOI")
+
+            return {}
 
-filename_path = AI_ARTIFACTS_DIR / f"filename_results_{run_id}.json"
+        return {normalize_doi(w.get("doi")): w for w in r.json().get("results", [])}
 
+    except Exception as e:
+
+        print_and_log(f"[WARN] OpenAlex batch error: {e}; falling back per DOI")
 
+        return {}
 
-grobid_res = try_load(grobid_path)
 
-llm_res = try_load(llm_path)
 
-fn_res = try_load(filename_path)
+openalex_by_doi = {}  # filled by the batched pre-pass below
 
 
 
@@ -2441,31 +3034,53 @@ def extract_openalex_metadata(doi, title):
 
         if doi:
 
-            url = f"https://api.openalex.org/works/https://doi.org/{normalize_doi(doi)}"
+            key = f"openalex:doi:{normalize_doi(doi)}"
+
+            dat = openalex_by_doi.get(normalize_doi(doi)) or API_CACHE.get(key)
+
+            if not dat:
 
-            r = requests.get(url, timeout=20)
+                url = f"https://api.openalex.org/works/https://doi.org/{normalize_doi(doi)}"
 
-            if r.status_code != 200:
+                r = openalex_session.get(url, timeout=20)
 
-                err = f"[WARN] OpenAlex DOI {doi} query failed: HTTP {r.status_code}"
+                if r.status_code != 200:
 
-                return out, err
+                    err = f"[WARN] OpenAlex DOI {doi} query failed: HTTP {r.status_code}"
 
-            dat = r.json()
+                    return out, err
+
+                dat = r.json()
+
+                if dat:
+
+                    API_CACHE.set(key, dat)
 
         elif title:
 
-            url = f"https://api.openalex.org/works?title.search={requests.utils.quote(title)}"
+            key = "openalex:title:" + hashlib.sha1(title.encode("utf-8")).hexdigest()
+
+            dat = API_CACHE.get(key)
+
+            if not dat:
 
-            r = requests.get(url, timeout=20)
+                url = f"https://api.openalex.org/works?title.search={requests.utils.quote(title)}"
 
-            if r.status_code != 200:
+                r = openalex_session.get(url, timeout=20)
 
-                err = f"[WARN] OpenAlex title.search ('{title}') failed: HTTP {r.status_code}"
+                if r.status_code != 200:
 
-                return out, err
+                    err = f"[WARN] OpenAlex title.search ('{title}') failed: HTTP {r.status_code}"
 
-            dat = r.json()["results"][0] if "results" in r.json() and r.json()["results"] else {}
+                    return out, err
+
+                found = r.json().get("results") or []
+
+                dat = found[0] if found else {}
+
+                if dat:
+
+                    API_CACHE.set(key, dat)
 
         else:
 
@@ -2503,9 +3118,7 @@ def extract_openalex_metadata(doi, title):
 
         out["study_type"] = dat.get("type", "")
 
-        ISO_MAP = {'us': 'United States', 'gb':'United Kingdom', 'uk':'United Kingdom', 'au':'Australia', 'nz':'New Zealand', 'ca':'Canada'}
-
-        countries = []
+        countries = []  # country codes resolved via the Block 3.0 ISO_MAP
 
         for a in dat.get("authorships", []):
 
@@ -2529,13 +3142,13 @@ def extract_openalex_metadata(doi, title):
 
 
 
-openalex_results = []
+OPENALEX_WORKERS = int(config.get("openalex_workers", 8))
 
-for pdf in pdfs:
+openalex_session = make_session(OPENALEX_WORKERS)
 
-    pdf_id = f"paper_ID_{hashlib.sha1(str(pdf).encode('utf-8')).hexdigest()[:8]}"
+def openalex_candidate(pdf):
 
-    errors = []
+    pdf_id = PDF_IDS[pdf]
 
     grob = grobid_res.get(pdf_id, {})
 
@@ -2553,7 +3166,15 @@ for pdf in pdfs:
 
     ]
 
-    candidate = next((c for c in candidates if c["doi"] or c["title"]), None)
+    return next((c for c in candidates if c["doi"] or c["title"]), None)
+
+
+
+def openalex_one(pdf):
+
+    pdf_id = PDF_IDS[pdf]
+
+    candidate = openalex_candidate(pdf)
 
     if not allow_internet:
 
@@ -2579,7 +3200,7 @@ for pdf in pdfs:
 
             "openalex_country": "",
 
-            "extraction_time_utc": datetime.utcnow().isoformat() + "Z",
+            "extraction_time_utc": BLOCK_STARTED_UTC,
 
             "error_log": ["[INFO] Skipped: allow_internet is False"]
 
@@ -2611,7 +3232,7 @@ for pdf in pdfs:
 
             "openalex_country": normalize_country(cr["country"]),
 
-            "extraction_time_utc": datetime.utcnow().isoformat() + "Z",
+            "extraction_time_utc": BLOCK_STARTED_UTC,
 
             "error_log": [err] if err else []
 
@@ -2641,116 +3262,114 @@ for pdf in pdfs:
 
             "openalex_country": "",
 
-            "extraction_time_utc": datetime.utcnow().isoformat() + "Z",
+            "extraction_time_utc": BLOCK_STARTED_UTC,
 
             "error_log": ["[WARN] Could not assemble lookup info from any extractor."]
 
         }
 
-    openalex_results.append(normd)
+    return normd
 
 
 
-outfile = AI_ARTIFACTS_DIR / f"openalex_results_{run_id}.json"
+with ThreadPoolExecutor(max_workers=OPENALEX_WORKERS) as ex:
 
-with open(outfile, "w", encoding="utf-8") as f:
+    if allow_internet:
 
-    json.dump(openalex_results, f, indent=2, ensure_ascii=False)
+        # Resolve DOI candidates OPENALEX_BATCH at a time; misses and title searches go per record
 
-print(f"[Block 3.6] Wrote OpenAlex extraction results to {outfile} for {len(openalex_results)} papers.")
+        batch_dois = sorted({
 
-for r in openalex_results[:3]:
+            d for d in (normalize_doi(c["doi"]) for c in map(openalex_candidate, pdfs) if c and c["doi"])
 
-    print(f"\n{r['pdf_filename']}\nTitle: {r['openalex_title']} | Author(s): {r['openalex_author']} | Year: {r['openalex_year']} | DOI: {r['openalex_doi']}\nERROR: {r['error_log']}")
+            if "|" not in d
 
-print("--- End Block 3.6 (OpenAlex Metadata Extraction, bulletproof) ---")
-# @title [Block 3.7] Extraction Method Comparison/Diagnostics Table (v6.6.0)
+        })
 
-# Version 6.6.0
+        for d in batch_dois:
 
-#
+            if (hit := API_CACHE.get(f"openalex:doi:{d}")):
 
-# - Table 1: Null/blank count matrix — field (row) × method (col)
+                openalex_by_doi[d] = hit
 
-# - Table 2+: For each paper: method (row) × field (col), shows each returned value.
+        todo = [d for d in batch_dois if d not in openalex_by_doi]
 
-# - Lists per-method error logs grouped for audit.
+        for found in ex.map(openalex_batch, [todo[i:i + OPENALEX_BATCH] for i in range(0, len(todo), OPENALEX_BATCH)]):
 
-# - Output: ai_artifacts/master_nullcount_{run_id}.csv, ai_artifacts/master_perpaper_{run_id}.json
+            openalex_by_doi.update(found)
 
+            API_CACHE.set_many((f"openalex:doi:{d}", w) for d, w in found.items() if w)
 
+        print(f"[INFO] OpenAlex batch pre-pass resolved {len(openalex_by_doi)}/{len(batch_dois)} DOIs.")
 
-import json, hashlib, pandas as pd
+    openalex_results = list(ex.map(openalex_one, pdfs))
 
-from pathlib import Path
 
 
+outfile = AI_ARTIFACTS_DIR / f"openalex_results_{run_id}.json"
 
-try:
+outfile.write_bytes(json_dumpb(openalex_results, indent=True))
 
-    OP_DIR
-
-except NameError:
+print(f"[Block 3.6] Wrote OpenAlex extraction results to {outfile} for {len(openalex_results)} papers.")
 
-    raise RuntimeError("Block 3.0 (common setup) must be run first!")
+for r in openalex_results[:3]:
 
+    print(f"\n{r['pdf_filename']}\nTitle: {r['openalex_title']} | Author(s): {r['openalex_author']} | Year: {r['openalex_year']} | DOI: {r['openalex_doi']}\nERROR: {r['error_log']}")
 
+print("--- End Block 3.6 (OpenAlex Metadata Extraction, bulletproof) ---")
+# @title [Block 3.7] Extraction Method Comparison/Diagnostics Table (v6.6.0)
 
-# --- Method to file mapping
+# Version 6.6.0
 
-method_to_jsonfile = {
+#
 
-    "llm":         f"llm_results_{run_id}.json",
+# - Table 1: Null/blank count matrix — field (row) × method (col)
 
-    "grobid":      f"grobid_results_{run_id}.json",
+# - Table 2+: For each paper: method (row) × field (col), shows each returned value.
 
-    "filename":    f"filename_results_{run_id}.json",
+# - Lists per-method error logs grouped for audit.
 
-    "fitz":        f"pdfmeta_results_{run_id}.json",
+# - Output: ai_artifacts/master_nullcount_{run_id}.csv, ai_artifacts/master_perpaper_{run_id}.json
 
-    "pdfplumber":  f"pdfmeta_results_{run_id}.json",  # both in same file
 
-    "crossref":    f"crossref_results_{run_id}.json",
 
-    "openalex":    f"openalex_results_{run_id}.json"
+import json, hashlib, pandas as pd
 
-}
+from pathlib import Path
 
+from src.utils import json_dumpb, write_csv
 
 
-def load_method_results(method, colmap=None, subkey=None):
 
-    path = AI_ARTIFACTS_DIR / method_to_jsonfile[method]
+try:
 
-    try:
+    OP_DIR
 
-        with open(path) as f:
+except NameError:
 
-            dat = json.load(f)
+    raise RuntimeError("Block 3.0 (common setup) must be run first!")
 
-        results = {}
 
-        for obj in dat:
 
-            pdf_id = obj["pdf_id"]
+# --- Method to results file mapping ({name}_results_{run_id}.json)
 
-            if subkey:  # for fitz/pdfplumber "pdfmeta_results"
+method_to_results = {
 
-                use = obj.get(f"{subkey}_{colmap}", "") if colmap else obj.get(f"{subkey}", "")
+    "llm":         "llm",
 
-            else:
+    "grobid":      "grobid",
 
-                use = {field: obj.get(f"{colmap}_{field}", obj.get(field, "")) for field in fields} if colmap else {field: obj.get(field, "") for field in fields}
+    "filename":    "filename",
 
-            results[pdf_id] = obj
+    "fitz":        "pdfmeta",
 
-        return results
+    "pdfplumber":  "pdfmeta",  # both in same file
 
-    except Exception as e:
+    "crossref":    "crossref",
 
-        print(f"[WARN] Could not load {method}: {path}! {e}")
+    "openalex":    "openalex"
 
-        return {}
+}
 
 
 
@@ -2772,57 +3391,43 @@ method_results = {}
 
 for method in methods:
 
-    if method in ["fitz", "pdfplumber"]:
-
-        colmap = "title"  # dummy; all handled in next block
-
-        subkey = method
+    # Shared Block 3.0 loader: files already parsed by Blocks 3.5/3.6 (and pdfmeta for fitz+pdfplumber) are reused
 
-    else:
-
-        colmap, subkey = None, None
-
-    method_results[method] = load_method_results(method, colmap=subkey, subkey=subkey)
+    method_results[method] = get_results(method_to_results[method])
 
 
 
 # --- Table 1: Null/Blank Count Table (field x method) ---
 
-nullcount = pd.DataFrame(0, index=fields, columns=methods)
-
-for pdf in pdfs:
-
-    pdf_id = f"paper_ID_{hashlib.sha1(str(pdf).encode('utf-8')).hexdigest()[:8]}"
-
-    for m in methods:
+# Every (method, paper, field) value is gathered once into a flat array; the blank check
 
-        res = method_results[m].get(pdf_id, {})
+# (falsy, whitespace or "none") runs as one vectorized string pass and the counts are a
 
-        # For fitz/pdfplumber, handle alternate field layout
+# single NumPy reduction over the (methods x papers x fields) uint8 mask
 
-        for f in fields:
+pdf_ids = [PDF_IDS[pdf] for pdf in pdfs]
 
-            if m == "fitz":
+field_prefix = {"fitz": "fitz_", "pdfplumber": "pdfplumber_"}  # alternate field layout in pdfmeta results
 
-                val = res.get("fitz_" + f, "")
+vals = pd.Series([
 
-            elif m == "pdfplumber":
+    method_results[m].get(pdf_id, {}).get(field_prefix.get(m, "") + f, "")
 
-                val = res.get("pdfplumber_" + f, "")
+    for m in methods for pdf_id in pdf_ids for f in fields
 
-            else:
+], dtype=object)
 
-                val = res.get(f, "")
+blank = (~vals.astype(bool) | vals.astype(str).str.strip().str.lower().isin(["", "none"]))
 
-            if not val or str(val).strip() == "" or str(val).strip().lower() == "none":
+blank = blank.to_numpy(dtype="uint8").reshape(len(methods), len(pdf_ids), len(fields))
 
-                nullcount.loc[f, m] += 1
+nullcount = pd.DataFrame(blank.sum(axis=1).T, index=fields, columns=methods)
 
 
 
 outfile = AI_ARTIFACTS_DIR / f"master_nullcount_{run_id}.csv"
 
-nullcount.to_csv(outfile)
+write_csv(nullcount.rename_axis("field"), outfile, index=True)
 
 print("\n=== Table 1: Null/Blank Count Table (field x method) ===")
 
@@ -2834,69 +3439,37 @@ print(f"Table written to {outfile}")
 
 # --- Table 2+: Per-paper method × field value map ---
 
-perpaper_output = {}
-
-for pdf in pdfs:
-
-    pdf_id = f"paper_ID_{hashlib.sha1(str(pdf).encode('utf-8')).hexdigest()[:8]}"
-
-    paper_tab = pd.DataFrame(
-
-        columns=fields, index=methods
-
-    )
-
-    for m in methods:
-
-        res = method_results[m].get(pdf_id, {})
-
-        for f in fields:
-
-            if m == "fitz":
-
-                val = res.get("fitz_" + f, "")
-
-            elif m == "pdfplumber":
+# Field-name prefix per method in its results file (filename uses fn_title/fn_author/fn_year etc.)
 
-                val = res.get("pdfplumber_" + f, "")
+method_prefix = {"fitz": "fitz_", "pdfplumber": "pdfplumber_", "filename": "fn_", "crossref": "crossref_", "openalex": "openalex_"}
 
-            elif m == "filename":
+def resolved_val(m, pdf_id, f):
 
-                # For filename, map to fn_title/fn_author/fn_year etc.
+    return method_results[m].get(pdf_id, {}).get(method_prefix.get(m, "") + f, "")
 
-                mapfield = {"title": "fn_title", "author": "fn_author", "year": "fn_year", "doi": "fn_doi"}
+# The {field: {method: value}} table is built in one comprehension (the shape DataFrame.to_dict() gave),
 
-                val = res.get(mapfield.get(f, "fn_" + f), "")
+# rather than through per-cell .loc assignments on an empty frame
 
-            elif m == "crossref":
+perpaper_output = {
 
-                val = res.get("crossref_" + f, "")
-
-            elif m == "openalex":
-
-                val = res.get("openalex_" + f, "")
-
-            else:
-
-                val = res.get(f, "")
-
-            paper_tab.loc[m, f] = val
-
-    perpaper_output[pdf_id] = {
+    PDF_IDS[pdf]: {
 
         "pdf_filename": pdf.name,
 
-        "comparison_table": paper_tab.to_dict(),
+        "comparison_table": {f: {m: resolved_val(m, PDF_IDS[pdf], f) for m in methods} for f in fields},
 
     }
 
+    for pdf in pdfs
 
+}
 
-outfile_json = AI_ARTIFACTS_DIR / f"master_perpaper_{run_id}.json"
 
-with open(outfile_json, "w", encoding="utf-8") as f:
 
-    json.dump(perpaper_output, f, indent=2, ensure_ascii=False)
+outfile_json = AI_ARTIFACTS_DIR / f"master_perpaper_{run_id}.json"
+
+outfile_json.write_bytes(json_dumpb(perpaper_output, indent=True))
 
 
 
@@ -3023,18 +3596,36 @@ print("--- End Block 3.7 (Method Comparison + Per-paper Review Tables) ---")
 
 # - All audit, normalization, error logging, API/network logic from v6.4.0 retained.
 
+# - Embedded /Info metadata (incl. keywords) comes from fitz only; pdfplumber duplicated it and is no longer called.
+
 
 
-import os, re, fitz, pdfplumber, requests, json, yaml, hashlib, xml.etree.ElementTree as ET
+import io, os, re, requests, json, yaml, hashlib
+
+try:
+
+    from lxml import etree as ET  # C parser with the same find/findall/iterparse API
+
+except ImportError:
+
+    import xml.etree.ElementTree as ET
+
+from requests.adapters import HTTPAdapter
 
 from pathlib import Path
 
-import pandas as pd
+from src.utils import JsonCache, json_dumpb, json_loads, list_pdfs, load_yaml, open_log, pdf_hash_id
+
+# fitz and pandas are imported where first used so a failed setup step does not pay for them
 
 
 
 # ... [Normalization helpers and previous definitions—unchanged, see v6.4.0] ...
 
+_COUNTRY_CLEAN_RE = re.compile(r'[^a-zA-Z ]+')
+
+_KW_SPLIT_RE = re.compile(r";|,|/|\|")
+
 
 
 
@@ -3046,25 +3637,21 @@ def normalize_country(raw):
 
     vals = [w.strip() for w in str(raw).split(';') if w.strip()]
 
-    names = []
+    names, seen_lc = [], set()  # case-insensitive dedupe in one pass
 
     for v in vals:
 
-        v_lc = v.lower()
+        c = ISO_MAP.get(v.lower()) or _COUNTRY_CLEAN_RE.sub('', v).strip()
 
-        n = ISO_MAP.get(v_lc)
+        c_lc = c.lower()
 
-        if n: names.append(n)
+        if c and c_lc not in seen_lc:
 
-        else:
-
-            c = re.sub(r'[^a-zA-Z ]+', '', v).strip()
-
-            if c and c.lower() not in [n.lower() for n in names]:
+            names.append(c)
 
-                names.append(c)
+            seen_lc.add(c_lc)
 
-    return "; ".join(dict.fromkeys(names))
+    return "; ".join(names)
 
 
 
@@ -3082,7 +3669,7 @@ def normalize_keywords(raw):
 
         if isinstance(v, str):
 
-            flat += [k.strip() for k in re.split(r";|,|/|\|", v) if k.strip()]
+            flat += [k.strip() for k in _KW_SPLIT_RE.split(v) if k.strip()]
 
         else:
 
@@ -3106,20 +3693,126 @@ def normalize_keywords(raw):
 
 
 
-with open("pipeline_env.json", "r") as f: env = json.load(f)
+with open("pipeline_env.json", "rb") as f: env = json_loads(f.read())
 
 OP_DIR = Path(env["OPERATIONAL_DIR"])
 
 CONFIG_PATH = OP_DIR / "config.yaml"
 
-with open(CONFIG_PATH, "r") as f: config = yaml.safe_load(f)
+config = load_yaml(CONFIG_PATH)  # libyaml loader, parsed once per file version
 
 PDF_DIR = Path(config["pdf_dir"])
 
-pdfs = sorted(PDF_DIR.glob("*.pdf"))[:20]  # Always a list of Path objects!
+pdfs = list_pdfs(PDF_DIR)[:20]  # Always a list of Path objects!
 
 grobid_url = config.get("grobid_url", "http://localhost:8070/api/processHeaderDocument")
 
+# One pooled session so concurrent Grobid calls reuse TCP connections
+
+grobid_session = requests.Session()
+
+grobid_session.mount("http://", HTTPAdapter(pool_maxsize=16))
+
+MAX_TEI_BYTES = 256 * 1024  # header-only TEI is a few KiB; never read more than this
+
+
+
+def tei_fields(tei):
+
+    """Collect the header fields from Grobid TEI in one streaming pass.
+
+    Elements are matched on their local name and ancestors (so the TEI namespace needs no mapping),
+
+    each element is cleared once handled, and parsing stops at the end of <teiHeader>."""
+
+    out = {}
+
+    authors, kws, countries = [], [], set()
+
+    stack, pers, aff_has_country = [], {}, False
+
+    for event, el in ET.iterparse(io.BytesIO(tei.encode('utf-8')), events=('start', 'end')):
+
+        if not isinstance(el.tag, str):  # lxml reports comments/PIs with non-string tags
+
+            continue
+
+        tag = el.tag.rsplit('}', 1)[-1]
+
+        if event == 'start':
+
+            stack.append(tag)
+
+            if tag == 'affiliation':
+
+                aff_has_country = False
+
+            continue
+
+        stack.pop()
+
+        parent = stack[-1] if stack else ""
+
+        text = (el.text or "").strip()
+
+        if tag == 'title' and parent == 'titleStmt':
+
+            out.setdefault("title", text)
+
+        elif tag == 'title' and parent == 'monogr':
+
+            out.setdefault("source_journal", text)
+
+        elif tag in ('forename', 'surname') and 'persName' in stack and 'author' in stack:
+
+            pers.setdefault(tag, el.text or "")
+
+        elif tag == 'persName' and 'author' in stack:
+
+            val = (pers.get('forename', "") + " " + pers.get('surname', "")).strip()
+
+            if val: authors.append(val)
+
+            pers = {}
+
+        elif tag == 'idno' and el.get('type') == 'DOI':
+
+            out.setdefault("doi", text)
+
+        elif tag == 'date' and parent == 'publicationStmt' and el.get('when'):
+
+            out.setdefault("year", el.get('when')[:4])
+
+        elif tag == 'term' and 'keywords' in stack:
+
+            if text: kws.append(text)
+
+        elif tag == 'note' and el.get('type') == 'studyType':
+
+            out.setdefault("study_type", text)
+
+        elif tag == 'country' and 'affiliation' in stack and not aff_has_country:
+
+            aff_has_country = True  # first country per affiliation, as before
+
+            if text: countries.add(text)
+
+        el.clear()
+
+        if tag == 'teiHeader':
+
+            break  # every field lives in the header; skip the rest of the document
+
+    out["author"] = "; ".join(authors)
+
+    out["author_keywords"] = "; ".join(kws)
+
+    out["country"] = "; ".join(countries)
+
+    return out
+
+
+
 allow_internet = config.get("allow_internet", True)
 
 
@@ -3138,6 +3831,20 @@ except Exception:
 
 llm_model = config.get("llm_model")
 
+# Opt-in: skip the LLM call when Grobid already returned every core bibliographic field. This saves API cost but makes
+
+# each paper wait for Grobid before its LLM call starts, so the two no longer overlap. Skipped papers are recorded
+
+# as llm_skipped and left out of the LLM null counts and match analytics below
+
+LLM_SKIP_IF_GROBID_COMPLETE = bool(config.get("llm_skip_if_grobid_complete", False))
+
+GROBID_CORE_FIELDS = ("title", "author", "year", "doi", "source_journal")
+
+# Parsed LLM answers are kept in API_CACHE keyed by sha256(model + prompt), so unchanged PDFs skip the call on re-runs
+
+LLM_CACHE = bool(config.get("llm_cache", True))
+
 
 
 fields = [
@@ -3148,32 +3855,78 @@ fields = [
 
 ]
 
-method_names = ["llm", "grobid", "fitz", "pdfplumber", "filename", "crossref", "openalex"]
+# pdfplumber is not a method here: it only re-reads the same /Info dict fitz exposes, at many times the cost
 
+method_names = ["llm", "grobid", "fitz", "filename", "crossref", "openalex"]
 
+_EMPTY_META = dict.fromkeys(fields, "")  # copied per call instead of rebuilding a dict comprehension
 
 
 
 
-def search_doi_in_text(pdf_file):
+
+
+class PdfCache:
+
+    """Open a PDF once with fitz and share the document across extractors."""
+
+    def __init__(self, path):
+
+        import fitz
+
+        self.doc = fitz.open(path)
+
+        self.meta = self.doc.metadata or {}
+
+        self._pages = {}
+
+    def page_text(self, i):
+
+        if i not in self._pages:
+
+            self._pages[i] = self.doc.load_page(i).get_text("text")
+
+        return self._pages[i]
+
+    def first_page_text(self):
+
+        return self.page_text(0)[:3500]
+
+    def close(self):
+
+        self.doc.close()
+
+
+
+# DOI / filename patterns, compiled once and shared by every PDF
+
+DOI_TEXT_RE = re.compile(r'(10\.\d{4,9}/[\w\.\-;/\(\):]+)', re.I)
+
+DOI_FILENAME_RE = re.compile(r"(10\.\d{4,9}/[\w\.\-\/]+)")
+
+FILENAME_META_RE = re.compile(r"(.+?)\s*-\s*(\d{4})\s*-\s*(.+)")
+
+
+
+def search_doi_in_text(pdf_cache):
 
     try:
 
-        doc = fitz.open(pdf_file)
+        n_pages = len(pdf_cache.doc)
 
         texts = []
 
         for i in [0,1,-1]:
 
-            if 0 <= i < len(doc) or (i < 0 and len(doc) > abs(i)):
+            if 0 <= i < n_pages or (i < 0 and n_pages > abs(i)):
 
-                t = doc[i].get_text()
+                t = pdf_cache.page_text(i % n_pages)
 
                 texts.append(t)
 
         s = "\n".join(texts)
 
-        m = re.search(r'(10\.\d{4,9}/[\w\.\-;/\(\):]+)', s, flags=re.I)
+        m = DOI_TEXT_RE.search(s)
 
         if m: return normalize_doi(m.group(1))
 
@@ -3191,23 +3944,21 @@ def print_and_log(msg):
 
     print(msg)
 
-    with open(OP_DIR / "block3_debug_log.txt", "a") as f: f.write(str(msg) + "\n")
+    open_log(OP_DIR / "block3_debug_log.txt").write(str(msg) + "\n")
 
 
 
-def extract_first_page_text(pdf_file, debug=False):
+def extract_first_page_text(pdf_cache, debug=False):
 
     text, err = "", None
 
     try:
 
-        doc = fitz.open(pdf_file)
+        text = pdf_cache.first_page_text()
 
-        text = doc[0].get_text()[:3500]
+        if not text.strip() and len(pdf_cache.doc)>1:
 
-        if not text.strip() and len(doc)>1:
-
-            text2 = doc[1].get_text()[:2000]
+            text2 = pdf_cache.page_text(1)[:2000]
 
             text += "\n" + text2
 
@@ -3221,15 +3972,13 @@ def extract_first_page_text(pdf_file, debug=False):
 
 
 
-def extract_fitz_metadata(pdf_file):
+def extract_fitz_metadata(pdf_cache):
 
-    meta, err = {f:"" for f in fields}, None
+    meta, err = _EMPTY_META.copy(), None
 
     try:
 
-        doc = fitz.open(pdf_file)
-
-        m = doc.metadata
+        m = pdf_cache.meta
 
         meta["title"] = m.get("title", "") or m.get("Title", "")
 
@@ -3237,37 +3986,11 @@ def extract_fitz_metadata(pdf_file):
 
         meta["year"] = str(m.get("modDate", "")[2:6]) if m.get("modDate", "") else ""
 
-    except Exception as e:
-
-        err = f"[WARN] fitz metadata: {e}"
-
-        print_and_log(err)
-
-    return meta, err
-
-
-
-def extract_pdfplumber_metadata(pdf_file):
-
-    meta, err = {f:"" for f in fields}, None
-
-    try:
-
-        with pdfplumber.open(pdf_file) as p:
-
-            info = p.metadata or {}
-
-            meta["title"] = info.get("Title", "")
-
-            meta["author"] = info.get("Author", "")
-
-            meta["year"] = info.get("ModDate", "")[2:6] if info.get("ModDate","") else ""
-
-            meta["author_keywords"] = info.get("Keywords", "")
+        meta["author_keywords"] = m.get("keywords", "") or m.get("Keywords", "")
 
     except Exception as e:
 
-        err = f"[WARN] pdfplumber metadata: {e}"
+        err = f"[WARN] fitz metadata: {e}"
 
         print_and_log(err)
 
@@ -3277,11 +4000,11 @@ def extract_pdfplumber_metadata(pdf_file):
 
 def extract_from_filename_meta(pdf_file):
 
-    meta = {f:"" for f in fields}
+    meta = _EMPTY_META.copy()
 
     base = Path(pdf_file).stem
 
-    m = re.match(r"(.+?)\s*-\s*(\d{4})\s*-\s*(.+)", base)
+    m = FILENAME_META_RE.match(base)
 
     if m:
 
@@ -3289,7 +4012,7 @@ def extract_from_filename_meta(pdf_file):
 
     meta["doi"] = ""
 
-    m2 = re.search(r"(10\.\d{4,9}/[\w\.\-\/]+)", base)
+    m2 = DOI_FILENAME_RE.search(base)
 
     if m2:
 
@@ -3301,181 +4024,191 @@ def extract_from_filename_meta(pdf_file):
 
 def extract_grobid_full(pdf_file):
 
-    meta, err = {f:"" for f in fields}, None
+    meta, err = _EMPTY_META.copy(), None
 
     try:
 
-        with open(pdf_file, "rb") as f:
+        # The response context returns the pooled connection even if the read fails or stops at the cap
+
+        with open(pdf_file, "rb") as f, grobid_session.post(grobid_url, files={'input': f}, data={'consolidateHeader': '0'}, stream=True, timeout=60) as resp:
 
-            resp = requests.post(grobid_url, files={'input': f}, timeout=60)
+            resp.raw.decode_content = True
 
-        tei = resp.text
+            tei = resp.raw.read(MAX_TEI_BYTES).decode('utf-8', errors='replace')
 
         if tei and '<TEI' in tei:
 
-            tree = ET.fromstring(tei)
+            meta.update(tei_fields(tei))
 
-            title_el = tree.find('.//titleStmt/title')
+        else:
 
-            if title_el is not None and title_el.text:
+            err = "[WARN] Malformed or empty TEI from Grobid"
 
-                meta["title"] = title_el.text.strip()
+            print_and_log(err)
 
-            authors = []
+    except Exception as e:
 
-            for pers in tree.findall('.//author/persName'):
+        err = f"[WARN] Grobid XML: {e}"
 
-                surname = pers.find('surname')
+        print_and_log(err)
 
-                forename = pers.find('forename')
+    return meta, err
 
-                a = (forename.text if forename is not None else "")
 
-                b = (surname.text if surname is not None else "")
 
-                val = (a + " " + b).strip()
+def extract_ai_llm_full(first_page, api_key=None, model=None, debug=False):
 
-                if val: authors.append(val)
+    api_key = api_key or OPENAI_API_KEY
 
-            meta["author"] = "; ".join(authors)
+    error = None
 
-            doi_el = tree.find('.//idno[@type="DOI"]')
+    if not api_key or not api_key.strip():
 
-            meta["doi"] = doi_el.text.strip() if doi_el is not None and doi_el.text else ""
+        error = "[CRIT] OpenAI API key missing/blank for LLM calls!"
 
-            date_el = tree.find('.//publicationStmt/date')
+        print_and_log(error)
 
-            meta["year"] = date_el.attrib['when'][:4] if date_el is not None and 'when' in date_el.attrib else ""
+        return _EMPTY_META.copy(), error
 
-            j = tree.find('.//monogr/title')
+    try:
 
-            meta["source_journal"] = j.text.strip() if j is not None and j.text else ""
+        import openai
 
-            kws = [k.text.strip() for k in tree.findall('.//keywords/term') if k.text]
+        openai.api_key = api_key
 
-            meta["author_keywords"] = "; ".join(kws)
+        prompt = (
 
-            ptype = tree.find('.//note[@type="studyType"]')
+            "Extract the following metadata as a JSON object from the text provided: "
 
-            meta["study_type"] = ptype.text.strip() if ptype is not None and ptype.text else ""
+            "title, author, year, doi, author_keywords, country, source_journal, study_type. "
 
-            countries = []
+            "If a field is missing, leave blank or use null. Text follows:\n" + first_page
 
-            for aff in tree.findall('.//affiliation'):
+        )
 
-                country_el = aff.find('.//country')
+        model = model or llm_model
 
-                if country_el is not None and country_el.text:
+        cache_key = "llm:" + hashlib.sha256(f"{model}\x00{prompt}".encode("utf-8")).hexdigest()
 
-                    countries.append(country_el.text.strip())
+        if LLM_CACHE:
 
-            meta["country"] = "; ".join(set(countries))
+            hit = API_CACHE.get(cache_key)
 
-        else:
+            if hit is not None:
 
-            err = "[WARN] Malformed or empty TEI from Grobid"
+                return hit, None
 
-            print_and_log(err)
+        resp = openai.chat.completions.create(
 
-    except Exception as e:
+            model=model,
 
-        err = f"[WARN] Grobid XML: {e}"
+            messages=[{"role":"user", "content": prompt}],
 
-        print_and_log(err)
+            temperature=0, max_tokens=384
 
-    return meta, err
+        )
 
+        txt = resp.choices[0].message.content.strip()
 
+        if debug:
 
-def extract_ai_llm_full(first_page, api_key=None, model=None, debug=False):
+            print_and_log(f"[DEBUG] LLM RAW RESPONSE:\n{txt}\n---")
 
-    api_key = api_key or OPENAI_API_KEY
+        if txt.startswith("```"):
 
-    error = None
+            txt = txt.strip("` \n")
 
-    if not api_key or not api_key.strip():
+            txt = txt[4:].strip() if txt.lower().startswith("json") else txt
 
-        error = "[CRIT] OpenAI API key missing/blank for LLM calls!"
+        result = json_loads(txt)
 
-        print_and_log(error)
+        assert isinstance(result, dict)
 
-        return {k:"" for k in fields}, error
+        for k in fields:
 
-    try:
+            result[k] = flatten(result.get(k, ""))
 
-        import openai
+        output = {k: result.get(k, "") for k in fields}
 
-        openai.api_key = api_key
+        if LLM_CACHE:
 
-        prompt = (
+            API_CACHE.set(cache_key, output)
 
-            "Extract the following metadata as a JSON object from the text provided: "
+        return output, None
 
-            "title, author, year, doi, author_keywords, country, source_journal, study_type. "
+    except Exception as e:
 
-            "If a field is missing, leave blank or use null. Text follows:\n" + first_page
+        error = f"[ERROR] LLM extraction failed: {e}"
+
+        print_and_log(error)
+
+        return _EMPTY_META.copy(), error
+
+
+
+# CrossRef/OpenAlex JSON is cached by URL hash in Block 3.0's store (same file, TTL and no-empty-results policy),
+
+# so re-runs skip lookups already answered; the open cache is reused when Block 3.0 ran in this kernel
+
+if "API_CACHE" not in globals():
 
-        )
+    API_CACHE_TTL_DAYS = float(config.get("api_cache_ttl_days", 90))
 
-        resp = openai.chat.completions.create(
+    API_CACHE = JsonCache(
 
-            model=model or llm_model,
+        Path(config.get("api_cache_path") or Path(env.get("PROJECT_ROOT", ".")) / ".cache" / "external_meta.sqlite"),
 
-            messages=[{"role":"user", "content": prompt}],
+        ttl=API_CACHE_TTL_DAYS * 86400,
 
-            temperature=0, max_tokens=384
+    )
 
-        )
+# Keep-alive session: CrossRef/OpenAlex calls from all worker threads reuse pooled TLS connections
 
-        txt = resp.choices[0].message.content.strip()
+api_session = requests.Session()
 
-        if debug:
+api_session.headers.update({"User-Agent": "nurse-scr/6.4"})
 
-            print_and_log(f"[DEBUG] LLM RAW RESPONSE:\n{txt}\n---")
+api_session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
 
-        if txt.startswith("```"):
 
-            txt = txt.strip("` \n")
 
-            txt = txt[4:].strip() if txt.lower().startswith("json") else txt
+def cached_get_json(url):
 
-        result = json.loads(txt)
+    """GET ``url`` and return its JSON body; successful, non-empty responses are stored in API_CACHE."""
 
-        assert isinstance(result, dict)
+    key = "url:" + hashlib.sha1(url.encode("utf-8")).hexdigest()
 
-        for k in fields:
+    dat = API_CACHE.get(key)
 
-            result[k] = flatten(result.get(k, ""))
+    if not dat:
 
-        return {k: result.get(k, "") for k in fields}, None
+        r = api_session.get(url, timeout=20)
 
-    except Exception as e:
+        dat = r.json()
 
-        error = f"[ERROR] LLM extraction failed: {e}"
+        if r.status_code == 200 and dat:
 
-        print_and_log(error)
+            API_CACHE.set(key, dat)
 
-        return {k: "" for k in fields}, error
+    return dat
 
 
 
 def extract_crossref_full(doi, title=None, author=None, year=None):
 
-    meta, error = {f: "" for f in fields}, None
+    meta, error = _EMPTY_META.copy(), None
 
     if not allow_internet: return meta, "[INFO] Skipped CrossRef (no internet allowed)"
 
-    try:
+    if not doi and not title: return meta, None
 
-        r = None
+    try:
 
         if doi:
 
             url = f"https://api.crossref.org/works/{normalize_doi(doi)}"
 
-            r = requests.get(url, timeout=20)
-
-            dat = r.json()["message"]
+            dat = cached_get_json(url)["message"]
 
         elif title and (author or year):
 
@@ -3483,9 +4216,7 @@ def extract_crossref_full(doi, title=None, author=None, year=None):
 
             url = f"https://api.crossref.org/works?query.bibliographic={requests.utils.quote(qstr)}&rows=1"
 
-            r = requests.get(url, timeout=20)
-
-            items = r.json()["message"].get("items", [])
+            items = cached_get_json(url)["message"].get("items", [])
 
             dat = items[0] if items else {}
 
@@ -3493,9 +4224,7 @@ def extract_crossref_full(doi, title=None, author=None, year=None):
 
             url = f"https://api.crossref.org/works?query.title={requests.utils.quote(title)}&rows=1"
 
-            r = requests.get(url, timeout=20)
-
-            items = r.json()["message"].get("items", [])
+            items = cached_get_json(url)["message"].get("items", [])
 
             dat = items[0] if items else {}
 
@@ -3537,29 +4266,27 @@ def extract_crossref_full(doi, title=None, author=None, year=None):
 
 def extract_openalex_full(doi, title=None):
 
-    meta, error = {f: "" for f in fields}, None
+    meta, error = _EMPTY_META.copy(), None
 
     if not allow_internet: return meta, "[INFO] Skipped OpenAlex (no internet allowed)"
 
-    try:
+    if not doi and not title: return meta, None
 
-        r = None
+    try:
 
         if doi:
 
             url = f"https://api.openalex.org/works/https://doi.org/{normalize_doi(doi)}"
 
-            r = requests.get(url, timeout=20)
-
-            dat = r.json()
+            dat = cached_get_json(url)
 
         elif title:
 
             url = f"https://api.openalex.org/works?title.search={requests.utils.quote(title)}"
 
-            r = requests.get(url, timeout=20)
+            found = cached_get_json(url)
 
-            dat = r.json().get("results", [{}])[0] if "results" in r.json() else r.json()
+            dat = found.get("results", [{}])[0] if "results" in found else found
 
         else:
 
@@ -3613,61 +4340,141 @@ RAW_META_DIR.mkdir(parents=True, exist_ok=True)
 
 
 
-method_null_counts = {m: {f:0 for f in fields} for m in method_names}
-
 all_paper_tables = []
 
+import pandas as pd
+
+
+
+# -- MAIN Extraction Loop: methods fan out per PDF, and PDFs are processed concurrently
 
+from concurrent.futures import ThreadPoolExecutor
 
-# -- MAIN Extraction Loop with Path Handling Checked
+import threading
 
-for idx, pdf in enumerate(pdfs):
+
+
+PDF_WORKERS = int(config.get("pdf_workers", 4))
+
+# PyMuPDF is not thread-safe: all fitz work is serialised behind one lock
+
+FITZ_LOCK = threading.Lock()
+
+# Cap concurrent lookups per host to stay inside the Crossref/OpenAlex polite pools
+
+CROSSREF_SEM = threading.BoundedSemaphore(8)
+
+OPENALEX_SEM = threading.BoundedSemaphore(4)
+
+
+
+def with_sem(sem, fn, *args):
+
+    with sem:
+
+        return fn(*args)
+
+
+
+def process_pdf(idx, pdf):
 
     assert isinstance(pdf, (Path, str)), f"Unexpected type for pdf: {type(pdf)} -- value: {pdf}"
 
-    pdf_id = pdf_hash_id(pdf)
+    pdf_str = str(pdf)  # built once; the ID, audit record and paper table all reuse it
+
+    pdf_id = pdf_hash_id(pdf_str)
 
     errors = []
 
 
 
-    # Use stable local variable names for extracted outputs!
+    with ThreadPoolExecutor(max_workers=4) as ex:
 
-    first_page, err_f = extract_first_page_text(pdf, debug=(idx==0))
+        # Grobid does not need fitz; start it first
 
-    if err_f: errors.append(err_f)
+        fut_grobid = ex.submit(extract_grobid_full, pdf)
 
-    llm, err_llm = extract_ai_llm_full(first_page, api_key=OPENAI_API_KEY, model=llm_model, debug=(idx==0))
+        # Open the PDF once with fitz; text, metadata and DOI scan share the handle
 
-    if err_llm: errors.append(err_llm)
+        with FITZ_LOCK:
+
+            try:
 
-    grobid, err_grobid = extract_grobid_full(pdf)
+                pdf_cache = PdfCache(pdf)
 
-    if err_grobid: errors.append(err_grobid)
+            except Exception as e:
+
+                pdf_cache = None
+
+                errors.append(f"[ERROR] fitz open: {e}")
+
+            # Use stable local variable names for extracted outputs!
+
+            first_page, err_f = extract_first_page_text(pdf_cache, debug=(idx==0))
+
+            fitz_meta, err_fitz = extract_fitz_metadata(pdf_cache)
+
+            doi_textscan = search_doi_in_text(pdf_cache) if pdf_cache else ""
+
+            if pdf_cache:
+
+                pdf_cache.close()
+
+        filename_meta = extract_from_filename_meta(pdf)
+
+        # Best-effort DOI from local sources: start CrossRef/OpenAlex now so they overlap Grobid and the LLM;
+
+        # the results are used only if this turns out to be the DOI chosen below
+
+        spec_doi = normalize_doi(filename_meta.get("doi", "") or doi_textscan)
 
-    fitz_meta, err_fitz = extract_fitz_metadata(pdf)
+        if spec_doi:
 
-    if err_fitz: errors.append(err_fitz)
+            fut_spec_cr = ex.submit(with_sem, CROSSREF_SEM, extract_crossref_full, spec_doi)
 
-    pdfplumber_meta, err_pdfplumber = extract_pdfplumber_metadata(pdf)
+            fut_spec_oa = ex.submit(with_sem, OPENALEX_SEM, extract_openalex_full, spec_doi)
 
-    if err_pdfplumber: errors.append(err_pdfplumber)
+        # Grobid has been running alongside the fitz work; when skipping is enabled wait for it before the LLM
 
-    filename_meta = extract_from_filename_meta(pdf)
+        grobid, err_grobid = fut_grobid.result() if LLM_SKIP_IF_GROBID_COMPLETE else (None, None)
 
+        llm_skipped = bool(grobid) and all(grobid.get(f) for f in GROBID_CORE_FIELDS)
 
+        if llm_skipped:
 
-    doi_textscan = search_doi_in_text(pdf)
+            llm, err_llm = _EMPTY_META.copy(), "[INFO] LLM skipped, Grobid complete"
+
+        else:
+
+            fut_llm = ex.submit(extract_ai_llm_full, first_page, OPENAI_API_KEY, llm_model, idx == 0)
+
+            if grobid is None:
+
+                grobid, err_grobid = fut_grobid.result()
+
+            llm, err_llm = fut_llm.result()
+
+    for err in (err_f, err_llm, err_grobid, err_fitz):
+
+        if err: errors.append(err)
 
-    if not any([normalize_doi(x.get("doi","")) for x in (grobid, fitz_meta, pdfplumber_meta, filename_meta)]):
+
+
+    # Each source's DOI is normalised exactly once, here; the choice below and the output loop reuse it
+
+    for meta in (llm, grobid, fitz_meta, filename_meta):
+
+        meta["doi"] = normalize_doi(meta.get("doi", ""))
+
+    if not any(x["doi"] for x in (grobid, fitz_meta, filename_meta)):
 
         if doi_textscan:
 
-            filename_meta["doi"] = doi_textscan
+            filename_meta["doi"] = doi_textscan  # already normalised by search_doi_in_text
 
 
 
-    doi_for_api = normalize_doi(grobid.get("doi","") or fitz_meta.get("doi","") or pdfplumber_meta.get("doi","") or filename_meta.get("doi","") or llm.get("doi","") or "")
+    doi_for_api = next((x["doi"] for x in (grobid, fitz_meta, filename_meta, llm) if x["doi"]), "")
 
     title_for_api = llm.get("title") or grobid.get("title") or fitz_meta.get("title") or filename_meta.get("title") or ""
 
@@ -3675,20 +4482,52 @@ for idx, pdf in enumerate(pdfs):
 
     year_for_api = llm.get("year") or grobid.get("year") or fitz_meta.get("year") or filename_meta.get("year") or ""
 
-    crossref, err_crossref = extract_crossref_full(doi_for_api, title_for_api, author_for_api, year_for_api)
 
-    if err_crossref: errors.append(err_crossref)
 
-    if not doi_for_api and crossref.get("doi"):
+    if doi_for_api and doi_for_api == spec_doi:
+
+        crossref, err_crossref = fut_spec_cr.result()
+
+        openalex, err_openalex = fut_spec_oa.result()
+
+        if err_crossref: errors.append(err_crossref)
 
-        crossref["doi"] = normalize_doi(crossref["doi"])
+    elif doi_for_api:
 
-        doi_for_api = crossref["doi"]
+        # DOI already known: the Crossref and OpenAlex lookups are independent
 
-    openalex, err_openalex = extract_openalex_full(doi_for_api, title_for_api)
+        with ThreadPoolExecutor(max_workers=2) as ex:
+
+            fut_cr = ex.submit(with_sem, CROSSREF_SEM, extract_crossref_full, doi_for_api, title_for_api, author_for_api, year_for_api)
+
+            fut_oa = ex.submit(with_sem, OPENALEX_SEM, extract_openalex_full, doi_for_api, title_for_api)
+
+            crossref, err_crossref = fut_cr.result()
+
+            openalex, err_openalex = fut_oa.result()
+
+        if err_crossref: errors.append(err_crossref)
+
+    else:
+
+        crossref, err_crossref = with_sem(CROSSREF_SEM, extract_crossref_full, doi_for_api, title_for_api, author_for_api, year_for_api)
+
+        if err_crossref: errors.append(err_crossref)
+
+        crossref["doi"] = normalize_doi(crossref.get("doi", ""))
+
+        if crossref["doi"]:
+
+            doi_for_api = crossref["doi"]
+
+        openalex, err_openalex = with_sem(OPENALEX_SEM, extract_openalex_full, doi_for_api, title_for_api)
 
     if err_openalex: errors.append(err_openalex)
 
+    for meta in (crossref, openalex):
+
+        meta["doi"] = normalize_doi(meta.get("doi", ""))
+
 
 
     method_outputs = {
@@ -3699,8 +4538,6 @@ for idx, pdf in enumerate(pdfs):
 
         "fitz":     {k: v for k,v in fitz_meta.items()},
 
-        "pdfplumber":{k: v for k,v in pdfplumber_meta.items()},
-
         "filename": {k: v for k,v in filename_meta.items()},
 
         "crossref": {k: v for k,v in crossref.items()},
@@ -3717,7 +4554,7 @@ for idx, pdf in enumerate(pdfs):
 
             if f == "doi":
 
-                method_outputs[m][f] = normalize_doi(orig)
+                continue  # normalised once per source above
 
             elif f == "author":
 
@@ -3735,45 +4572,129 @@ for idx, pdf in enumerate(pdfs):
 
                 method_outputs[m][f] = str(orig).strip() if orig and orig != "null" else ""
 
-    for m in method_names:
-
-        for f in fields:
-
-            val = method_outputs[m][f]
-
-            if (not val) or val.lower() == "null":
-
-                method_null_counts[m][f] += 1
-
 
 
     raw_audit = {
 
-        "pdf_id": pdf_id, "filename": str(pdf),
+        "pdf_id": pdf_id, "filename": pdf_str,
 
         "methods": method_outputs,
 
+        "llm_skipped": llm_skipped,
+
         "error_log": errors
 
     }
 
-    with open(RAW_META_DIR / f'{pdf_id}_raw_meta.json', "w", encoding="utf-8") as f:
+    with open(RAW_META_DIR / f'{pdf_id}_raw_meta.json', "wb") as f:
 
-        json.dump(raw_audit, f, indent=2, ensure_ascii=False)
+        f.write(json_dumpb(raw_audit, indent=True))
 
 
 
     df_this_paper = pd.DataFrame({f: [method_outputs[m][f] for m in method_names] for f in fields}, index=method_names)
 
-    all_paper_tables.append({"pdf_id": pdf_id, "fname": str(pdf), "table": df_this_paper})
+    return {"pdf_id": pdf_id, "fname": pdf_str, "table": df_this_paper, "methods": method_outputs, "llm_skipped": llm_skipped}
+
+
+
+with ThreadPoolExecutor(max_workers=PDF_WORKERS) as pdf_pool:
+
+    # map() yields results in input order, so tables and counts match the serial loop
+
+    for res in pdf_pool.map(process_pdf, range(len(pdfs)), pdfs):
+
+        all_paper_tables.append({"pdf_id": res["pdf_id"], "fname": res["fname"], "table": res["table"], "llm_skipped": res["llm_skipped"]})
+
+
 
 
 
+# Every paper's (method x field) table stacked once; null counts and match analytics both work on it
+
+if all_paper_tables:
+
+    df_all = pd.concat({d["pdf_id"]: d["table"] for d in all_paper_tables}, names=["pdf_id", "method"])
+
+    # A skipped LLM row is blank by design, not a miss: drop it so it is neither counted as null nor compared
+
+    llm_skipped_ids = [d["pdf_id"] for d in all_paper_tables if d["llm_skipped"]]
+
+    if llm_skipped_ids:
+
+        df_all = df_all.drop(index=[(p, "llm") for p in llm_skipped_ids])
+
+        print(f"[INFO] LLM skipped (Grobid complete) for {len(llm_skipped_ids)} paper(s); excluded from LLM counts and comparisons")
+
+    null_mask = df_all.fillna("").apply(lambda col: col.astype(str).str.lower().isin(["", "null"]))
+
+    df_null = null_mask.groupby(level="method").sum().reindex(method_names, fill_value=0)
+
+else:
+
+    df_null = pd.DataFrame(0, index=method_names, columns=fields)
+
 print('\n--- Null/Blank Value Table (methods × fields, post-normalization) ---')
 
-df_null = pd.DataFrame(method_null_counts)
+print(df_null)
+
+
+
+# --- Match analytics vs LLM: whole-column comparisons over all papers, no per-cell loop ---
 
-print(df_null.T)
+if all_paper_tables:
+
+    df_clean = df_all.apply(lambda col: col.astype(str).str.lower().str.replace(r"[^a-z0-9]", "", regex=True))
+
+    df_llm = df_all.xs("llm", level="method")
+
+    df_llm_clean = df_clean.xs("llm", level="method")
+
+    llm_present = df_llm_clean != ""
+
+    exact_counts, approx_counts = {}, {}
+
+    for m in method_names:
+
+        if m == "llm": continue
+
+        exact_counts[m] = ((df_all.xs(m, level="method").reindex(df_llm.index) == df_llm) & llm_present).sum()
+
+        approx_counts[m] = ((df_clean.xs(m, level="method").reindex(df_llm_clean.index) == df_llm_clean) & llm_present).sum()
+
+    match_tables = {"exact": pd.DataFrame(exact_counts), "approx": pd.DataFrame(approx_counts)}
+
+    # Optional fuzzy tier: row-wise ratio scores for whole columns at once, computed in C
+
+    try:
+
+        from rapidfuzz import fuzz, process as rf_process
+
+    except ImportError:
+
+        rf_process = None
+
+    if rf_process is not None:
+
+        a_vals = df_llm_clean.to_numpy(dtype=str)
+
+        fuzzy_counts = {}
+
+        for m in exact_counts:
+
+            b_vals = df_clean.xs(m, level="method").reindex(df_llm_clean.index).to_numpy(dtype=str)
+
+            scores = rf_process.cpdist(a_vals.ravel(), b_vals.ravel(), scorer=fuzz.ratio, workers=-1).reshape(a_vals.shape)
+
+            fuzzy_counts[m] = pd.Series(((scores >= 82) & llm_present.to_numpy()).sum(axis=0), index=df_llm_clean.columns)
+
+        match_tables["fuzzy>=82"] = pd.DataFrame(fuzzy_counts)
+
+    df_match = pd.concat(match_tables, axis=1)
+
+    print('\n--- Fields matching LLM per method (exact / approximate / fuzzy, post-normalization) ---')
+
+    print(df_match.to_string())
 
 
 
@@ -3828,42 +4749,84 @@ print("--- End Block 3 v6.4.1 ---")
 
 
 
-import json, pandas as pd, datetime, hashlib
+import ast, json, re, pandas as pd, datetime, hashlib
+
+from functools import lru_cache
 
 from pathlib import Path
 
-from collections import Counter
+from collections import Counter, defaultdict
+
+from src.utils import json_dumpb, json_loads, write_bytes_hashed, write_csv
 
 
 
 from difflib import SequenceMatcher
 
+try:
+
+    from rapidfuzz import fuzz
+
+except ImportError:
+
+    fuzz = None
+
+
+
+
 
 
+@lru_cache(maxsize=None)
+
+def _norm_cached(s):
+
+    # Keeping only str.isalnum characters is exactly the old [\s\W_]+ deletion, without the regex engine
+
+    return "".join(filter(str.isalnum, s.lower()))
 
 
 
 def norm_str(x):
 
-    """ Normalize a string for lenient matching: lowercase, strip, no punct, no space """
+    """ Normalize a string for lenient matching: lowercase, strip, no punct, no space (memoised per value) """
+
+    return _norm_cached(str(x or ""))
+
+
+
+# Autofix/manual-review decisions always use difflib's ratio, so they do not depend on what is installed
+
+FUZZY_SCORER = "difflib.SequenceMatcher.ratio"
 
-    import re
 
-    return re.sub(r"[\s\W_]+", "", str(x or "").lower())
 
+def fuzzy_ratio(a, b, score_cutoff=0):
 
+    """ Return difflib's similarity ratio between two strings (0-100); 0 as soon as it cannot reach score_cutoff.
 
-def fuzzy_ratio(a, b):
+    rapidfuzz, when installed, is only a prefilter: its LCS ratio is an upper bound on difflib's, so a pair it
 
-    """ Return difflib ratio between two strings (0-100) """
+    scores below score_cutoff cannot pass and difflib is skipped """
 
-    return int(SequenceMatcher(None, str(a or ""), str(b or "")).ratio() * 100)
+    a, b = str(a or ""), str(b or "")
 
+    if score_cutoff and fuzz is not None and fuzz.ratio(a, b, score_cutoff=score_cutoff) < score_cutoff:
 
+        return 0
 
-with open("pipeline_env.json", "r") as f:
+    sm = SequenceMatcher(None, a, b)
 
-    env = json.load(f)
+    if score_cutoff and (sm.real_quick_ratio() * 100 < score_cutoff or sm.quick_ratio() * 100 < score_cutoff):
+
+        return 0
+
+    return int(sm.ratio() * 100)
+
+
+
+with open("pipeline_env.json", "rb") as f:
+
+    env = json_loads(f.read())
 
 OPERATIONAL_DIR = Path(env["OPERATIONAL_DIR"])
 
@@ -3871,7 +4834,11 @@ EXTRACTION_PATH = OPERATIONAL_DIR / "extraction_manifest.csv"
 
 REVIEW_LOG_PATH = OPERATIONAL_DIR / "review_correction_log.json"
 
-FINAL_MANIFEST_PATH = OPERATIONAL_DIR / "final_manifest.csv"
+# Optional "gzip" / "zstd" (needs zstandard) compression of the locked manifest; default stays plain CSV
+
+MANIFEST_COMPRESSION = env.get("MANIFEST_COMPRESSION")
+
+FINAL_MANIFEST_PATH = OPERATIONAL_DIR / ("final_manifest.csv" + {"gzip": ".gz", "zstd": ".zst"}.get(MANIFEST_COMPRESSION, ""))
 
 AUDIT_PATH = OPERATIONAL_DIR / "reviewer_block4_audit.jsonl"
 
@@ -3883,39 +4850,45 @@ methods = ["llm_raw", "grobid", "fitz", "crossref", "openalex", "filename"]
 
 
 
+_EMPTY_VOTES = dict.fromkeys(methods, "")
+
+
+
 def robust_json_parse(val):
 
     if isinstance(val, dict): return val
 
-    if pd.isna(val) or str(val).strip() in ["", "{}", "nan", "None"]:
-
-        return {m:"" for m in methods}
+    # read_csv gives float NaN for empty cells, so any non-string is an empty vote set (no pd.isna per cell)
 
-    try:
+    if not isinstance(val, str): return _EMPTY_VOTES.copy()
 
-        js = json.loads(val)
+    val = val.strip()
 
-        if not isinstance(js, dict): return {m:"" for m in methods}
+    if val in ("", "{}", "nan", "None"): return _EMPTY_VOTES.copy()
 
-        for m in methods:
+    try:
 
-            js.setdefault(m, "")
+        js = json_loads(val)
 
-        return js
+    except ValueError:
 
-    except Exception:
+        # Older exports wrote Python reprs; only those pay for literal_eval
 
         try:
 
-            import ast
-
             js = ast.literal_eval(val)
 
-            return dict(js) if isinstance(js, dict) else {m:"" for m in methods}
-
         except Exception:
 
-            return {m:"" for m in methods}
+            return _EMPTY_VOTES.copy()
+
+    if not isinstance(js, dict): return _EMPTY_VOTES.copy()
+
+    for m in methods:
+
+        js.setdefault(m, "")
+
+    return js
 
 
 
@@ -3927,71 +4900,79 @@ for field in fields:
 
     if col not in df.columns:
 
-        df[col] = [{m:"" for m in methods} for _ in range(len(df))]
+        df[col] = [_EMPTY_VOTES.copy() for _ in range(len(df))]
 
     else:
 
-        df[col] = df[col].apply(robust_json_parse)
+        df[col] = [robust_json_parse(v) for v in df[col].to_numpy()]
 
 
 
 # -------- Consensus/Autofix Step --------------
 
-autofix_counter = Counter()
+# Helper: Fuzzy or strict match; callers pass norm_str() values already computed for the row
 
-needs_manual_idx = []
+def close_enough_norm(a_norm, b_norm, a_raw, b_raw, field):
 
-for idx, row in df.iterrows():
+    if not a_raw or not b_raw: return False
 
-    auto_decided = {}
+    if field in ["title", "author"]:
 
-    for field in fields:
+        if a_norm == b_norm: return True
 
-        votes = row.get(f"{field}_votes", {m:"" for m in methods}).copy()
+        cutoff = 88 if field == "title" else 82 # tunable
 
-        values = [v for v in votes.values() if v and v != "[Missing]"]
+        return fuzzy_ratio(a_raw, b_raw, score_cutoff=cutoff) >= cutoff
+
+    else:
+
+        return str(a_raw).strip().lower() == str(b_raw).strip().lower()
 
-        llm_val = votes.get("llm_raw", "")
 
-        nonblank = [m for m in methods if votes[m] and votes[m] != "[Missing]"]
 
+autofix_counter = Counter()
 
+needs_manual_idx = []
 
-        # Helper: Fuzzy or strict match
+# Decisions are collected in plain dicts and written to the frame once per column after the loop
 
-        def close_enough(a, b, field):
+final_vals = {field: {} for field in fields}
 
-            if not a or not b: return False
+src_vals = {field: {} for field in fields}
 
-            if field in ["title", "author"]:
+votes_by_field = {field: df[f"{field}_votes"].tolist() for field in fields}
 
-                if norm_str(a) == norm_str(b): return True
+for pos, idx in enumerate(df.index):
 
-                return fuzzy_ratio(a, b) >= (88 if field == "title" else 82) # tunable
+    auto_decided = {}
 
-            else:
+    for field in fields:
 
-                return str(a).strip().lower() == str(b).strip().lower()
+        votes = votes_by_field[field][pos].copy()
 
+        values = [v for v in votes.values() if v and v != "[Missing]"]
 
+        llm_val = votes.get("llm_raw", "")
 
-        # For author/title, check if OpenAlex or CrossRef is "close" to LLM
+        nonblank = [m for m in methods if votes[m] and votes[m] != "[Missing]"]
 
-        preferred_raw = None
 
-        for m in ["openalex", "crossref"]:
 
-            if close_enough(votes.get("llm_raw", ""), votes.get(m, ""), field):
+        # Normalise the LLM value once and compare it against every method
 
-                preferred_raw = votes[m]
+        llm_norm = norm_str(llm_val)
 
-                break
+        match_methods = [m for m in methods if close_enough_norm(llm_norm, norm_str(votes[m]), llm_val, votes[m], field)]
 
 
 
-        # Consensus: ≥2 methods "close enough" to LLM and non-missing OR LLM+OpenAlex/CrossRef is close
+        # For author/title, check if OpenAlex or CrossRef is "close" to LLM
 
-        match_methods = [m for m in methods if close_enough(llm_val, votes[m], field)]
+        preferred_raw = next((votes[m] for m in ["openalex", "crossref"] if m in match_methods), None)
+
+
+
+        # Consensus: ≥2 methods "close enough" to LLM and non-missing OR LLM+OpenAlex/CrossRef is close
 
         n_matches = len([k for k in match_methods if votes[k]])
 
@@ -4009,9 +4990,9 @@ for idx, row in df.iterrows():
 
             if preferred_raw:
 
-                df.loc[idx, f"{field}_final"] = preferred_raw
+                final_vals[field][idx] = preferred_raw
 
-                df.loc[idx, f"{field}_src"] = "openalex/crossref"
+                src_vals[field][idx] = "openalex/crossref"
 
                 auto_decided[field] = True
 
@@ -4021,9 +5002,9 @@ for idx, row in df.iterrows():
 
             if n_matches >= 2 and set(match_methods).intersection(set(valid_compare_methods)):
 
-                df.loc[idx, f"{field}_final"] = llm_val
+                final_vals[field][idx] = llm_val
 
-                df.loc[idx, f"{field}_src"] = "llm_raw"
+                src_vals[field][idx] = "llm_raw"
 
                 auto_decided[field] = True
 
@@ -4035,9 +5016,9 @@ for idx, row in df.iterrows():
 
             if n_matches >= 2:
 
-                df.loc[idx, f"{field}_final"] = llm_val
+                final_vals[field][idx] = llm_val
 
-                df.loc[idx, f"{field}_src"] = "llm_raw"
+                src_vals[field][idx] = "llm_raw"
 
                 auto_decided[field] = True
 
@@ -4051,9 +5032,9 @@ for idx, row in df.iterrows():
 
         if len(nonblank) == 1:
 
-            df.loc[idx, f"{field}_final"] = votes[nonblank[0]]
+            final_vals[field][idx] = votes[nonblank[0]]
 
-            df.loc[idx, f"{field}_src"] = nonblank[0]
+            src_vals[field][idx] = nonblank[0]
 
             auto_decided[field] = True
 
@@ -4071,19 +5052,35 @@ for idx, row in df.iterrows():
 
 
 
-# Second pass: Flag only fields needing review
+for field in fields:
+
+    for col, vals in ((f"{field}_final", final_vals[field]), (f"{field}_src", src_vals[field])):
+
+        upd = pd.Series(vals, dtype=object)
+
+        if col in df.columns:
+
+            df[col] = df[col].astype(object)
+
+            df.loc[upd.index, col] = upd
+
+        else:
 
-needs_review = set([idx for idx, f in needs_manual_idx])
+            df[col] = upd
 
-df["needs_review"] = df.index.isin(needs_review)
 
-df["review_reason"] = ""
 
-for idx in range(len(df)):
+# Second pass: Flag only fields needing review (group flags by row once instead of scanning the list per row)
 
-    missing = [f for f in fields if (idx, f) in needs_manual_idx]
+flagged_fields = {}
 
-    df.loc[idx, "review_reason"] = ";".join(f"{f}_disagree_or_missing" for f in missing)
+for idx, f in needs_manual_idx:
+
+    flagged_fields.setdefault(idx, []).append(f)
+
+df["needs_review"] = df.index.isin(list(flagged_fields))
+
+df["review_reason"] = [";".join(f"{f}_disagree_or_missing" for f in flagged_fields.get(idx, [])) for idx in df.index]
 
 
 
@@ -4131,6 +5128,8 @@ result_decision = input(
 
 corrections = []
 
+pending = defaultdict(dict)  # column -> {row index: value}; written to df in one assignment per column after the loop
+
 
 
 if result_decision == "y" and len(needreview):
@@ -4163,9 +5162,9 @@ if result_decision == "y" and len(needreview):
 
                 val = input(f"Manual value for {field}: ").strip()
 
-                df.loc[idx, f"{field}_final"] = val
+                pending[f"{field}_final"][idx] = val
 
-                df.loc[idx, f"{field}_src"] = "manual"
+                pending[f"{field}_src"][idx] = "manual"
 
                 corrections.append(
 
@@ -4179,9 +5178,9 @@ if result_decision == "y" and len(needreview):
 
                 val = votes.get(chosen_method, "")
 
-                df.loc[idx, f"{field}_final"] = val
+                pending[f"{field}_final"][idx] = val
 
-                df.loc[idx, f"{field}_src"] = chosen_method
+                pending[f"{field}_src"][idx] = chosen_method
 
                 corrections.append(
 
@@ -4189,6 +5188,10 @@ if result_decision == "y" and len(needreview):
 
                 )
 
+    for col, vals in pending.items():
+
+        df.loc[list(vals), col] = list(vals.values())
+
     print("\n[Reviewer correction input complete.]")
 
 else:
@@ -4203,15 +5206,31 @@ print("\n--- SUMMARY: Final Manifest Table (LOCKED after Review) ---")
 
 finalcols = ["pdf_id"] + [f"{field}_final" for field in fields] + ["needs_review", "review_reason"]
 
-print(df[finalcols].to_string(index=False, max_colwidth=48))
+# Only the first rows are formatted for the console; the full table goes to CSV for review
+
+PREVIEW_ROWS = 50
+
+print(df[finalcols].head(PREVIEW_ROWS).to_string(index=False, max_colwidth=48))
+
+FINAL_PREVIEW_PATH = OPERATIONAL_DIR / "final_preview.csv"
+
+write_csv(df[finalcols], FINAL_PREVIEW_PATH)
+
+if len(df) > PREVIEW_ROWS:
+
+    print(f"... {len(df) - PREVIEW_ROWS} more row(s); full table in {FINAL_PREVIEW_PATH}")
 
 print("\nCOUNT SUMMARY by FIELD source:")
 
 for field in fields:
 
-    sources = Counter([str(row.get(f"{field}_src", "")) for _, row in df.iterrows()])
+    # map(str) keeps missing sources as "nan" like str() did; value_counts(sort=False) keeps first-seen order
 
-    print(f"{field:8}: {dict(sources)}")
+    col = f"{field}_src"
+
+    sources = df[col].map(str) if col in df.columns else pd.Series("", index=df.index)
+
+    print(f"{field:8}: {sources.value_counts(sort=False).to_dict()}")
 
 
 
@@ -4231,17 +5250,17 @@ else:
 
 print("\n--- Table 5: Extraction Source-Field Agreement Matrix ---")
 
-method_counts = pd.DataFrame(0, index=fields, columns=methods)
+# One long (field, src) table cross-tabulated in pandas instead of a row x field Python loop
 
-for idx, row in df.iterrows():
+src_cols = [f"{field}_src" for field in fields if f"{field}_src" in df.columns]
 
-    for field in fields:
+long_src = df[src_cols].melt(var_name="field", value_name="src")
 
-        src = str(row.get(f"{field}_src", "")).lower()
+long_src["src"] = long_src["src"].astype(str).str.lower()
 
-        if src in method_counts.columns:
+method_counts = pd.crosstab(long_src["field"].str[:-len("_src")], long_src["src"]) if len(long_src) else pd.DataFrame()
 
-            method_counts.at[field, src] += 1
+method_counts = method_counts.reindex(index=fields, columns=methods, fill_value=0).rename_axis(index=None, columns=None)
 
 print(method_counts.to_string())
 
@@ -4249,31 +5268,43 @@ print(method_counts.to_string())
 
 # ------------- Write reviewer-locked manifest/log (hash-logged) -------------
 
-df.to_csv(FINAL_MANIFEST_PATH, index=False)
+# One timestamp pair, formatted once, stamps both the review log and the audit entry
 
-with open(REVIEW_LOG_PATH, "w") as f:
+NZDT = datetime.timezone(datetime.timedelta(hours=12))
 
-    json.dump({
+now_utc = datetime.datetime.now(datetime.timezone.utc)
 
-        "reviewer": reviewer_name,
+TS_UTC = now_utc.replace(tzinfo=None).isoformat() + "Z"
 
-        "timestamp_utc": str(datetime.datetime.utcnow()) + "Z",
+TS_NZDT = now_utc.astimezone(NZDT).isoformat()
 
-        "timestamp_nzdt": str(datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=12))),),
 
-        "changes": corrections,
 
-        "final_approved": final_approve == "y"
+# Both outputs are hashed from the bytes as they are written, not re-read from disk
 
-    }, f, indent=2)
+manifest_hash = write_csv(df, FINAL_MANIFEST_PATH, compression=MANIFEST_COMPRESSION)
+
+review_log_hash = write_bytes_hashed(REVIEW_LOG_PATH, json_dumpb({
+
+    "reviewer": reviewer_name,
+
+    "timestamp_utc": TS_UTC,
+
+    "timestamp_nzdt": TS_NZDT,
+
+    "changes": corrections,
+
+    "final_approved": final_approve == "y"
+
+}, indent=True))
 
 
 
 out_hashes = {
 
-    "final_manifest.csv.sha256": sha256_file(FINAL_MANIFEST_PATH),
+    f"{FINAL_MANIFEST_PATH.name}.sha256": manifest_hash,
 
-    "review_correction_log.json.sha256": sha256_file(REVIEW_LOG_PATH)
+    "review_correction_log.json.sha256": review_log_hash
 
 }
 
@@ -4287,15 +5318,15 @@ for out, hashv in out_hashes.items():
 
 # Minimal audit log
 
-with open(AUDIT_PATH, "a") as f:
+with open(AUDIT_PATH, "ab") as f:
 
-    f.write(json.dumps({
+    f.write(json_dumpb({
 
         "step": "block4_reviewer_approval",
 
-        "timestamp_utc": str(datetime.datetime.utcnow()) + "Z",
+        "timestamp_utc": TS_UTC,
 
-        "timestamp_nzdt": str(datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=12))),),
+        "timestamp_nzdt": TS_NZDT,
 
         "outputs": {k: str(OPERATIONAL_DIR / k) for k in out_hashes},
 
@@ -4303,9 +5334,11 @@ with open(AUDIT_PATH, "a") as f:
 
         "reviewer": reviewer_name,
 
-        "final_approved": final_approve == "y"
+        "final_approved": final_approve == "y",
+
+        "fuzzy_scorer": FUZZY_SCORER
 
-    }) + "\n")
+    }) + b"\n")
 
 
 
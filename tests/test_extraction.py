@@ -1,3 +1,5 @@
+import asyncio
+import io
 import json
 import unittest
 from unittest.mock import patch, MagicMock
@@ -20,6 +22,14 @@ class TestNormalization(unittest.TestCase):
     def test_normalize_doi(self):
         assert utils.normalize_doi("https://doi.org/10.1000/ABC") == "10.1000/abc"
         assert utils.normalize_doi("10.1000/xyz") == "10.1000/xyz"
+        assert utils.normalize_doi(" http://dx.doi.org/10.1000/A B\u00a0\n") == "10.1000/ab"
+        assert utils.normalize_doi(None) == ""
+
+    def test_is_valid_doi(self):
+        assert utils.is_valid_doi("10.1000/abc")
+        assert not utils.is_valid_doi("not available")
+        assert not utils.is_valid_doi("10.1/abc")
+        assert not utils.is_valid_doi("")
 
     def test_clean_str(self):
         assert extraction.clean_str("A B,C!") == "abc"
@@ -32,8 +42,11 @@ class TestNormalization(unittest.TestCase):
 
 
 class TestCrossref(unittest.TestCase):
-    @patch("ai_nurse_scr.extraction.requests")
-    def test_extract_crossref_full(self, mock_requests):
+    def setUp(self):
+        extraction._crossref_record.cache_clear()
+
+    @patch("ai_nurse_scr.extraction._http_session")
+    def test_extract_crossref_full(self, mock_session):
         response = {
             "message": {
                 "DOI": "10.1234/test",
@@ -45,9 +58,9 @@ class TestCrossref(unittest.TestCase):
                 "type": "journal-article",
             }
         }
-        mock_requests.get.return_value.json.return_value = response
+        mock_session.return_value.get.return_value.json.return_value = response
         meta = extraction.extract_crossref_full("10.1234/test")
-        mock_requests.get.assert_called_with("https://api.crossref.org/works/10.1234/test")
+        mock_session.return_value.get.assert_called_with("https://api.crossref.org/works/10.1234/test")
         assert meta["doi"] == "10.1234/test"
         assert meta["title"] == "Test Paper"
         assert meta["author"] == "Doe, John"
@@ -57,10 +70,77 @@ class TestCrossref(unittest.TestCase):
         assert meta["study_type"] == "journal-article"
         assert meta["country"] == "USA"
 
+    @patch("ai_nurse_scr.extraction._http_session")
+    def test_crossref_skips_request_without_doi_or_title(self, mock_session):
+        meta = extraction.extract_crossref_full("", title=None)
+        mock_session.return_value.get.assert_not_called()
+        assert meta == {f: "" for f in extraction.fields}
+
+    @patch("ai_nurse_scr.extraction._http_session")
+    def test_crossref_lookup_is_memoised(self, mock_session):
+        mock_session.return_value.get.return_value.json.return_value = {"message": {"DOI": "10.1/a"}}
+        extraction.extract_crossref_full("10.1/A")
+        extraction.extract_crossref_full("https://doi.org/10.1/a")
+        assert mock_session.return_value.get.call_count == 1
+
+    @patch("ai_nurse_scr.extraction._http_session")
+    def test_crossref_record_cache_persists_with_ttl(self, mock_session):
+        mock_session.return_value.get.return_value.json.return_value = {"message": {"DOI": "10.1/a"}}
+        with tempfile.TemporaryDirectory() as td:
+            try:
+                extraction.set_record_cache(Path(td) / "records.sqlite")
+                extraction.extract_crossref_full("10.1/a")
+                extraction._crossref_record.cache_clear()
+                assert extraction.extract_crossref_full("10.1/a")["doi"] == "10.1/a"
+                assert mock_session.return_value.get.call_count == 1
+                extraction.set_record_cache(Path(td) / "records.sqlite", ttl_days=0)
+                extraction._crossref_record.cache_clear()
+                extraction.extract_crossref_full("10.1/a")
+                assert mock_session.return_value.get.call_count == 2
+                # An empty title-search result is not persisted
+                extraction.set_record_cache(Path(td) / "records.sqlite")
+                mock_session.return_value.get.return_value.json.return_value = {"message": {"items": []}}
+                extraction.extract_crossref_full(None, "Unknown title")
+                assert extraction.record_cache.get("crossref:title:Unknown title") is None
+            finally:
+                extraction.set_record_cache(None)
+
+    @patch("ai_nurse_scr.extraction._http_session")
+    def test_crossref_batch_uses_one_filter_request(self, mock_session):
+        mock_session.return_value.get.return_value.json.return_value = {
+            "message": {"items": [{"DOI": "10.1/A", "title": ["A"]}]}
+        }
+        out = extraction.extract_crossref_batch(["10.1/a", "https://doi.org/10.1/A", "10.2/b"])
+        mock_session.return_value.get.assert_called_once_with(
+            "https://api.crossref.org/works", params={"filter": "doi:10.1/a,doi:10.2/b", "rows": 2}
+        )
+        assert out["10.1/a"]["title"] == "A"
+        assert out["10.2/b"] == {f: "" for f in extraction.fields}
+
+    @patch("ai_nurse_scr.extraction._http_session")
+    def test_crossref_batch_failure_falls_back_per_doi(self, mock_session):
+        sici = "10.1002/(sici)1097-4571(199806)49:8<693::aid-asi4>3.0.co;2-0"
+        resp = mock_session.return_value.get.return_value
+        resp.raise_for_status.side_effect = [Exception("400"), None]
+        resp.json.return_value = {"message": {"DOI": sici, "title": ["Old"]}}
+        out = extraction.extract_crossref_batch([sici])
+        assert out[sici]["title"] == "Old"
+        single_url = mock_session.return_value.get.call_args_list[1].args[0]
+        assert "%3C" in single_url and "%3B" in single_url and "<" not in single_url
+
+    @patch("ai_nurse_scr.extraction._http_session")
+    def test_crossref_sparse_record_gives_blank_fields(self, mock_session):
+        mock_session.return_value.get.return_value.json.return_value = {"message": {"DOI": "10.1/B", "title": []}}
+        meta = extraction.extract_crossref_full("10.1/b")
+        assert meta == {**{f: "" for f in extraction.fields}, "doi": "10.1/b"}
+
 
 class TestOpenAlex(unittest.TestCase):
-    @patch("ai_nurse_scr.extraction.requests")
-    def test_extract_openalex_full(self, mock_requests):
+    def setUp(self):
+        extraction._openalex_record.cache_clear()
+
+    @patch("ai_nurse_scr.extraction._http_session")
+    def test_extract_openalex_full(self, mock_session):
         response = {
             "doi": "https://doi.org/10.1234/test",
             "title": "Test Paper",
@@ -70,9 +150,9 @@ class TestOpenAlex(unittest.TestCase):
             "host_venue": {"display_name": "Journal of Tests"},
             "type": "journal-article",
         }
-        mock_requests.get.return_value.json.return_value = response
+        mock_session.return_value.get.return_value.json.return_value = response
         meta = extraction.extract_openalex_full("10.1234/test")
-        mock_requests.get.assert_called_with(
+        mock_session.return_value.get.assert_called_with(
             "https://api.openalex.org/works/https://doi.org/10.1234/test"
         )
         assert meta["doi"] == "10.1234/test"
@@ -84,6 +164,12 @@ class TestOpenAlex(unittest.TestCase):
         assert meta["study_type"] == "journal-article"
         assert meta["country"] == "US"
 
+    @patch("ai_nurse_scr.extraction._http_session")
+    def test_openalex_skips_request_without_doi_or_title(self, mock_session):
+        meta = extraction.extract_openalex_full(None, title=None)
+        mock_session.return_value.get.assert_not_called()
+        assert meta == {f: "" for f in extraction.fields}
+
 
 class TestOpenAI(unittest.TestCase):
     def _mock_openai(self, content):
@@ -113,6 +199,92 @@ class TestOpenAI(unittest.TestCase):
             meta = extraction.extract_ai_llm_full("text", api_key="key")
         assert meta == payload
 
+    def test_llm_cache_reuses_replies(self):
+        mock_openai = self._mock_openai('{"doi":"10.1234/test"}')
+        with tempfile.TemporaryDirectory() as td:
+            try:
+                extraction.set_llm_cache(Path(td) / "llm_cache.sqlite")
+                with patch.dict(sys.modules, {"openai": mock_openai}):
+                    first = extraction.extract_ai_llm_doi_only("some text", api_key="key")
+                extraction.set_llm_cache(Path(td) / "llm_cache.sqlite")
+                with patch.dict(sys.modules, {"openai": None}):
+                    second = extraction.extract_ai_llm_doi_only("some text", api_key="key")
+                    other = extraction.extract_ai_llm_doi_only("some text", api_key="key", model="other")
+            finally:
+                extraction.set_llm_cache(None)
+        assert first == second == "10.1234/test"
+        assert other == ""
+        assert mock_openai.chat.completions.create.call_count == 1
+
+    @unittest.skipIf(extraction.np is None, "numpy not installed")
+    def test_semantic_cache_matches_near_duplicates(self):
+        vectors = {"page A": [1.0, 0.0], "page A ": [0.999, 0.01], "page B": [0.0, 1.0]}
+
+        def create(model, input):
+            return types.SimpleNamespace(data=[types.SimpleNamespace(embedding=vectors[input])])
+
+        client = types.SimpleNamespace(embeddings=types.SimpleNamespace(create=create))
+        mock_openai = types.SimpleNamespace(OpenAI=lambda api_key: client)
+        with tempfile.TemporaryDirectory() as td, patch.dict(sys.modules, {"openai": mock_openai}), \
+                patch.object(extraction, "extract_ai_llm_full", side_effect=lambda p, *a: {**extraction.empty_meta(), "title": p}) as mock_llm:
+            cache = extraction.SemanticCache(Path(td) / "semantic")
+            a = extraction.extract_ai_llm_full_semantic("page A", cache, api_key="key")
+            dup = extraction.extract_ai_llm_full_semantic("page A ", cache, api_key="key")
+            b = extraction.extract_ai_llm_full_semantic("page B", cache, api_key="key")
+            reloaded = extraction.SemanticCache(Path(td) / "semantic")
+        assert a["title"] == dup["title"] == "page A"
+        assert b["title"] == "page B"
+        assert mock_llm.call_count == 2
+        assert len(reloaded.answers) == 2
+
+    def test_extract_ai_llm_many_keeps_order(self):
+        class RateLimitError(Exception):
+            pass
+
+        replies = {"p1": '{"doi":"10.1/a"}', "p2": '```json\n{"doi":"10.1/b"}\n```'}
+        calls = []
+
+        async def create(model, messages, **kwargs):
+            text = messages[0]["content"].rsplit("\n", 1)[-1]
+            calls.append(text)
+            if text == "p2" and calls.count("p2") == 1:
+                raise RateLimitError()
+            if text == "bad":
+                return MagicMock(choices=[MagicMock(message=MagicMock(content="not json"))])
+            return MagicMock(choices=[MagicMock(message=MagicMock(content=replies[text]))])
+
+        client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+        mock_openai = types.SimpleNamespace(AsyncOpenAI=lambda api_key: client, RateLimitError=RateLimitError)
+        real_sleep = asyncio.sleep
+        with patch.dict(sys.modules, {"openai": mock_openai}), patch.object(asyncio, "sleep", lambda s: real_sleep(0)):
+            result = extraction.extract_ai_llm_doi_only_many(["p1", "p2", "bad"], api_key="key")
+        assert result == ["10.1/a", "10.1/b", ""]
+        assert calls.count("p2") == 2
+        assert extraction.extract_ai_llm_full_many(["x"], api_key="") == [extraction.empty_meta()]
+
+    def test_extract_ai_llm_full_batch(self):
+        out_line = json.dumps({
+            "custom_id": "p1",
+            "response": {"body": {"choices": [{"message": {"content": '{"title": "T", "doi": "10.1/a"}'}}]}},
+        })
+        uploaded = []
+
+        def create_file(file, purpose):
+            uploaded.append([json.loads(l) for l in file.read().decode("utf-8").splitlines()])
+            return types.SimpleNamespace(id="file-in")
+
+        client = MagicMock()
+        client.files.create.side_effect = create_file
+        client.batches.create.return_value = types.SimpleNamespace(id="b1", status="in_progress")
+        client.batches.retrieve.return_value = types.SimpleNamespace(id="b1", status="completed", output_file_id="file-out")
+        client.files.content.return_value = types.SimpleNamespace(text=out_line + "\n")
+        mock_openai = types.SimpleNamespace(OpenAI=lambda api_key: client)
+        with patch.dict(sys.modules, {"openai": mock_openai}):
+            res = extraction.extract_ai_llm_full_batch({"p1": "one", "p2": "two"}, api_key="key", poll_interval=0)
+        assert [r["custom_id"] for r in uploaded[0]] == ["p1", "p2"]
+        assert res["p1"]["title"] == "T" and res["p1"]["doi"] == "10.1/a"
+        assert res["p2"] == extraction.empty_meta()
+
 
 class TestPaperqaExtractModules(unittest.TestCase):
     @patch("ai_nurse_scr.paperqa2.extract.pdfmeta.extraction.extract_ai_llm_full")
@@ -148,12 +320,29 @@ class TestPaperqaExtractModules(unittest.TestCase):
 
     @patch("ai_nurse_scr.paperqa2.extract.grobid.check_grobid_healthy", return_value=True)
     def test_extract_grobid(self, mock_health):
-        fake_req = types.SimpleNamespace(post=lambda url, files: types.SimpleNamespace(text="xml", raise_for_status=lambda: None))
-        with patch.dict(sys.modules, {"requests": fake_req}):
-            with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
-                Path(pdf_file.name).touch()
-                meta = grobid_mod.extract_grobid(pdf_file.name)
-        assert meta["grobid_xml"] == "xml"
+        class FakeResp:
+            def __init__(self, status_error=None):
+                self.raw = io.BytesIO(b"xml")
+                self.status_error = status_error
+                self.closed = False
+
+            def raise_for_status(self):
+                if self.status_error:
+                    raise self.status_error
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self.closed = True
+
+        for resp, expected in ((FakeResp(), {"grobid_xml": "xml"}), (FakeResp(RuntimeError("503")), {})):
+            fake_req = types.SimpleNamespace(post=lambda url, **kwargs: resp)
+            with patch.dict(sys.modules, {"requests": fake_req}):
+                with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+                    meta = grobid_mod.extract_grobid(pdf_file.name)
+            assert meta == expected
+            assert resp.closed
 
     @patch("ai_nurse_scr.paperqa2.extract.llm.extraction.extract_ai_llm_full")
     def test_extract_llm(self, mock_llm):
@@ -162,3 +351,40 @@ class TestPaperqaExtractModules(unittest.TestCase):
         mock_llm.assert_called_with("text")
         assert meta["title"] == "t"
 
+    def test_run_pipeline_batch_merges_in_order(self):
+        from ai_nurse_scr.paperqa2 import pipeline as p2
+
+        with tempfile.TemporaryDirectory() as td:
+            pdfs = [Path(td, "a.pdf"), Path(td, "b.pdf")]
+            for p in pdfs:
+                p.write_bytes(b"%PDF")
+            meta = {"a.pdf": {"doi": "10.1000/A"}, "b.pdf": {"doi": "not available"}}
+            with patch.object(p2, "extract_pdfmeta", side_effect=lambda p, first_page=None: meta[p.name]), \
+                 patch.object(p2, "extract_crossref_batch", return_value={"10.1000/a": {"title": "cr"}}) as m_cr, \
+                 patch.object(p2, "extract_openalex_batch", return_value={"10.1000/a": {"title": "oa"}}), \
+                 patch.object(p2, "extract_crossref") as m_single, \
+                 patch.object(p2, "extract_grobid", side_effect=lambda p: {"grobid_xml": p.name}), \
+                 patch.object(p2, "extract_llm", return_value={}):
+                out = p2.run_pipeline_batch(pdfs)
+        m_cr.assert_called_once_with(["10.1000/a"])
+        m_single.assert_not_called()
+        assert [r["grobid_xml"] for r in out] == ["a.pdf", "b.pdf"]
+        assert out[0]["title"] == "oa" and "title" not in out[1]
+
+    def test_run_pipeline_llm_policy(self):
+        from ai_nurse_scr.paperqa2 import pipeline as p2
+
+        complete = {"title": "t", "author": "a", "year": "2024", "source_journal": "j"}
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file, \
+             patch.object(p2, "extract_pdfmeta", return_value={"doi": "10.1000/a"}), \
+             patch.object(p2, "extract_crossref", return_value=complete), \
+             patch.object(p2, "extract_openalex", return_value={}), \
+             patch.object(p2, "extract_grobid", return_value={}), \
+             patch.object(p2, "extract_llm", return_value={"title": "llm"}) as m_llm:
+            out = p2.run_pipeline(pdf_file.name)
+            m_llm.assert_not_called()
+            assert out["title"] == "t" and out["llm_queried"] is False
+            out = p2.run_pipeline(pdf_file.name, llm_policy="always")
+            assert out["title"] == "llm" and out["llm_queried"] is True
+            with self.assertRaises(ValueError):
+                p2.run_pipeline(pdf_file.name, llm_policy="sometimes")
@@ -24,6 +24,7 @@ class TestFullPipeline(unittest.TestCase):
                 "pdf_dir": td,
                 "run_id": "run",
                 "output_dir": td,
+                "metrics_dir": str(Path(td) / "metrics"),
                 "rounds": {
                     "question": "Q?",
                     "chunk_size": 5,
@@ -1,26 +1,44 @@
-import json
-try:
-    import yaml
-except Exception:
-    yaml = None
 import tempfile
 import unittest
 from pathlib import Path
 import sys
 
-from ai_nurse_scr import pipeline, config as config_mod
-from unittest.mock import patch
+from ai_nurse_scr import pipeline, utils, config as config_mod
+from unittest.mock import DEFAULT, patch
 import types
 
 
+class _Ctx:
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __enter__(self):
+        return self.obj
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_HELLO_PDF = types.SimpleNamespace(pages=[types.SimpleNamespace(extract_text=lambda: "Hello World")])
+_FAKE_PDFPLUMBER = types.SimpleNamespace(open=lambda path: _Ctx(_HELLO_PDF))
+
+
 class TestPipelineHelpers(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._cfg_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(cls._cfg_dir.cleanup)
+
+    def _config(self, **cfg):
+        """Write ``cfg`` as this test's config file and return its path."""
+        path = Path(self._cfg_dir.name, f"{self._testMethodName}.json")
+        path.write_bytes(utils.json_dumpb(cfg))
+        return str(path)
+
     def test_load_config(self):
-        with tempfile.NamedTemporaryFile('w+', suffix='.json') as tf:
-            json.dump({'pdf_dir': 'data', 'run_id': 'run1'}, tf)
-            tf.flush()
-            cfg = config_mod.load_config(tf.name)
-            self.assertEqual(cfg.pdf_dir, 'data')
-            self.assertEqual(cfg.run_id, 'run1')
+        cfg = config_mod.load_config(self._config(pdf_dir='data', run_id='run1'))
+        self.assertEqual(cfg.pdf_dir, 'data')
+        self.assertEqual(cfg.run_id, 'run1')
 
     def test_find_pdfs(self):
         with tempfile.TemporaryDirectory() as td:
@@ -31,86 +49,129 @@ class TestPipelineHelpers(unittest.TestCase):
             self.assertTrue(pdfs[0].name == 'a.pdf')
 
     def test_run_no_pdfs(self):
-        with tempfile.TemporaryDirectory() as td, tempfile.NamedTemporaryFile('w+', suffix='.json') as cfg:
-            json.dump({'pdf_dir': td, 'run_id': 'run'}, cfg)
-            cfg.flush()
-            pipeline.run(cfg.name, td)  # should not raise
+        with tempfile.TemporaryDirectory() as td:
+            cfg = self._config(pdf_dir=td, run_id='run', output_dir=td, metrics_dir=str(Path(td, 'metrics')))
+            pipeline.run(cfg, td)  # should not raise
 
     def test_extract_text(self):
-        class Dummy:
-            def __init__(self):
-                self.pages = [types.SimpleNamespace(extract_text=lambda: "Hello World")]
-            def __enter__(self):
-                return self
-            def __exit__(self, exc_type, exc, tb):
-                pass
-
-        fake_mod = types.SimpleNamespace(open=lambda path: Dummy())
-        with patch.dict(sys.modules, {"pdfplumber": fake_mod}):
+        with patch.dict(sys.modules, {"pdfplumber": _FAKE_PDFPLUMBER}):
             text = pipeline.extract_text(Path("test.pdf"))
         self.assertIn("Hello World", text)
 
-    @patch("ai_nurse_scr.pipeline.extraction.extract_openalex_full")
-    @patch("ai_nurse_scr.pipeline.extraction.extract_crossref_full")
-    @patch("ai_nurse_scr.pipeline.extraction.extract_ai_llm_full")
-    def test_extract_data(self, mock_llm, mock_cr, mock_oa):
-        mock_llm.return_value = {"doi": "10.1/test", "title": "A"}
-        mock_cr.return_value = {"year": "2024"}
-        mock_oa.return_value = {"author": "Doe"}
+    def test_extract_text_first_page_only(self):
+        def page(text):
+            def extract_text():
+                calls.append(text)
+                return text
+            return types.SimpleNamespace(extract_text=extract_text)
+
+        calls = []
+        pdf = types.SimpleNamespace(pages=[page("p1"), page("p2")])
+        fake_mod = types.SimpleNamespace(open=lambda path: _Ctx(pdf))
+        with patch.dict(sys.modules, {"pdfplumber": fake_mod}):
+            self.assertEqual(pipeline.extract_text(Path("t.pdf"), full_text=False), "p1")
+            self.assertEqual(pipeline.extract_text(Path("t.pdf")), "p1\np2")
+        self.assertEqual(calls, ["p1", "p1", "p2"])
+
+    def test_prefetch_keeps_order(self):
+        out = list(pipeline.prefetch(lambda x: x * 2, range(10), depth=3))
+        self.assertEqual(out, [(i, i * 2) for i in range(10)])
+
+    @patch.multiple(
+        "ai_nurse_scr.pipeline.extraction",
+        extract_ai_llm_full=DEFAULT,
+        extract_crossref_full=DEFAULT,
+        extract_openalex_full=DEFAULT,
+    )
+    def test_extract_data(self, extract_ai_llm_full, extract_crossref_full, extract_openalex_full):
+        extract_ai_llm_full.return_value = {"doi": "10.1/test", "title": "A"}
+        extract_crossref_full.return_value = {"year": "2024"}
+        extract_openalex_full.return_value = {"author": "Doe"}
         data = pipeline.extract_data("text")
         self.assertEqual(data["doi"], "10.1/test")
         self.assertEqual(data["year"], "2024")
         self.assertEqual(data["author"], "Doe")
 
+    @patch.multiple(
+        "ai_nurse_scr.pipeline.extraction",
+        extract_ai_llm_full=DEFAULT,
+        extract_crossref_full=DEFAULT,
+        extract_openalex_full=DEFAULT,
+    )
+    def test_extract_data_skips_llm_on_crossref_hit(self, extract_ai_llm_full, extract_crossref_full, extract_openalex_full):
+        extract_crossref_full.return_value = {"title": "A", "author": "Doe", "year": "2024"}
+        extract_openalex_full.return_value = {}
+        data = pipeline.extract_data("see doi:10.1234/abc.def. for details")
+        extract_ai_llm_full.assert_not_called()
+        extract_crossref_full.assert_called_once_with("10.1234/abc.def")
+        self.assertEqual(data["doi"], "10.1234/abc.def")
+        self.assertFalse(data["llm_queried"])
+
     @patch("ai_nurse_scr.pipeline.extract_data")
     @patch("ai_nurse_scr.pipeline.extract_text")
     def test_run_writes_output(self, mock_text, mock_data):
         mock_text.return_value = "text"
         mock_data.return_value = {"title": "T"}
-        with tempfile.TemporaryDirectory() as td, tempfile.NamedTemporaryFile('w+', suffix='.json') as cfg:
-            json.dump({'pdf_dir': td, 'run_id': 'run', 'output_dir': td}, cfg)
-            cfg.flush()
+        with tempfile.TemporaryDirectory() as td:
+            metrics_dir = Path(td, 'metrics')
+            cfg = self._config(pdf_dir=td, run_id='run', output_dir=td, metrics_dir=str(metrics_dir))
             Path(td, 'doc.pdf').touch()
-            pipeline.run(cfg.name, td, force=True)
+            pipeline.run(cfg, td, force=True)
             meta_files = list(Path(td).glob('run_metadata_*.jsonl'))
             self.assertTrue(meta_files)
-            
-            metrics_dir = Path('outputs/metrics')
+
             summary = metrics_dir / 'summary.csv'
             self.assertTrue(summary.exists())
             snapshot = Path(td) / 'config_snapshot.yaml'
             self.assertTrue(snapshot.exists())
-            with open(snapshot) as sf:
-                snap = yaml.safe_load(sf) if yaml else json.load(sf)
+            # utils.load_yaml parses with CSafeLoader and caches per (path, mtime, size)
+            snap = utils.load_yaml(snapshot) if pipeline.yaml else utils.json_loads(snapshot.read_bytes())
             self.assertEqual(snap['pdf_dir'], td)
 
             run_info = Path(td) / 'run_info.yaml'
             self.assertTrue(run_info.exists())
-            with open(run_info) as rf:
-                info = yaml.safe_load(rf) if yaml else json.load(rf)
+            info = utils.load_yaml(run_info) if pipeline.yaml else utils.json_loads(run_info.read_bytes())
             self.assertIn('pipeline_version', info)
             self.assertIn('git_hash', info)
 
+    @patch("ai_nurse_scr.pipeline.extract_data")
+    @patch("ai_nurse_scr.pipeline.extract_text")
+    def test_run_json_snapshots(self, mock_text, mock_data):
+        mock_text.return_value = "text"
+        mock_data.return_value = {"title": "T"}
+        with tempfile.TemporaryDirectory() as td:
+            cfg = self._config(
+                pdf_dir=td, run_id='run', output_dir=td,
+                metrics_dir=str(Path(td, 'metrics')), snapshot_format='json',
+            )
+            Path(td, 'doc.pdf').touch()
+            pipeline.run(cfg, td, force=True)
+            self.assertFalse(Path(td, 'config_snapshot.yaml').exists())
+            snap = utils.json_loads(Path(td, 'config_snapshot.json').read_bytes())
+            self.assertEqual(snap['pdf_dir'], td)
+            info = utils.json_loads(Path(td, 'run_info.json').read_bytes())
+            self.assertIn('git_hash', info)
+
     @patch("ai_nurse_scr.pipeline.ask_llm")
     @patch("ai_nurse_scr.pipeline.extract_text")
     def test_run_rounds_outputs(self, mock_text, mock_llm):
         mock_text.return_value = "content" * 5
         mock_llm.return_value = "answer"
-        with tempfile.TemporaryDirectory() as td, tempfile.NamedTemporaryFile('w+', suffix='.json') as cfg:
-            json.dump({
-                'pdf_dir': td,
-                'run_id': 'run',
-                'output_dir': td,
-                'rounds': {
+        with tempfile.TemporaryDirectory() as td:
+            cfg = self._config(
+                pdf_dir=td,
+                run_id='run',
+                output_dir=td,
+                metrics_dir=str(Path(td, 'metrics')),
+                rounds={
                     'question': 'Q?',
                     'chunk_size': 5,
                     'round1': {'top_n': 1, 'temperature': 0.5},
                     'round2': {'temperature': 0}
-                }
-            }, cfg)
-            cfg.flush()
+                },
+            )
             Path(td, 'doc.pdf').touch()
-            pipeline.run_rounds(cfg.name, td, force=True)
+            pipeline.run_rounds(cfg, td, force=True)
             out1 = list(Path(td).glob('run_round1_*.jsonl'))
             out2 = list(Path(td).glob('run_round2_*.jsonl'))
             self.assertTrue(out1)
@@ -121,11 +182,10 @@ class TestPipelineHelpers(unittest.TestCase):
     def test_run_multiple(self, mock_text, mock_data):
         mock_text.return_value = "text"
         mock_data.return_value = {"title": "T"}
-        with tempfile.TemporaryDirectory() as td, tempfile.NamedTemporaryFile('w+', suffix='.json') as cfg:
-            json.dump({'pdf_dir': td, 'run_id': 'run', 'output_dir': td}, cfg)
-            cfg.flush()
+        with tempfile.TemporaryDirectory() as td:
+            cfg = self._config(pdf_dir=td, run_id='run', output_dir=td, metrics_dir=str(Path(td, 'metrics')))
             Path(td, 'doc.pdf').touch()
-            outputs = pipeline.run_multiple(cfg.name, td, rounds=2)
+            outputs = pipeline.run_multiple(cfg, td, rounds=2)
             self.assertEqual(len(outputs), 2)
             self.assertTrue(all(p.exists() for p in outputs))
 
@@ -25,10 +25,12 @@ class DummyClient:
                 return DummyResp()
 
 
+_FAKE_OPENAI = types.SimpleNamespace(OpenAI=lambda *a, **k: DummyClient())
+
+
 class TestSemantic(unittest.TestCase):
     def _patch_openai(self):
-        fake = types.SimpleNamespace(OpenAI=lambda *a, **k: DummyClient())
-        return patch.dict(sys.modules, {"openai": fake})
+        return patch.dict(sys.modules, {"openai": _FAKE_OPENAI})
 
     def test_llm_semantic_compare(self):
         with self._patch_openai() as _:
@@ -40,11 +42,9 @@ class TestSemantic(unittest.TestCase):
             with tempfile.TemporaryDirectory() as td:
                 f1 = Path(td) / "a.csv"
                 f2 = Path(td) / "b.csv"
-                with open(f1, "w", newline="", encoding="utf-8") as f:
-                    f.write("text,llm_answer\nctx,a\n")
-                with open(f2, "w", newline="", encoding="utf-8") as f:
-                    f.write("text,llm_answer\nctx,a\n")
-                out = spotcheck_files(f1, f2, n_check=1, openai_api_key="key")
+                f1.write_bytes(b"text,llm_answer\nctx,a\n")
+                f2.write_bytes(b"text,llm_answer\nctx,a\n")
+                out = spotcheck_files(f1, f2, n_check=1, openai_api_key="key", out_path=Path(td) / "a_spotcheck.csv")
                 with open(out) as f:
                     lines = f.readlines()
                 self.assertEqual(len(lines), 2)
@@ -1,25 +1,27 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import patch
 import types
 import sys
 
 from ai_nurse_scr.spotcheck import semantic_spot_check
 
 
-class TestSpotCheck(unittest.TestCase):
-    def _mock_openai(self, reply: str):
-        mock_resp = MagicMock()
-        mock_resp.choices = [MagicMock(message=MagicMock(content=reply))]
-        return types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=MagicMock(return_value=mock_resp))))
+def _fake_openai(reply: str):
+    resp = types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=reply))])
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=lambda *a, **k: resp)))
+
+
+_YES_FAKE = _fake_openai("Yes")
+_NO_FAKE = _fake_openai("No")
 
+
+class TestSpotCheck(unittest.TestCase):
     def test_semantic_yes(self):
-        mock_openai = self._mock_openai("Yes")
-        with unittest.mock.patch.dict(sys.modules, {"openai": mock_openai}):
+        with patch.dict(sys.modules, {"openai": _YES_FAKE}):
             self.assertTrue(semantic_spot_check("a", "b", api_key="k"))
 
     def test_semantic_no(self):
-        mock_openai = self._mock_openai("No")
-        with unittest.mock.patch.dict(sys.modules, {"openai": mock_openai}):
+        with patch.dict(sys.modules, {"openai": _NO_FAKE}):
             self.assertFalse(semantic_spot_check("a", "b", api_key="k"))
 
 
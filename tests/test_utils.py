@@ -1,6 +1,12 @@
 import hashlib
+import io
+import json
 import tempfile
+import time
 import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
 
 from ai_nurse_scr import utils
 
@@ -21,6 +27,223 @@ class TestUtils(unittest.TestCase):
                 self.assertEqual(p2_utils.sha256_file(tf.name), expected)
                 self.assertIs(p2_utils.sha256_file, utils.sha256_file)
 
+    @unittest.skipUnless(hasattr(hashlib, "file_digest"), "Python 3.11+ only")
+    def test_sha256_file_uses_file_digest(self):
+        data = b"x" * (3 << 20)
+        with tempfile.NamedTemporaryFile() as tf:
+            tf.write(data)
+            tf.flush()
+            with patch.object(utils.hashlib, "file_digest", wraps=hashlib.file_digest) as fd:
+                self.assertEqual(utils.sha256_file(tf.name), hashlib.sha256(data).hexdigest())
+            fd.assert_called_once()
+
+    def test_sha256_file_chunked_fallback(self):
+        data = b"abc" * 1000
+        with tempfile.NamedTemporaryFile() as tf:
+            tf.write(data)
+            tf.flush()
+            # Hide hashlib.file_digest to exercise the pre-3.11 readinto loop
+            with patch.object(utils, "hashlib", SimpleNamespace(sha256=hashlib.sha256)):
+                self.assertEqual(utils.sha256_file(tf.name, bufsize=7), hashlib.sha256(data).hexdigest())
+
+    def test_audit_writer_batches(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "audit" / "log.jsonl"
+            writer = utils.AuditWriter(path, batch=2)
+            writer.emit({"step": 1})
+            self.assertFalse(path.exists())
+            writer.emit({"step": 2})
+            writer.emit({"step": 3})
+            writer.flush()
+            lines = path.read_text(encoding="utf-8").splitlines()
+            self.assertEqual([json.loads(l)["step"] for l in lines], [1, 2, 3])
+
+    def test_open_log_reuses_handle(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "logs" / "debug.txt"
+            log = utils.open_log(path)
+            self.assertIs(utils.open_log(path), log)
+            log.write("one\n")
+            utils.open_log(path).write("two\n")
+            log.close()
+            self.assertEqual(path.read_text(encoding="utf-8"), "one\ntwo\n")
+            utils.open_log.cache_clear()
+
+    def test_json_cache_persists(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "cache" / "meta.sqlite"
+            cache = utils.JsonCache(path)
+            self.assertIsNone(cache.get("crossref:doi:10.1/x"))
+            cache.set("crossref:doi:10.1/x", {"title": ["Māori health"]})
+            cache.set_many([("a", 1), ("b", [2])])
+            cache.close()
+            cache = utils.JsonCache(path)
+            self.assertEqual(cache.get("crossref:doi:10.1/x"), {"title": ["Māori health"]})
+            self.assertEqual(cache.get("b"), [2])
+            self.assertEqual(cache.get("missing", "d"), "d")
+            cache.close()
+
+    def test_json_cache_ttl(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "meta.sqlite"
+            cache = utils.JsonCache(path, ttl=60)
+            cache.set("k", {"v": 1})
+            self.assertEqual(cache.get("k"), {"v": 1})
+            with patch.object(utils.time, "time", return_value=time.time() + 120):
+                self.assertIsNone(cache.get("k"))
+            cache.close()
+
+    def test_write_csv_gzip(self):
+        import gzip
+        try:
+            import pandas as pd
+        except Exception:
+            self.skipTest("pandas not installed")
+        df = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "m.csv.gz"
+            digest = utils.write_csv(df, path, compression="gzip")
+            raw = path.read_bytes()
+            self.assertEqual(digest, hashlib.sha256(raw).hexdigest())
+            self.assertEqual(pd.read_csv(io.BytesIO(gzip.decompress(raw))).to_dict("list"), df.to_dict("list"))
+            with self.assertRaises(ValueError):
+                utils.write_csv(df, path, compression="bz3")
+
+    def test_sha256_file_hash_cache(self):
+        with tempfile.TemporaryDirectory() as td:
+            pdf = Path(td) / "a.pdf"
+            pdf.write_bytes(b"hello")
+            try:
+                cache = utils.set_hash_cache(Path(td) / "hashes.sqlite")
+                self.assertEqual(utils.sha256_file(pdf), hashlib.sha256(b"hello").hexdigest())
+                # A hit is served from the cache without reading the file
+                (key,) = [k for (k,) in cache._conn.execute("SELECT key FROM cache")]
+                cache.set(key, "cached")
+                self.assertEqual(utils.sha256_file(pdf), "cached")
+                # A size change invalidates the entry
+                pdf.write_bytes(b"hello world")
+                self.assertEqual(utils.sha256_file(pdf), hashlib.sha256(b"hello world").hexdigest())
+            finally:
+                utils.set_hash_cache(None)
+
+    def test_nz_timezone_cached(self):
+        tz = utils.nz_timezone()
+        self.assertIs(utils.nz_timezone(), tz)
+        if tz is not None:
+            self.assertEqual(str(tz), "Pacific/Auckland")
+
+    @unittest.skipIf(utils.yaml is None, "PyYAML not installed")
+    def test_load_yaml_cached_copy(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "config.yaml"
+            path.write_text("pdf_dir: pdfs\nquestions: [a]\n", encoding="utf-8")
+            first = utils.load_yaml(path)
+            first["questions"].append("b")
+            self.assertEqual(utils.load_yaml(path), {"pdf_dir": "pdfs", "questions": ["a"]})
+            path.write_text("pdf_dir: other\n", encoding="utf-8")
+            self.assertEqual(utils.load_yaml(path), {"pdf_dir": "other"})
+
+    def test_load_yaml_requires_pyyaml(self):
+        with patch.object(utils, "yaml", None), self.assertRaisesRegex(ImportError, "PyYAML"):
+            utils.load_yaml(__file__)
+
+    def test_utc_now_iso(self):
+        stamp = utils.utc_now_iso()
+        self.assertTrue(stamp.endswith("Z"))
+        self.assertNotIn("+00:00", stamp)
+
+    def test_json_roundtrip(self):
+        data = {"title": "Māori health", "n": 2}
+        text = utils.json_dumps(data)
+        self.assertIn("Māori", text)
+        self.assertEqual(utils.json_loads(text), data)
+        self.assertEqual(utils.json_loads(utils.json_dumps(data, indent=True)), data)
+        self.assertEqual(utils.json_loads(utils.json_dumpb(data)), data)
+        data["k"] = [1, {"a": None}]
+        fast = utils.json_dumpb(data)
+        with patch.object(utils, "orjson", None):
+            self.assertEqual(utils.json_loads(utils.json_dumps(data)), data)
+            self.assertEqual(utils.json_dumpb(data), fast)
+        self.assertNotIn(b", ", fast)
+
+    def test_json_dumpb_indent_and_int_keys(self):
+        data = {1: "Māori", "k": [1, 2]}
+        expected = json.loads(json.dumps(data))
+        self.assertEqual(json.loads(utils.json_dumpb(data, indent=True)), expected)
+        self.assertIn(b"\n  ", utils.json_dumpb(data, indent=True))
+        with patch.object(utils, "orjson", None):
+            self.assertEqual(json.loads(utils.json_dumpb(data, indent=True)), expected)
+
+    def test_pdf_hash_id_algorithms(self):
+        path = "/data/PDFs/Smith - 2020 - Title.pdf"
+        sha = hashlib.sha1(path.encode("utf-8")).hexdigest()[:8]
+        self.assertEqual(utils.pdf_hash_id(path), f"paper_ID_{sha}")
+        blake = hashlib.blake2b(path.encode("utf-8"), digest_size=4).hexdigest()
+        self.assertEqual(utils.pdf_hash_id(path, algo="blake2b"), f"paper_ID_{blake}")
+        with self.assertRaises(ValueError):
+            utils.pdf_hash_id(path, algo="md5")
+
+    def test_pdf_hash_id_content_ignores_path(self):
+        with tempfile.TemporaryDirectory() as td:
+            a, b = Path(td) / "a.pdf", Path(td) / "b.pdf"
+            a.write_bytes(b"%PDF-1.4 same bytes")
+            b.write_bytes(b"%PDF-1.4 same bytes")
+            sha = hashlib.sha256(b"%PDF-1.4 same bytes").hexdigest()[:8]
+            self.assertEqual(utils.pdf_hash_id(a, content=True), f"paper_ID_{sha}")
+            self.assertEqual(utils.pdf_hash_id(b, content=True), utils.pdf_hash_id(a, content=True))
+            self.assertNotEqual(utils.pdf_hash_id(a), utils.pdf_hash_id(b))
+            # Same leading 64 KiB, different tail; then a replacement in place
+            head = b"%PDF-1.4 " + b"x" * (1 << 16)
+            a.write_bytes(head + b"one")
+            b.write_bytes(head + b"two")
+            self.assertNotEqual(utils.pdf_hash_id(a, content=True), utils.pdf_hash_id(b, content=True))
+            a.write_bytes(head + b"three!")
+            self.assertEqual(utils.pdf_hash_id(a, content=True),
+                             "paper_ID_" + hashlib.sha256(head + b"three!").hexdigest()[:8])
+
+    def test_list_pdfs(self):
+        with tempfile.TemporaryDirectory() as td:
+            for name in ["b.pdf", "a.PDF", "notes.txt"]:
+                (Path(td) / name).write_bytes(b"")
+            (Path(td) / "dir.pdf").mkdir()
+            self.assertEqual([p.name for p in utils.list_pdfs(td)], ["a.PDF", "b.pdf"])
+
+    def test_write_csv_matches_to_csv(self):
+        try:
+            import pandas as pd
+        except Exception:
+            self.skipTest("pandas not installed")
+        df = pd.DataFrame({"a": [1, 2], "b": ["x", {"k": 1}], "c": [True, None], "d": [0.1, float("nan")]})
+        with tempfile.TemporaryDirectory() as td:
+            path = Path(td) / "out.csv"
+            digest = utils.write_csv(df, path)
+            self.assertEqual(path.read_bytes(), df.to_csv(index=False).encode("utf-8"))
+            self.assertEqual(digest, utils.sha256_file(path))
+            utils.write_csv(df.set_index("a"), path, index=True)
+            self.assertEqual(path.read_bytes(), df.set_index("a").to_csv().encode("utf-8"))
+
+    @patch("ai_nurse_scr.utils.requests")
+    def test_grobid_health_is_cached(self, mock_requests):
+        utils._grobid_healthy_at.clear()
+        mock_requests.get.return_value.status_code = 200
+        mock_requests.get.return_value.text = "true"
+        with patch.object(utils.time, "monotonic", side_effect=[100.0, 104.9, 105.0, 105.5, 106.0, 106.5]):
+            self.assertTrue(utils.check_grobid_healthy())
+            self.assertTrue(utils.check_grobid_healthy())
+            self.assertEqual(mock_requests.get.call_count, 1)
+            # Expires max_age seconds after the probe, not at a bucket boundary
+            self.assertTrue(utils.check_grobid_healthy())
+            self.assertEqual(mock_requests.get.call_count, 2)
+            utils.check_grobid_healthy(max_age=0)
+            self.assertEqual(mock_requests.get.call_count, 3)
+            # Failures are not cached: the next call probes again
+            mock_requests.get.return_value.status_code = 503
+            self.assertFalse(utils.check_grobid_healthy(max_age=0))
+            mock_requests.get.return_value.status_code = 200
+            self.assertTrue(utils.check_grobid_healthy())
+            self.assertEqual(mock_requests.get.call_count, 5)
+        utils._grobid_healthy_at.clear()
+
 
 if __name__ == '__main__':
     unittest.main()